@@ -0,0 +1,173 @@
+"""会话上下文构建 - 在 token 预算内挑选最近对话和长期记忆，生成追加到系统提示词的上下文"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from utils.embedding import cosine, embed
+from utils.logger import get_logger
+from utils.tokens import estimate_tokens, reduction_report, truncate_to_tokens
+
+logger = get_logger(__name__)
+
+# 上下文总 token 预算、单条消息/记忆的 token 上限，以及长期记忆最多占用的预算比例
+MEMORY_CONTEXT_TOKENS = int(os.environ.get("MEMORY_CONTEXT_TOKENS", "800"))
+MEMORY_CONTEXT_MESSAGE_TOKENS = int(os.environ.get("MEMORY_CONTEXT_MESSAGE_TOKENS", "150"))
+MEMORY_CONTEXT_MEMORY_SHARE = float(os.environ.get("MEMORY_CONTEXT_MEMORY_SHARE", "0.4"))
+# 对话轮次排序时时效性的权重，其余权重给与最新用户问题的相关性
+MEMORY_CONTEXT_RECENCY_WEIGHT = float(os.environ.get("MEMORY_CONTEXT_RECENCY_WEIGHT", "0.6"))
+# 会话上下文中最多保留的对话轮数
+MEMORY_CONTEXT_MAX_TURNS = int(os.environ.get("MEMORY_CONTEXT_MAX_TURNS", "20"))
+
+MEMORY_SECTIONS = (
+    ("preferences", "User preferences"),
+    ("semantics", "Known facts"),
+    ("summaries", "Session summary"),
+)
+
+
+def memory_text(record) -> str:
+    """提取 retrieve_memories 返回记录中的文本"""
+    if isinstance(record, dict):
+        content = record.get("content")
+        if isinstance(content, dict):
+            return content.get("text", "")
+        return str(content or "")
+    return str(record)
+
+
+class Turn:
+    """一轮对话：消息在加入时即截断并估算 token 数，向量按需计算一次"""
+
+    def __init__(self, message_tokens: int):
+        self.message_tokens = message_tokens
+        self.lines: List[str] = []
+        self.raw_text = ""
+        self.tokens = 0
+        self._embedding = None
+        self.user_text = ""
+
+    def add(self, role: str, text: str):
+        role = role.lower()
+        line = f"{role}: {truncate_to_tokens(text, self.message_tokens)}"
+        self.lines.append(line)
+        self.raw_text += f"{role}: {text}\n"
+        self.tokens += estimate_tokens(line) + 1
+        if role == "user":
+            self.user_text += text
+        self._embedding = None
+
+    @property
+    def embedding(self) -> Dict[int, float]:
+        if self._embedding is None:
+            self._embedding = embed("\n".join(self.lines))
+        return self._embedding
+
+
+class SessionContext:
+    """单个会话的上下文：持有最近对话轮次和长期记忆，新消息到达时增量更新，渲染结果在下次变化前复用"""
+
+    def __init__(self, turns: List[List[Dict]], memories: Dict, builder: "ContextBuilder"):
+        self.builder = builder
+        self.memories = memories
+        self.turns: List[Turn] = []
+        self._rendered: Optional[str] = None
+        self._lock = threading.Lock()
+        for turn in turns or []:
+            for message in turn:
+                self._append(message["role"], message["content"]["text"], new_turn=message is turn[0])
+
+    def _append(self, role: str, text: str, new_turn: bool):
+        if new_turn or not self.turns:
+            self.turns.append(Turn(self.builder.message_tokens))
+            del self.turns[:-self.builder.max_turns]
+        self.turns[-1].add(role, text)
+        self._rendered = None
+
+    def append(self, role: str, text: str):
+        """追加一条新消息；用户消息开启新的一轮"""
+        with self._lock:
+            self._append(role, text, new_turn=role.lower() == "user")
+
+    def render(self) -> str:
+        with self._lock:
+            if self._rendered is None:
+                self._rendered = self.builder.build(self.turns, self.memories)
+            return self._rendered
+
+
+class ContextBuilder:
+    """在 token 预算内构建会话上下文。
+
+    长期记忆（偏好、语义事实、会话摘要）按检索结果的顺序加入，最多占用 memory_share 的预算，未用完的预算留给对话；
+    对话轮次按时效性和与最新用户问题的相关性加权打分，在剩余预算内按分数挑选，最终按时间顺序输出。
+    单条消息超过 message_tokens 时截断，避免长篇股票报告被整段带入提示词。
+    """
+
+    def __init__(self, budget: int = MEMORY_CONTEXT_TOKENS,
+                 message_tokens: int = MEMORY_CONTEXT_MESSAGE_TOKENS,
+                 memory_share: float = MEMORY_CONTEXT_MEMORY_SHARE,
+                 recency_weight: float = MEMORY_CONTEXT_RECENCY_WEIGHT,
+                 max_turns: int = MEMORY_CONTEXT_MAX_TURNS):
+        self.budget = budget
+        self.message_tokens = message_tokens
+        self.memory_share = memory_share
+        self.recency_weight = recency_weight
+        self.max_turns = max_turns
+
+    def session(self, turns: List[List[Dict]], memories: Dict) -> SessionContext:
+        return SessionContext(turns, memories, self)
+
+    def _build_memories(self, memories: Dict, budget: int) -> Tuple[List[str], int]:
+        lines, used = [], 0
+        for key, title in MEMORY_SECTIONS:
+            section = []
+            for record in memories.get(key) or []:
+                text = memory_text(record).strip()
+                if not text:
+                    continue
+                line = f"- {truncate_to_tokens(text, self.message_tokens)}"
+                cost = estimate_tokens(line) + 1 + (0 if section else estimate_tokens(title) + 2)
+                if used + cost > budget:
+                    break
+                section.append(line)
+                used += cost
+            if section:
+                lines.append(f"{title}:")
+                lines.extend(section)
+        return lines, used
+
+    def _select_turns(self, turns: List[Turn], budget: int) -> List[Turn]:
+        if not turns:
+            return []
+        query = next((t.user_text for t in reversed(turns) if t.user_text), "")
+        query_vector = embed(query) if query else {}
+        count = len(turns)
+        scored = []
+        for i, turn in enumerate(turns):
+            recency = (i + 1) / count
+            relevance = cosine(query_vector, turn.embedding) if query_vector else 0.0
+            score = self.recency_weight * recency + (1 - self.recency_weight) * relevance
+            scored.append((score, i))
+        selected, used = set(), 0
+        for _, i in sorted(scored, reverse=True):
+            if used + turns[i].tokens <= budget:
+                selected.add(i)
+                used += turns[i].tokens
+        return [turns[i] for i in sorted(selected)]
+
+    def build(self, turns: List[Turn], memories: Dict) -> str:
+        memory_lines, memory_used = self._build_memories(
+            memories or {}, int(self.budget * self.memory_share))
+        selected = self._select_turns(turns, self.budget - memory_used)
+
+        parts = []
+        if memory_lines:
+            parts.append("Long-term memory:\n" + "\n".join(memory_lines))
+        if selected:
+            parts.append("Recent conversation:\n" + "\n".join(
+                line for turn in selected for line in turn.lines))
+        context = "\n\n".join(parts)
+        raw = "".join(t.raw_text for t in turns)
+        if raw:
+            logger.debug(f"Conversation context ({len(selected)}/{len(turns)} turns): "
+                         f"{reduction_report(raw, context)}")
+        return context
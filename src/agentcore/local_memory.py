@@ -0,0 +1,198 @@
+"""本地记忆后端 - 基于 SQLite 实现 MemoryHookProvider 用到的 MemoryClient 接口，用于离线压测和基准测试
+
+长期记忆的抽取在写入事件时同步完成：用户消息按语义策略存为事实记录，带偏好表达的用户消息存为偏好记录，
+会话摘要由该会话最近的消息拼接而成。retrieve_memories 使用 utils.embedding 的本地向量做相似度检索。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from botocore.exceptions import ClientError
+from utils.embedding import cosine, embed
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+LOCAL_MEMORY_PATH = os.environ.get("LOCAL_MEMORY_PATH", ".cache/local_memory.db")
+
+# 创建 Memory 时的策略键（StrategyType 的取值）与 get_memory_strategies 返回的策略类型
+STRATEGY_TYPES = {
+    "userPreferenceMemoryStrategy": "USER_PREFERENCE",
+    "semanticMemoryStrategy": "SEMANTIC",
+    "summaryMemoryStrategy": "SUMMARIZATION",
+}
+PREFERENCE_CUES = ("喜欢", "偏好", "倾向", "希望", "不要", "不想", "习惯", "prefer", "like", "don't want")
+# 会话摘要保留的最近消息数和每条消息的最大字符数
+SUMMARY_MESSAGES = 10
+SUMMARY_MESSAGE_CHARS = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    id TEXT PRIMARY KEY, name TEXT UNIQUE, description TEXT, strategies TEXT,
+    event_expiry_days INTEGER, created_at REAL);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT, memory_id TEXT, actor_id TEXT, session_id TEXT,
+    ts REAL, messages TEXT);
+CREATE INDEX IF NOT EXISTS events_session ON events (memory_id, actor_id, session_id, ts, seq);
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY, memory_id TEXT, namespace TEXT, text TEXT, embedding TEXT, created_at REAL);
+CREATE INDEX IF NOT EXISTS records_namespace ON records (memory_id, namespace);
+"""
+
+
+class LocalMemoryClient:
+    """与 bedrock_agentcore.memory.MemoryClient 接口兼容的本地实现；path 为 ":memory:" 时不落盘"""
+
+    def __init__(self, path: str = LOCAL_MEMORY_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # 向量按记录 ID 缓存，避免每次检索都反序列化
+        self._embeddings: Dict[str, Dict[int, float]] = {}
+
+    def _execute(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            with self._conn:
+                return self._conn.execute(sql, params).fetchall()
+
+    def create_memory_and_wait(self, name: str, strategies: List[Dict], description: Optional[str] = None,
+                               event_expiry_days: int = 90, **kwargs) -> Dict:
+        if self._execute("SELECT id FROM memories WHERE name = ?", (name,)):
+            raise ClientError(
+                {"Error": {"Code": "ValidationException", "Message": f"Memory {name} already exists"}},
+                "CreateMemory")
+        memory_id = f"{name}-{uuid.uuid4().hex[:10]}"
+        self._execute("INSERT INTO memories VALUES (?, ?, ?, ?, ?, ?)",
+                      (memory_id, name, description, json.dumps(strategies), event_expiry_days, time.time()))
+        return {"id": memory_id, "name": name, "status": "ACTIVE"}
+
+    def list_memories(self, max_results: int = 100) -> List[Dict]:
+        rows = self._execute("SELECT id, name FROM memories ORDER BY created_at LIMIT ?", (max_results,))
+        return [{"id": memory_id, "name": name, "status": "ACTIVE"} for memory_id, name in rows]
+
+    def delete_memory_and_wait(self, memory_id: str, **kwargs) -> Dict:
+        for table, column in (("memories", "id"), ("events", "memory_id"), ("records", "memory_id")):
+            self._execute(f"DELETE FROM {table} WHERE {column} = ?", (memory_id,))
+        return {"memoryId": memory_id, "status": "DELETED"}
+
+    def get_memory_strategies(self, memory_id: str) -> List[Dict]:
+        rows = self._execute("SELECT strategies FROM memories WHERE id = ?", (memory_id,))
+        if not rows:
+            raise ClientError(
+                {"Error": {"Code": "ResourceNotFoundException", "Message": f"Memory {memory_id} not found"}},
+                "GetMemory")
+        strategies = []
+        for strategy in json.loads(rows[0][0]):
+            for key, config in strategy.items():
+                strategies.append({
+                    "type": STRATEGY_TYPES.get(key, key),
+                    "name": config.get("name"),
+                    "namespaces": config.get("namespaces", []),
+                })
+        return strategies
+
+    def _add_record(self, memory_id: str, namespace: str, text: str, record_id: Optional[str] = None):
+        record_id = record_id or uuid.uuid4().hex
+        vector = embed(text)
+        self._execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                      (record_id, memory_id, namespace, text, json.dumps(vector), time.time()))
+        self._embeddings[record_id] = vector
+
+    def _extract(self, memory_id: str, actor_id: str, session_id: str, messages: List[Tuple[str, str]],
+                 strategies: List[Dict]):
+        """模拟长期记忆策略：从新消息中抽取事实、偏好和会话摘要"""
+        for strategy in strategies:
+            if not strategy["namespaces"]:
+                continue
+            namespace = strategy["namespaces"][0].replace("{actorId}", actor_id).replace("{sessionId}", session_id)
+            if strategy["type"] == "SUMMARIZATION":
+                recent = self._session_messages(memory_id, actor_id, session_id, SUMMARY_MESSAGES)
+                summary = "\n".join(f"{role}: {text[:SUMMARY_MESSAGE_CHARS]}" for text, role in recent)
+                self._add_record(memory_id, namespace, summary, record_id=f"summary:{namespace}")
+                continue
+            for text, role in messages:
+                if role.upper() != "USER":
+                    continue
+                if strategy["type"] == "SEMANTIC" or (
+                        strategy["type"] == "USER_PREFERENCE"
+                        and any(cue in text.lower() for cue in PREFERENCE_CUES)):
+                    self._add_record(memory_id, namespace, text)
+
+    def _session_messages(self, memory_id: str, actor_id: str, session_id: str,
+                          limit: int) -> List[Tuple[str, str]]:
+        rows = self._execute(
+            "SELECT messages FROM events WHERE memory_id = ? AND actor_id = ? AND session_id = ? "
+            "ORDER BY ts DESC, seq DESC LIMIT ?", (memory_id, actor_id, session_id, limit))
+        messages = [tuple(m) for row in reversed(rows) for m in json.loads(row[0])]
+        return messages[-limit:]
+
+    def create_event(self, memory_id: str, actor_id: str, session_id: str,
+                     messages: List[Tuple[str, str]], event_timestamp: Optional[datetime] = None,
+                     **kwargs) -> Dict:
+        strategies = self.get_memory_strategies(memory_id)
+        event_id = uuid.uuid4().hex
+        ts = event_timestamp.timestamp() if event_timestamp else time.time()
+        messages = [(text, role.upper()) for text, role in messages]
+        self._execute("INSERT INTO events (id, memory_id, actor_id, session_id, ts, messages) "
+                      "VALUES (?, ?, ?, ?, ?, ?)",
+                      (event_id, memory_id, actor_id, session_id, ts, json.dumps(messages, ensure_ascii=False)))
+        self._extract(memory_id, actor_id, session_id, messages, strategies)
+        return {"eventId": event_id, "memoryId": memory_id, "actorId": actor_id, "sessionId": session_id}
+
+    def get_last_k_turns(self, memory_id: str, actor_id: str, session_id: str, k: int = 5,
+                         **kwargs) -> List[List[Dict]]:
+        """按时间顺序返回最近 k 轮对话；每轮以一条用户消息开始"""
+        turns: List[List[Dict]] = []
+        current: List[Dict] = []
+        offset, page = 0, 100
+        while len(turns) < k:
+            rows = self._execute(
+                "SELECT messages FROM events WHERE memory_id = ? AND actor_id = ? AND session_id = ? "
+                "ORDER BY ts DESC, seq DESC LIMIT ? OFFSET ?", (memory_id, actor_id, session_id, page, offset))
+            if not rows:
+                break
+            offset += len(rows)
+            # 从最新的消息向前回溯，遇到用户消息即完成一轮
+            for row in rows:
+                for text, role in reversed(json.loads(row[0])):
+                    current.insert(0, {"role": role, "content": {"text": text}})
+                    if role == "USER":
+                        turns.append(current)
+                        current = []
+                        if len(turns) >= k:
+                            break
+                if len(turns) >= k:
+                    break
+        if current and len(turns) < k:
+            turns.append(current)
+        return list(reversed(turns))
+
+    def retrieve_memories(self, memory_id: str, namespace: str, query: str, actor_id: Optional[str] = None,
+                          top_k: int = 3) -> List[Dict]:
+        """在命名空间（按前缀匹配）内按向量相似度检索记忆记录"""
+        rows = self._execute(
+            "SELECT id, namespace, text, embedding FROM records "
+            "WHERE memory_id = ? AND namespace >= ? AND namespace < ?",
+            (memory_id, namespace, namespace + "\uffff"))
+        query_vector = embed(query)
+        scored = []
+        for record_id, record_namespace, text, embedding in rows:
+            vector = self._embeddings.get(record_id)
+            if vector is None:
+                vector = self._embeddings[record_id] = {int(k): v for k, v in json.loads(embedding).items()}
+            scored.append((cosine(query_vector, vector), record_id, record_namespace, text))
+        scored.sort(reverse=True)
+        return [{"memoryRecordId": record_id, "content": {"text": text}, "namespaces": [record_namespace],
+                 "score": round(score, 4)}
+                for score, record_id, record_namespace, text in scored[:top_k]]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,13 +1,47 @@
 """记忆管理模块 - 提供 Bedrock AgentCore 的短期和长期记忆的创建、存储和检索功能"""
-from typing import Dict
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 from botocore.exceptions import ClientError
 from strands.hooks import AgentInitializedEvent, HookProvider, HookRegistry, MessageAddedEvent
 from bedrock_agentcore.memory import MemoryClient
 from bedrock_agentcore.memory.constants import StrategyType
+from agentcore.context_builder import ContextBuilder, SessionContext
+from agentcore.local_memory import LocalMemoryClient
+from agentcore.memory_writer import MemoryWriteBehind
+from utils.cache import TTLCache
 from utils.logger import get_logger
+from utils.tracing import span, traced
 
 logger = get_logger(__name__)
 
+# 记忆后端：agentcore 使用 Bedrock AgentCore Memory 服务，local 使用本地 SQLite 实现（离线压测、基准测试）
+MEMORY_BACKEND = os.environ.get("MEMORY_BACKEND", "agentcore").strip().lower()
+
+# 会话记忆（最近对话和长期记忆检索结果）的预取缓存有效期（秒）和条目上限
+MEMORY_PREFETCH_TTL = float(os.environ.get("MEMORY_PREFETCH_TTL", "300"))
+MEMORY_PREFETCH_MAX_SESSIONS = int(os.environ.get("MEMORY_PREFETCH_MAX_SESSIONS", "1000"))
+# 预取使用独立线程池：on_agent_initialized 本身可能运行在共享阻塞线程池中，复用会有死锁风险
+MEMORY_PREFETCH_WORKERS = int(os.environ.get("MEMORY_PREFETCH_WORKERS", "8"))
+RECENT_TURNS_K = 5
+
+# get_memory_strategies 返回的策略类型及创建时使用的默认命名空间
+PREFERENCE_NAMESPACE = ("USER_PREFERENCE", "users/{actorId}/preference")
+SEMANTIC_NAMESPACE = ("SEMANTIC", "users/{actorId}/semantic")
+SUMMARY_NAMESPACE = ("SUMMARIZATION", "user/{actorId}/summary/{sessionId}")
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=MEMORY_PREFETCH_WORKERS,
+                                        thread_name_prefix="memory-prefetch")
+
+
+def create_memory_client(region_name: str):
+    """按 MEMORY_BACKEND 创建记忆客户端"""
+    if MEMORY_BACKEND == "local":
+        logger.info("Using local memory backend")
+        return LocalMemoryClient()
+    return MemoryClient(region_name=region_name)
+
 
 def create_short_term_memory(memory_client: MemoryClient, memory_name: str):
     """创建短期记忆"""
@@ -118,49 +152,120 @@ def create_long_term_memory(memory_client: MemoryClient, memory_name: str):
 
 
 class MemoryHookProvider(HookProvider):
-    def __init__(self, memory_client: MemoryClient, memory_id: str):
+    def __init__(self, memory_client: MemoryClient, memory_id: str,
+                 writer: Optional[MemoryWriteBehind] = None, namespaces: Optional[Dict] = None):
         self.memory_client = memory_client
         self.memory_id = memory_id
+        # 指定 writer 时消息交给后台线程批量写入，Hook 回调不再阻塞在网络调用上
+        self.writer = writer
+        # 命名空间可由调用方从本地元数据缓存传入，为 None 时首次使用才查询
+        self.namespaces = namespaces
+        self.session_memories = TTLCache("memory_prefetch", ttl=MEMORY_PREFETCH_TTL,
+                                         max_entries=MEMORY_PREFETCH_MAX_SESSIONS)
+        self.context_builder = ContextBuilder()
+        self.session_contexts = TTLCache("memory_context", ttl=MEMORY_PREFETCH_TTL,
+                                         max_entries=MEMORY_PREFETCH_MAX_SESSIONS)
 
     def get_namespaces(self, memory_client: MemoryClient, memory_id: str) -> Dict:
         """获取长期记忆策略的命名空间映射"""
         strategies = memory_client.get_memory_strategies(memory_id)
         return {i["type"]: i["namespaces"][0] for i in strategies}
 
+    def namespace(self, strategy, actor_id: str, session_id: str = "") -> str:
+        """按策略类型生成命名空间，strategy 为 (策略类型, 默认模板)"""
+        if self.namespaces is None:
+            self.namespaces = self.get_namespaces(self.memory_client, self.memory_id)
+        strategy_type, default = strategy
+        template = self.namespaces.get(strategy_type, default)
+        return template.replace("{actorId}", actor_id).replace("{sessionId}", session_id)
+
+    def _retrieve(self, namespace: str, query: str):
+        return self.memory_client.retrieve_memories(
+            memory_id=self.memory_id, namespace=namespace, query=query)
+
+    @traced("memory.prefetch")
+    def _load_session_memories(self, actor_id: str, session_id: str) -> Dict:
+        """并发获取最近对话和三类长期记忆，单项失败不影响其他项"""
+        def submit(name, func, *args, **kwargs):
+            # 在各自复制的上下文中执行，检索 span 挂在当前请求下
+            return _prefetch_executor.submit(
+                contextvars.copy_context().run, traced(f"memory.{name}")(func), *args, **kwargs)
+
+        futures = {
+            "turns": submit(
+                "turns", self.memory_client.get_last_k_turns, memory_id=self.memory_id,
+                actor_id=actor_id, session_id=session_id, k=RECENT_TURNS_K),
+            "preferences": submit(
+                "preferences", self._retrieve, self.namespace(PREFERENCE_NAMESPACE, actor_id),
+                "Summarise all the preferences"),
+            "semantics": submit(
+                "semantics", self._retrieve, self.namespace(SEMANTIC_NAMESPACE, actor_id),
+                "Summarise all the semantics"),
+            "summaries": submit(
+                "summaries", self._retrieve, self.namespace(SUMMARY_NAMESPACE, actor_id, session_id),
+                "Summarise all the questions"),
+        }
+        memories = {}
+        for name, future in futures.items():
+            try:
+                memories[name] = future.result() or []
+            except Exception as e:
+                logger.error(f"Memory prefetch [{name}] error: {e}")
+                memories[name] = []
+        return memories
+
+    def prefetch(self, actor_id: str, session_id: str) -> Dict:
+        """获取会话记忆 {"turns", "preferences", "semantics", "summaries"}；
+        每个会话首次使用时并发加载一次，并发的相同请求共享同一次加载"""
+        return self.session_memories.get_or_load(
+            (actor_id, session_id), lambda: self._load_session_memories(actor_id, session_id))
+
+    def session_context(self, actor_id: str, session_id: str) -> SessionContext:
+        """获取会话上下文；首次使用时由预取的记忆构建，之后随新消息增量更新"""
+        def load():
+            memories = self.prefetch(actor_id, session_id)
+            return self.context_builder.session(memories["turns"], memories)
+        return self.session_contexts.get_or_load((actor_id, session_id), load)
+
     def on_agent_initialized(self, event: AgentInitializedEvent):
         """Agent 启动时加载最近的对话历史"""
         try:
             actor_id = event.agent.state.get("actor_id")
             session_id = event.agent.state.get("session_id")
-            self.namespaces = self.get_namespaces(
-                self.memory_client, self.memory_id)
 
             if not actor_id or not session_id:
                 logger.warning("Missing actor_id or session_id in agent state")
                 return
 
-            recent_turns = self.memory_client.get_last_k_turns(
-                memory_id=self.memory_id,
-                actor_id=actor_id,
-                session_id=session_id,
-                k=5
-            )
-
-            if recent_turns:
-                context_messages = []
-                for turn in recent_turns:
-                    for message in turn:
-                        role = message['role']
-                        content = message['content']['text']
-                        context_messages.append(f"{role}: {content}")
-
-                context = "\n".join(context_messages)
-                event.agent.system_prompt += f"\n\nRecent conversation:\n{context}"
-                logger.debug(f"✅ Loaded {len(recent_turns)} conversation turns")
+            # 在 token 预算内挑选最近对话和长期记忆，而不是原样拼接最近几轮对话
+            with span("memory.load") as item:
+                context = self.session_context(actor_id, session_id).render()
+                item.record_text("context", context)
+            if context:
+                event.agent.system_prompt += f"\n\n{context}"
+                logger.debug(f"✅ Loaded conversation context ({len(context)} chars)")
 
         except Exception as e:
             logger.error(f"Memory load error: {e}")
 
+    @traced("memory.save")
+    def save_message(self, actor_id: str, session_id: str, text: str, role: str):
+        """将一条消息存储到 Memory 中"""
+        # 会话有新消息：预取结果失效，已构建的会话上下文直接追加该消息
+        self.session_memories.invalidate((actor_id, session_id))
+        context = self.session_contexts.get((actor_id, session_id))
+        if context is not None:
+            context.append(role, text)
+        if self.writer is not None:
+            self.writer.submit(self.memory_id, actor_id, session_id, text, role)
+            return
+        self.memory_client.create_event(
+            memory_id=self.memory_id,
+            actor_id=actor_id,
+            session_id=session_id,
+            messages=[(text, role)]
+        )
+
     def on_message_added(self, event: MessageAddedEvent):
         """将消息存储到 Memory 中"""
         messages = event.agent.messages
@@ -169,12 +274,8 @@ class MemoryHookProvider(HookProvider):
             session_id = event.agent.state.get("session_id")
 
             if messages[-1]["content"][0].get("text"):
-                self.memory_client.create_event(
-                    memory_id=self.memory_id,
-                    actor_id=actor_id,
-                    session_id=session_id,
-                    messages=[(messages[-1]["content"][0]["text"], messages[-1]["role"])]
-                )
+                self.save_message(actor_id, session_id,
+                                  messages[-1]["content"][0]["text"], messages[-1]["role"])
         except Exception as e:
             logger.error(f"Memory save error: {e}")
 
@@ -185,12 +286,7 @@ class MemoryHookProvider(HookProvider):
     def view_memories(self, actor_id, session_id):
         print(
             f"=== Memory [Contents - 对话内容] for [{actor_id=}], [{session_id=}] ===")
-        recent_turns = self.memory_client.get_last_k_turns(
-            memory_id=self.memory_id,
-            actor_id=actor_id,
-            session_id=session_id,
-            k=3
-        )
+        recent_turns = self.prefetch(actor_id, session_id)["turns"][-3:]
         for i, turn in enumerate(recent_turns, 1):
             print(f"Turn {i}:")
             for message in turn:
@@ -199,34 +295,16 @@ class MemoryHookProvider(HookProvider):
                 print(f"  {role}: {content}")
             print()    
 
-    def retrieve_user_preference(self, actor_id):
+    def retrieve_user_preference(self, actor_id, session_id):
         print(f"=== Memory [User Preferences - 用户偏好] for [{actor_id=}] ===")
+        return self.prefetch(actor_id, session_id)["preferences"]
 
-        memories = self.memory_client.retrieve_memories(
-            memory_id=self.memory_id,
-            namespace=f"users/{actor_id}/preference",
-            query="Summarise all the preferences"
-        )
-        return memories
-
-    def retrieve_semantic(self, actor_id):
+    def retrieve_semantic(self, actor_id, session_id):
         print(
             f"=== Memory [Semantics - 语义事实] for [{actor_id=}] ===")
-
-        memories = self.memory_client.retrieve_memories(
-            memory_id=self.memory_id,
-            namespace=f"users/{actor_id}/semantic",
-            query="Summarise all the semantics"
-        )
-        return memories
+        return self.prefetch(actor_id, session_id)["semantics"]
 
     def retrieve_summaries(self, actor_id, session_id):
         print(
             f"=== Memory [Summaries - 摘要总结] for [{actor_id=}], [{session_id=}] ===")
-
-        memories = self.memory_client.retrieve_memories(
-            memory_id=self.memory_id,
-            namespace=f"user/{actor_id}/summary/{session_id}",
-            query="Summarise all the questions"
-        )
-        return memories
+        return self.prefetch(actor_id, session_id)["summaries"]
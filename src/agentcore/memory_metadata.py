@@ -0,0 +1,73 @@
+"""记忆元数据缓存 - 将 Memory ID 和长期记忆策略的命名空间记录在本地文件中，
+避免每次启动都调用 create_memory_and_wait / list_memories / get_memory_strategies"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from bedrock_agentcore.memory import MemoryClient
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MEMORY_METADATA_PATH = os.environ.get("MEMORY_METADATA_PATH", ".cache/memory_metadata.json")
+# 本地记录的有效期（秒），过期后重新向 AgentCore 查询
+MEMORY_METADATA_TTL = float(os.environ.get("MEMORY_METADATA_TTL", "86400"))
+
+_lock = threading.Lock()
+
+
+def _read(path: str) -> Dict:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to load memory metadata from {path}: {e}")
+        return {}
+
+
+def load_memory_metadata(memory_name: str, path: str = MEMORY_METADATA_PATH,
+                         ttl: float = MEMORY_METADATA_TTL) -> Optional[Dict]:
+    """返回未过期的本地记录 {"memory_id", "namespaces", "saved_at"}，不存在或已过期时返回 None"""
+    record = _read(path).get(memory_name)
+    if not record or record.get("saved_at", 0) + ttl <= time.time():
+        return None
+    return record
+
+
+def save_memory_metadata(memory_name: str, memory_id: str, namespaces: Dict,
+                         path: str = MEMORY_METADATA_PATH):
+    if not path:
+        return
+    with _lock:
+        data = _read(path)
+        data[memory_name] = {"memory_id": memory_id, "namespaces": namespaces, "saved_at": time.time()}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def get_memory_metadata(memory_client: MemoryClient, memory_name: str,
+                        create_fn: Callable[[MemoryClient, str], Optional[str]],
+                        path: str = MEMORY_METADATA_PATH,
+                        ttl: float = MEMORY_METADATA_TTL) -> Tuple[Optional[str], Dict]:
+    """返回 (memory_id, namespaces)：优先使用本地记录，否则调用 create_fn 创建（或查找）Memory 并查询策略命名空间"""
+    record = load_memory_metadata(memory_name, path, ttl)
+    if record is not None:
+        logger.info(f"Using cached memory metadata for [{memory_name}]: {record['memory_id']}")
+        return record["memory_id"], record["namespaces"]
+
+    memory_id = create_fn(memory_client, memory_name)
+    if not memory_id:
+        return None, {}
+    strategies = memory_client.get_memory_strategies(memory_id)
+    namespaces = {i["type"]: i["namespaces"][0] for i in strategies}
+    try:
+        save_memory_metadata(memory_name, memory_id, namespaces, path)
+    except OSError as e:
+        logger.warning(f"Failed to persist memory metadata: {e}")
+    return memory_id, namespaces
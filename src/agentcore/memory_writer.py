@@ -0,0 +1,372 @@
+"""记忆异步写入 - 将消息放入有界队列，由后台线程落盘到本地 spool 文件并按会话批量调用 create_event，
+避免每条消息的磁盘和网络写入阻塞响应路径"""
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from bedrock_agentcore.memory import MemoryClient
+from utils import metrics
+from utils.logger import get_logger
+from utils.tracing import span
+
+logger = get_logger(__name__)
+
+# 批量大小、最长攒批时间（秒）、队列容量（同时也是内存中待写入消息的上限）和 spool 文件路径
+MEMORY_WRITE_BATCH_SIZE = int(os.environ.get("MEMORY_WRITE_BATCH_SIZE", "20"))
+MEMORY_WRITE_FLUSH_INTERVAL = float(os.environ.get("MEMORY_WRITE_FLUSH_INTERVAL", "1.0"))
+MEMORY_WRITE_QUEUE_SIZE = int(os.environ.get("MEMORY_WRITE_QUEUE_SIZE", "10000"))
+MEMORY_WRITE_SPOOL_PATH = os.environ.get("MEMORY_WRITE_SPOOL_PATH", ".cache/memory_spool.jsonl")
+# 每条消息的最大重试次数，超过后（或遇到不可重试的错误时）移入死信文件
+MEMORY_WRITE_MAX_RETRIES = int(os.environ.get("MEMORY_WRITE_MAX_RETRIES", "3"))
+MEMORY_WRITE_DEAD_LETTER_PATH = os.environ.get("MEMORY_WRITE_DEAD_LETTER_PATH", ".cache/memory_dead_letter.jsonl")
+
+# 重试无意义的错误：请求本身有问题，而不是服务暂时不可用
+NON_RETRYABLE_CODES = ("ValidationException", "AccessDeniedException", "ResourceNotFoundException",
+                       "SerializationException")
+
+_STOP = object()
+# spool 中的确认记录达到该数量（且超过未确认消息数）时才重写文件，摊销后每条消息的落盘开销为常数
+_COMPACT_MIN_TOMBSTONES = 1024
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TypeError, ValueError)):
+        return False
+    response = getattr(error, "response", None)
+    code = response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+    return code not in NON_RETRYABLE_CODES
+
+
+def _retry_delay(attempts: int) -> float:
+    return random.uniform(0, min(10.0, 0.5 * 2 ** (attempts - 1)))
+
+
+def _encode(entry: Dict) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class MemoryWriteBehind:
+    """记忆事件的 write-behind 队列。
+
+    submit 只把消息放入有界队列，从不阻塞也不读写磁盘（Hook 回调运行在事件循环上）；
+    队列已满（后台线程长时间卡在写入上）时丢弃消息并计入 memory_writer.dropped。
+    后台线程取出消息后先追加到 spool 文件，spool 只追加：确认写入时追加一条确认记录，
+    确认记录累积到一定数量后才用未确认的消息重写文件。
+    内存中待写入的消息最多 max_queue 条，超出的消息只保留在 spool 中，内存有空位时再按顺序读回，
+    因此写入长时间失败时内存占用仍有上限。
+    后台线程在攒够 batch_size 条或超过 flush_interval 时，按 memory/actor/session 分组，
+    每组合并为一次 create_event 调用。整组失败时逐条写入，定位出写不进去的消息：
+    它之前的消息照常确认，它和同一会话的后续消息按指数退避稍后重试，退避期间其他会话照常写入；
+    同一条消息失败超过 max_retries 次或遇到不可重试的错误时移入死信文件，不再阻塞所在会话。
+    进程崩溃后重启时会重放 spool 中尚未确认的消息；崩溃时仍在队列中、尚未落盘的消息会丢失。
+    """
+
+    def __init__(self, memory_client: MemoryClient, batch_size: int = MEMORY_WRITE_BATCH_SIZE,
+                 flush_interval: float = MEMORY_WRITE_FLUSH_INTERVAL,
+                 max_queue: int = MEMORY_WRITE_QUEUE_SIZE,
+                 spool_path: str = MEMORY_WRITE_SPOOL_PATH,
+                 max_retries: int = MEMORY_WRITE_MAX_RETRIES,
+                 dead_letter_path: str = MEMORY_WRITE_DEAD_LETTER_PATH):
+        self.memory_client = memory_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_queue
+        self.spool_path = spool_path
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        # 以下状态只由后台线程访问：按会话分组的待写入消息、内存中未确认的消息（按落盘顺序），
+        # 以及 spool 中只保留在磁盘上的溢出消息的起始位置（没有溢出时为 None）
+        self._pending: "OrderedDict[tuple, List[Dict]]" = OrderedDict()
+        self._pending_count = 0
+        self._unacked: "OrderedDict[str, Dict]" = OrderedDict()
+        self._spool = None
+        self._spill_offset: Optional[int] = None
+        self._tombstones = 0
+        self._counter_lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+        self.spilled = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+        self._open_spool()
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _read_spool(self, offset: int = 0):
+        """从 offset 开始逐条读取 spool，产出 (记录, 该记录之后的位置)；跳过崩溃时留下的不完整行"""
+        with open(self.spool_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                yield entry, offset
+
+    def _open_spool(self):
+        """去掉上次进程已确认的消息后打开 spool；未确认的消息作为溢出部分，由后台线程分批重放"""
+        if not self.spool_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        if os.path.exists(self.spool_path):
+            acked = set()
+            for entry, _ in self._read_spool():
+                acked.update(entry.get("ack", ()))
+            tmp_path = f"{self.spool_path}.tmp"
+            with open(tmp_path, "wb") as out:
+                for entry, _ in self._read_spool():
+                    if "ack" not in entry and entry["id"] not in acked:
+                        out.write(_encode(entry))
+                        self.spilled += 1
+            os.replace(tmp_path, self.spool_path)
+        self._spool = open(self.spool_path, "ab")
+        if self.spilled:
+            self._spill_offset = 0
+            self._idle.clear()
+            logger.info(f"Replaying {self.spilled} unsent memory events from {self.spool_path}")
+
+    def _write_spool(self, entry: Dict):
+        self._spool.write(_encode(entry))
+        self._spool.flush()
+
+    def _add(self, record: Dict):
+        self._unacked[record["id"]] = record
+        key = (record["memory_id"], record["actor_id"], record["session_id"])
+        self._pending.setdefault(key, []).append(record)
+        self._pending_count += 1
+
+    def _accept(self, record: Dict):
+        """落盘后台线程取出的消息；内存中待写入的消息已满或已有溢出消息时只保留在 spool 中，保持提交顺序"""
+        spill = self._spill_offset is not None or self._pending_count >= self.max_pending
+        if not spill:
+            if self._spool is not None:
+                self._write_spool(record)
+            self._add(record)
+        elif self._spool is None:
+            self._drop(record, "pending limit reached and no spool configured")
+        else:
+            if self._spill_offset is None:
+                self._spill_offset = self._spool.tell()
+            self._write_spool(record)
+            self.spilled += 1
+            metrics.increment("memory_writer.spilled")
+
+    def _load_spilled(self):
+        """内存有空位时按顺序从 spool 读回溢出的消息"""
+        if self._spill_offset is None:
+            return
+        for entry, offset in self._read_spool(self._spill_offset):
+            if "ack" not in entry:
+                if self._pending_count >= self.max_pending:
+                    return
+                self._add(entry)
+                self.spilled -= 1
+            self._spill_offset = offset
+        self._spill_offset = None
+
+    def _ack(self, records: List[Dict]):
+        """移除已写入的消息：spool 中只追加确认记录，确认记录足够多时才重写文件"""
+        if not records:
+            return
+        for record in records:
+            self._unacked.pop(record["id"], None)
+        if self._spool is None:
+            return
+        self._write_spool({"ack": [record["id"] for record in records]})
+        self._tombstones += len(records)
+        if (not self._unacked and self._spill_offset is None) or \
+                self._tombstones >= max(_COMPACT_MIN_TOMBSTONES, len(self._unacked) + self.spilled):
+            self._compact()
+
+    def _compact(self):
+        """用未确认的消息重写 spool：内存中的消息在前，溢出的消息按原顺序接在后面"""
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, "wb") as out:
+            for record in self._unacked.values():
+                out.write(_encode(record))
+            spill_offset = out.tell()
+            if self._spill_offset is not None:
+                for entry, _ in self._read_spool(self._spill_offset):
+                    if "ack" not in entry:
+                        out.write(_encode(entry))
+        self._spool.close()
+        os.replace(tmp_path, self.spool_path)
+        self._spool = open(self.spool_path, "ab")
+        if self._spill_offset is not None:
+            self._spill_offset = spill_offset
+        self._tombstones = 0
+
+    def _drop(self, record: Dict, reason: str):
+        with self._counter_lock:
+            self.dropped += 1
+        metrics.increment("memory_writer.dropped")
+        logger.warning(f"Dropped memory event for session {record['session_id']}: {reason}")
+
+    def submit(self, memory_id: str, actor_id: str, session_id: str, text: str, role: str):
+        """提交一条消息，不阻塞也不访问磁盘；队列已满时丢弃并计数"""
+        record = {
+            "id": uuid.uuid4().hex,
+            "memory_id": memory_id,
+            "actor_id": actor_id,
+            "session_id": session_id,
+            "text": text,
+            "role": role,
+            "ts": time.time(),
+            "attempts": 0,
+        }
+        self._idle.clear()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._drop(record, "write queue is full")
+            return
+        metrics.observe("memory_writer.queue_depth", self._queue.qsize())
+
+    def _create_event(self, key: tuple, records: List[Dict]) -> Optional[BaseException]:
+        """写入一组消息，返回失败时的异常"""
+        memory_id, actor_id, session_id = key
+        try:
+            self.memory_client.create_event(
+                memory_id=memory_id,
+                actor_id=actor_id,
+                session_id=session_id,
+                messages=[(r["text"], r["role"]) for r in records],
+                event_timestamp=datetime.fromtimestamp(records[0]["ts"], timezone.utc),
+            )
+            return None
+        except Exception as e:
+            return e
+
+    def _dead_letter(self, record: Dict, error: BaseException):
+        """把无法写入的消息移入死信文件，并从 spool 中移除"""
+        logger.error(f"Memory event {record['id']} for session {record['session_id']} dead-lettered "
+                     f"after {record['attempts']} attempts: {error}")
+        self.dead_lettered += 1
+        metrics.increment("memory_writer.dead_lettered")
+        if self.dead_letter_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(dict(record, error=repr(error)), ensure_ascii=False) + "\n")
+        self._ack([record])
+
+    def _write_session(self, key: tuple, records: List[Dict]) -> Tuple[List[Dict], Optional[float]]:
+        """写入一个会话的消息，返回 (需要重试的消息, 重试前的退避秒数)"""
+        error = self._create_event(key, records)
+        if error is None:
+            self._ack(records)
+            return [], None
+        if len(records) > 1:
+            # 整组失败时逐条写入，按顺序确认到第一条失败的消息为止
+            for i, record in enumerate(records):
+                error = self._create_event(key, [record])
+                if error is not None:
+                    self._ack(records[:i])
+                    records = records[i:]
+                    break
+            else:
+                self._ack(records)
+                return [], None
+        head = records[0]
+        head["attempts"] = head.get("attempts", 0) + 1
+        logger.warning(f"Memory save error for session {key[2]} (attempt {head['attempts']}): {error}")
+        if head["attempts"] > self.max_retries or not is_retryable(error):
+            self._dead_letter(head, error)
+            return records[1:], None
+        return records, _retry_delay(head["attempts"])
+
+    def _flush(self, retry_at: Dict[tuple, float], force: bool):
+        """写入未在退避中的会话（force 时写入全部会话），失败的消息留在待写入列表中"""
+        pending = self._pending
+        now = time.monotonic()
+        ready = [key for key in pending if force or retry_at.get(key, 0.0) <= now]
+        messages = sum(len(pending[key]) for key in ready)
+        start = time.perf_counter()
+        written = 0
+        # 后台线程中没有请求上下文，每次批量写入单独成为一个 trace
+        with span("memory.flush", events=len(ready), messages=messages):
+            for key in ready:
+                records = pending.pop(key)
+                remaining, delay = self._write_session(key, records)
+                written += len(records) - len(remaining)
+                self._pending_count -= len(records) - len(remaining)
+                retry_at.pop(key, None)
+                if remaining:
+                    pending[key] = remaining
+                    if delay is not None:
+                        retry_at[key] = now + delay
+        metrics.observe("memory_writer.flush_seconds", time.perf_counter() - start)
+        metrics.increment("memory_writer.events", len(ready))
+        metrics.increment("memory_writer.messages", written)
+
+    def _run(self):
+        # 写入失败的会话的下次重试时间
+        retry_at: Dict[tuple, float] = {}
+        deadline = None
+        stopping = False
+        pending = self._pending
+
+        def ready_count(now: float) -> int:
+            return sum(len(records) for key, records in pending.items() if retry_at.get(key, 0.0) <= now)
+
+        while True:
+            # 退避已结束的会话由攒批截止时间驱动写入，这里只等待尚未到期的重试时间
+            self._load_spilled()
+            now = time.monotonic()
+            if deadline is None and ready_count(now):
+                deadline = now + self.flush_interval
+            wakeups = [t for t in retry_at.values() if t > now] + ([deadline] if deadline is not None else [])
+            timeout = max(0.0, min(wakeups) - now) if wakeups else None
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    self._accept(item)
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            ready = ready_count(now)
+            if ready and deadline is None:
+                deadline = now + self.flush_interval
+            due = deadline is not None and now >= deadline
+            if pending and (stopping or due or ready >= self.batch_size):
+                self._flush(retry_at, force=stopping)
+                deadline = None
+            if not pending and self._spill_offset is None and self._queue.empty():
+                self._idle.set()
+            if stopping:
+                if self._spool is not None:
+                    self._spool.close()
+                return
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待队列中的消息全部写入（或移入死信文件），返回是否在超时前完成"""
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """停止后台线程并写入内存中剩余的消息；未能写入的消息和溢出的消息保留在 spool 中"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Memory writer is stuck, unsent events are kept in the spool")
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        return {"queue_depth": self._queue.qsize(), "pending": self._pending_count, "spilled": self.spilled,
+                "dropped": self.dropped, "dead_lettered": self.dead_lettered}
@@ -0,0 +1,137 @@
+"""会话注册表 - 按 actor_id/session_id 维护每个会话独立的 Agent，按 LRU/TTL 淘汰空闲会话并限制会话总数"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+from utils.executor import run_blocking
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 同时保持的会话上限，以及空闲会话的过期秒数
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "100"))
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", "1800"))
+
+
+class SessionLimitError(Exception):
+    """会话数已达上限，且没有可以淘汰的空闲会话"""
+
+
+class Session:
+    """单个会话的 Agent 及其状态；同一会话的请求通过 lock 串行执行"""
+
+    def __init__(self, actor_id: str, session_id: str, agent):
+        self.actor_id = actor_id
+        self.session_id = session_id
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.requests = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+
+class SessionRegistry:
+    """会话注册表，所有操作都在同一个事件循环上执行。
+
+    会话在首次请求时才创建 Agent（触发记忆 Hook 加载最近对话），
+    超过 idle_ttl 未使用的会话会被清理；达到 max_sessions 时淘汰最久未使用的空闲会话。
+    """
+
+    def __init__(self, factory: Callable, max_sessions: int = MAX_SESSIONS,
+                 idle_ttl: float = SESSION_IDLE_TTL):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[Tuple[str, str], Session]" = OrderedDict()
+        self._creating: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.created = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def evict_idle(self) -> int:
+        """清理超过 idle_ttl 未使用的空闲会话，返回清理数量"""
+        now = time.monotonic()
+        expired = [key for key, session in self._sessions.items()
+                   if not session.busy and now - session.last_used > self.idle_ttl]
+        for key in expired:
+            del self._sessions[key]
+        self.evicted += len(expired)
+        if expired:
+            logger.info(f"Evicted {len(expired)} idle sessions")
+        return len(expired)
+
+    def _make_room(self):
+        """会话数达到上限时淘汰最久未使用的空闲会话"""
+        if len(self._sessions) + len(self._creating) < self.max_sessions:
+            return
+        self.evict_idle()
+        for key, session in self._sessions.items():
+            if len(self._sessions) + len(self._creating) < self.max_sessions:
+                return
+            if not session.busy:
+                del self._sessions[key]
+                self.evicted += 1
+                logger.info(f"Evicted least recently used session {key}")
+                return
+        if len(self._sessions) + len(self._creating) >= self.max_sessions:
+            self.rejected += 1
+            raise SessionLimitError(f"Too many active sessions (max {self.max_sessions})")
+
+    async def get(self, actor_id: str, session_id: str) -> Session:
+        """获取会话，不存在时创建；并发的相同会话创建请求只会创建一个 Agent"""
+        key = (actor_id, session_id)
+        session = self._sessions.get(key)
+        if session is not None:
+            self._sessions.move_to_end(key)
+            return session
+        pending = self._creating.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self._make_room()
+        pending = self._creating[key] = asyncio.get_running_loop().create_future()
+        try:
+            # 创建 Agent 会触发记忆加载等阻塞调用，放到线程池中执行
+            agent = await run_blocking(self.factory, actor_id, session_id)
+            session = Session(actor_id, session_id, agent)
+            self._sessions[key] = session
+            self.created += 1
+            pending.set_result(session)
+            logger.info(f"Created session {key}")
+            return session
+        except BaseException as e:
+            pending.set_exception(e)
+            # 避免无人等待时出现 "exception was never retrieved" 警告
+            pending.exception()
+            raise
+        finally:
+            del self._creating[key]
+
+    async def run(self, actor_id: str, session_id: str, handler: Callable):
+        """在会话锁内执行 handler(agent)，保证同一会话的请求串行"""
+        session = await self.get(actor_id, session_id)
+        async with session.lock:
+            session.requests += 1
+            try:
+                return await handler(session.agent)
+            finally:
+                session.last_used = time.monotonic()
+
+    def close(self, actor_id: str, session_id: str) -> bool:
+        """主动关闭会话"""
+        return self._sessions.pop((actor_id, session_id), None) is not None
+
+    def stats(self) -> Dict:
+        return {
+            "active": len(self._sessions),
+            "busy": sum(1 for s in self._sessions.values() if s.busy),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,206 @@
+"""子 Agent 池 - 为各专业 Agent 维护有上限的预热实例，按调用借出和归还"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, List
+from utils.executor import run_blocking
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 每个专业 Agent 的最大实例数，以及池满时借出的最长等待秒数
+AGENT_POOL_SIZE = int(os.environ.get("AGENT_POOL_SIZE", "4"))
+AGENT_POOL_TIMEOUT = float(os.environ.get("AGENT_POOL_TIMEOUT", "30"))
+
+_pools: Dict[str, "AgentPool"] = {}
+
+
+def reset_agent(agent):
+    """清空 Agent 的对话历史，使其可以被下一个请求复用"""
+    agent.messages.clear()
+    manager = getattr(agent, "conversation_manager", None)
+    if manager is not None and hasattr(manager, "removed_message_count"):
+        manager.removed_message_count = 0
+
+
+class AgentPool:
+    """有界 Agent 池：空闲实例直接复用（命中），不足时按需创建（未命中），达到上限后等待归还"""
+
+    def __init__(self, name: str, factory: Callable, max_size: int = AGENT_POOL_SIZE,
+                 timeout: float = AGENT_POOL_TIMEOUT, reset: Callable = reset_agent):
+        self.name = name
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.reset = reset
+        self._idle = deque()
+        self._created = 0
+        self._cond = threading.Condition()
+        # 异步借出的等待者：(事件循环, Future)，归还时在其事件循环上唤醒
+        self._async_waiters = deque()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        _pools[name] = self
+
+    def _take(self):
+        """持锁调用：返回 (空闲实例, 是否由调用方新建)；两者都没有时表示池已满"""
+        if self._idle:
+            self.hits += 1
+            return self._idle.pop(), False
+        if self._created < self.max_size:
+            self.misses += 1
+            self._created += 1
+            return None, True
+        return None, False
+
+    def _record_wait(self, start: float):
+        """持锁调用"""
+        elapsed = time.perf_counter() - start
+        self.waits += 1
+        self.wait_time_total += elapsed
+        self.wait_time_max = max(self.wait_time_max, elapsed)
+
+    def _notify(self):
+        """持锁调用：唤醒一个同步等待者和一个异步等待者，未抢到实例的一方继续等待"""
+        self._cond.notify()
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(self._wake, waiter)
+                break
+
+    def _wake(self, waiter: asyncio.Future):
+        """在等待者所在的事件循环上执行；等待者已超时或被取消时把唤醒转给下一个等待者"""
+        if waiter.done():
+            with self._cond:
+                self._notify()
+        else:
+            waiter.set_result(None)
+
+    def _create(self):
+        """在锁外创建实例，避免阻塞其他借还操作"""
+        try:
+            agent = self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._notify()
+            raise
+        logger.debug(f"Agent pool [{self.name}] created instance #{self._created}")
+        return agent
+
+    def acquire(self):
+        """借出一个 Agent，池满时最多等待 timeout 秒"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                agent, create = self._take()
+                if agent is not None or create:
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Agent pool [{self.name}] exhausted after waiting {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+            if waited:
+                self._record_wait(start)
+        return self._create() if create else agent
+
+    async def acquire_async(self):
+        """acquire 的异步版本：池满时在事件循环上等待归还，不占用阻塞线程池；
+        借出的 Agent 执行工具调用时还需要线程池，等待者占住线程会拖慢甚至卡死正在执行的请求"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                agent, create = self._take()
+                if agent is not None or create:
+                    if waited:
+                        self._record_wait(start)
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Agent pool [{self.name}] exhausted after waiting {self.timeout}s")
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            waited = True
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                with self._cond:
+                    if waiter.done() and not waiter.cancelled():
+                        self._notify()  # 已被唤醒但调用方被取消，把唤醒转给下一个等待者
+                raise
+            finally:
+                with self._cond:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+        # 创建实例（如首次加载模型配置）可能阻塞，放到线程池中
+        return await run_blocking(self._create) if create else agent
+
+    def release(self, agent):
+        """重置并归还 Agent；重置失败的实例直接丢弃"""
+        try:
+            self.reset(agent)
+        except Exception as e:
+            logger.error(f"Agent pool [{self.name}] reset failed, discarding instance: {e}")
+            with self._cond:
+                self._created -= 1
+                self._notify()
+            return
+        with self._cond:
+            self._idle.append(agent)
+            self._notify()
+
+    @contextmanager
+    def agent(self):
+        """借出 Agent 的上下文管理器，退出时自动归还"""
+        agent = self.acquire()
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    @asynccontextmanager
+    async def agent_async(self):
+        """agent 的异步版本"""
+        agent = await self.acquire_async()
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    def stats(self) -> Dict:
+        """池容量、等待时间和命中/未命中计数"""
+        with self._cond:
+            return {
+                "name": self.name,
+                "max_size": self.max_size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "wait_time_total": round(self.wait_time_total, 4),
+                "wait_time_max": round(self.wait_time_max, 4),
+            }
+
+
+def pool_stats() -> List[Dict]:
+    """所有 Agent 池的统计信息"""
+    return [pool.stats() for pool in _pools.values()]
@@ -1,13 +1,14 @@
 """通用助手 Agent - 处理非专业领域的通用知识查询"""
-import os
+import time
 from strands import Agent, tool
-from strands.models import BedrockModel
+from agents.agent_pool import AgentPool
+from agents.model_tiers import AGENT_TIERS, model_for, record_model_call
 from utils.logger import get_logger
+from utils.streaming import invoke_agent
+from utils.tracing import traced
 
 logger = get_logger(__name__)
 
-REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
-
 GENERAL_ASSISTANT_SYSTEM_PROMPT = """
 You are GeneralAssist, a concise general knowledge assistant for topics outside specialized domains. Your key characteristics are:
 
@@ -36,16 +37,20 @@ Always maintain accuracy while prioritizing conciseness and clarity in every res
 Always use Chinese as final output language.
 
 """
-# Create a BedrockModel
-bedrock_model = BedrockModel(
-    model_id="us.anthropic.claude-haiku-4-5-20251001-v1:0",
-    region_name=REGION,
-    temperature=0.3,
-    streaming=True,
-)
+def _create_general_agent():
+    """创建通用助手 Agent 实例，供 Agent 池复用"""
+    return Agent(
+        model=model_for("general_assistant"),
+        system_prompt=GENERAL_ASSISTANT_SYSTEM_PROMPT,
+        tools=[],  # 通用知识不需要专用工具
+    )
+
+
+general_agent_pool = AgentPool("general_assistant", _create_general_agent)
 
 @tool
-def general_assistant(query: str) -> str:
+@traced("tool.general_assistant")
+async def general_assistant(query: str) -> str:
     """
     Handle general knowledge queries that fall outside specialized domains.
     Provides concise, accurate responses to non-specialized questions.
@@ -62,13 +67,13 @@ def general_assistant(query: str) -> str:
     try:
         logger.info("🔧[Routed to General Assistant Agent...]")
         logger.info(f"formatted_query: \"{formatted_query}\"")
-        agent = Agent(
-            model=bedrock_model,
-            system_prompt=GENERAL_ASSISTANT_SYSTEM_PROMPT,
-            tools=[],  # 通用知识不需要专用工具
-        )
-        agent_response = agent(formatted_query)
-        text_response = str(agent_response)
+        start = time.perf_counter()
+        async with general_agent_pool.agent_async() as agent:
+            agent_response = await invoke_agent(agent, formatted_query, "general_assistant")
+            text_response = str(agent_response)
+        record_model_call("general_assistant", AGENT_TIERS["general_assistant"],
+                          time.perf_counter() - start, text_response)
+        logger.debug(f"Agent pool stats: {general_agent_pool.stats()}")
 
         if len(text_response) > 0:
             logger.debug(f"Response: {text_response} ")
@@ -1,22 +1,246 @@
 """HR规章 Tool - 基于 AWS Bedrock Knowledge Base 提供员工规章查询服务"""
+import asyncio
+import functools
 import os
-import boto3
-from strands import tool
+import re
+import time
+from typing import Dict, List
+from strands import Agent, tool
+from agents.agent_pool import AgentPool
+from agents.model_tiers import AGENT_TIERS, model_for, record_model_call
+from utils.cache import TTLCache
+from utils.clients import get_client
+from utils.embedding import filler_stripper, key_term_extractor, normalize_text
+from utils.executor import run_blocking
+from utils.limiter import limited, run_limited
 from utils.logger import get_logger
+from utils.replay import replayable
+from utils.semantic_cache import SemanticCache
+from utils.streaming import invoke_agent
+from utils.tokens import estimate_tokens, truncate_to_tokens
+from utils.tracing import traced
 
 logger = get_logger(__name__)
 
-REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
-
-# 创建 Bedrock Agent Runtime 客户端用于知识库
-bedrock_agent_client = boto3.client("bedrock-agent-runtime", region_name=REGION)
-
-# 知识库配置
+# 知识库配置：bedrock-agent-runtime 用于检索和生成，bedrock-agent 用于查询数据源的同步版本
+KB_RUNTIME_SERVICE = "bedrock-agent-runtime"
+KB_MANAGEMENT_SERVICE = "bedrock-agent"
 KNOWLEDGE_BASE_ID = os.environ.get("KNOWLEDGE_BASE_ID")
 MODEL_ARN = "arn:aws:bedrock:us-west-2:640037134104:inference-profile/us.anthropic.claude-haiku-4-5-20251001-v1:0"
+# 固定的知识库版本号；未设置时按各数据源最近一次成功同步的时间判断版本
+KNOWLEDGE_BASE_VERSION = os.environ.get("KNOWLEDGE_BASE_VERSION", "")
+KB_VERSION_CHECK_INTERVAL = float(os.environ.get("KB_VERSION_CHECK_INTERVAL", "300"))
+
+# HR 语义答案缓存配置
+HR_CACHE_ENABLED = os.environ.get("HR_CACHE_ENABLED", "true").strip().lower() == "true"
+HR_CACHE_PATH = os.environ.get("HR_CACHE_PATH", ".cache/hr_answer_cache.json")
+HR_CACHE_THRESHOLD = float(os.environ.get("HR_CACHE_THRESHOLD", "0.85"))
+HR_CACHE_TTL = float(os.environ.get("HR_CACHE_TTL", "86400"))
+HR_CACHE_MAX_ENTRIES = int(os.environ.get("HR_CACHE_MAX_ENTRIES", "1000"))
+
+# 不影响问题语义的疑问句式和填充词，匹配前去除
+HR_FILLER_PHRASES = (
+    "请问", "想问一下", "问一下", "我想知道", "公司的", "公司", "我们的", "我们", "咱们",
+    "是什么", "是怎样的", "是怎么样的", "怎么样", "什么", "如何", "吗", "呢", "的", "一下",
+    "规定", "政策", "制度", "相关",
+    "what is", "what's", "what are", "the", "please", "policy", "company", "our", "tell me about",
+)
+
+# 区分不同政策的关键词：字面相近但答案不同（如“产假”与“陪产假”、“入职”与“离职”），语义匹配要求两边一致
+HR_KEY_TERMS = (
+    "年假", "带薪年假", "病假", "事假", "婚假", "产假", "陪产假", "护理假", "育儿假", "哺乳假", "丧假", "探亲假",
+    "调休", "加班", "请假", "考勤", "迟到", "早退", "旷工", "打卡",
+    "入职", "离职", "辞职", "转正", "试用期", "实习", "调岗", "晋升", "降级", "解除合同", "劳动合同",
+    "工资", "薪资", "年终奖", "奖金", "绩效", "补贴", "津贴", "报销", "差旅", "出差",
+    "社保", "公积金", "医保", "商业保险", "体检", "培训", "股权激励", "期权", "股票", "福利",
+    "远程办公", "居家办公", "弹性工作", "工作时间", "休假", "节假日",
+    "annual leave", "sick leave", "maternity", "paternity", "parental", "bereavement", "overtime",
+    "onboarding", "offboarding", "resignation", "probation", "promotion", "salary", "bonus",
+    "reimbursement", "travel", "insurance", "stock option", "equity", "remote",
+)
+
+hr_answer_cache = SemanticCache(
+    "hr_cache",
+    path=HR_CACHE_PATH,
+    threshold=HR_CACHE_THRESHOLD,
+    ttl=HR_CACHE_TTL,
+    max_entries=HR_CACHE_MAX_ENTRIES,
+    normalize_fn=filler_stripper(HR_FILLER_PHRASES),
+    key_terms_fn=key_term_extractor(HR_KEY_TERMS),
+)
+_kb_version_checked_at = 0.0
+
+# 查询模式：retrieve_and_generate（一次调用完成检索和生成）或 retrieve（检索结果可缓存复用，再单独生成）
+HR_KB_MODE = os.environ.get("HR_KB_MODE", "retrieve_and_generate").strip().lower()
+HR_RETRIEVE_TOP_K = int(os.environ.get("HR_RETRIEVE_TOP_K", "5"))
+HR_CONTEXT_TOKENS = int(os.environ.get("HR_CONTEXT_TOKENS", "1500"))
+HR_RETRIEVAL_CACHE_TTL = float(os.environ.get("HR_RETRIEVAL_CACHE_TTL", "600"))
+
+retrieval_cache = TTLCache("hr_retrieval", ttl=HR_RETRIEVAL_CACHE_TTL, max_entries=1024)
+
+QUESTION_SEPARATORS = re.compile(r"[？?；;。\n]|另外|还有|以及")
+
+HR_GENERATION_SYSTEM_PROMPT = """
+You are an HR regulation assistant. Answer the employee's question using only the numbered regulation excerpts provided.
+- Answer every sub-question concisely
+- If the excerpts do not cover a question, say so instead of guessing
+Always use Chinese as final output language.
+"""
+
+
+def _create_hr_agent():
+    """创建 HR 答案生成 Agent 实例，供 Agent 池复用"""
+    return Agent(
+        model=model_for("hr_employee_regulation_search"),
+        system_prompt=HR_GENERATION_SYSTEM_PROMPT,
+        tools=[],
+        callback_handler=None,
+    )
+
+
+hr_agent_pool = AgentPool("hr_generation", _create_hr_agent)
+
+
+@limited("knowledge_base")
+@replayable("kb.version")
+def get_knowledge_base_version() -> str:
+    """知识库版本：优先使用 KNOWLEDGE_BASE_VERSION，否则取各数据源最近一次成功同步的完成时间"""
+    if KNOWLEDGE_BASE_VERSION:
+        return KNOWLEDGE_BASE_VERSION
+    stamps = []
+    bedrock_agent_mgmt_client = get_client(KB_MANAGEMENT_SERVICE)
+    data_sources = bedrock_agent_mgmt_client.list_data_sources(knowledgeBaseId=KNOWLEDGE_BASE_ID)
+    for data_source in data_sources["dataSourceSummaries"]:
+        jobs = bedrock_agent_mgmt_client.list_ingestion_jobs(
+            knowledgeBaseId=KNOWLEDGE_BASE_ID,
+            dataSourceId=data_source["dataSourceId"],
+            filters=[{"attribute": "STATUS", "operator": "EQ", "values": ["COMPLETE"]}],
+            sortBy={"attribute": "STARTED_AT", "order": "DESCENDING"},
+            maxResults=1,
+        )["ingestionJobSummaries"]
+        if jobs:
+            stamps.append(f'{data_source["dataSourceId"]}@{jobs[0]["updatedAt"].isoformat()}')
+    return ",".join(sorted(stamps))
+
+
+async def refresh_cache_version():
+    """定期检查知识库版本，版本变化时使 HR 答案缓存失效"""
+    global _kb_version_checked_at
+    now = time.monotonic()
+    if now - _kb_version_checked_at < KB_VERSION_CHECK_INTERVAL:
+        return
+    _kb_version_checked_at = now
+    try:
+        version = await run_limited("knowledge_base", get_knowledge_base_version)
+        hr_answer_cache.set_version(version)
+    except Exception as e:
+        logger.warning(f"Knowledge base version check failed: {str(e)}")
+
+
+def split_questions(query: str) -> List[str]:
+    """把一轮中的多个 HR 子问题拆开，分别检索"""
+    parts = [p.strip() for p in QUESTION_SEPARATORS.split(query)]
+    return list(dict.fromkeys(p for p in parts if p)) or [query]
+
+
+@limited("knowledge_base")
+@traced("kb.retrieve")
+@replayable("kb.retrieve")
+def _retrieve(query: str) -> List[Dict]:
+    """调用知识库 retrieve 接口，只做向量检索，不生成答案"""
+    response = get_client(KB_RUNTIME_SERVICE).retrieve(
+        knowledgeBaseId=KNOWLEDGE_BASE_ID,
+        retrievalQuery={"text": query},
+        retrievalConfiguration={
+            "vectorSearchConfiguration": {"numberOfResults": HR_RETRIEVE_TOP_K},
+        },
+    )
+    passages = []
+    for result in response.get("retrievalResults", []):
+        location = result.get("location", {})
+        source = next((v.get("uri") or v.get("url") for v in location.values() if isinstance(v, dict)), "")
+        passages.append({
+            "text": result["content"]["text"],
+            "source": source or "",
+            "score": result.get("score", 0.0),
+        })
+    return passages
+
+
+async def retrieve_passages(query: str) -> List[Dict]:
+    """按子问题并发检索（每个规范化子问题的结果单独缓存），合并去重后按相关度截断到上下文预算内"""
+    questions = split_questions(query)
+    results = await asyncio.gather(*(
+        retrieval_cache.get_or_await(
+            normalize_text(q), functools.partial(run_limited, "knowledge_base", _retrieve, q))
+        for q in questions
+    ))
+    merged = {}
+    for passage in (p for passages in results for p in passages):
+        key = normalize_text(passage["text"])
+        if key not in merged or passage["score"] > merged[key]["score"]:
+            merged[key] = passage
+
+    selected, used_tokens = [], 0
+    for passage in sorted(merged.values(), key=lambda p: p["score"], reverse=True):
+        tokens = estimate_tokens(passage["text"])
+        if used_tokens + tokens > HR_CONTEXT_TOKENS:
+            if not selected:
+                selected.append(dict(passage, text=truncate_to_tokens(passage["text"], HR_CONTEXT_TOKENS)))
+            break
+        selected.append(passage)
+        used_tokens += tokens
+    logger.info(f"Retrieved {len(merged)} unique passages for {len(questions)} sub-questions, "
+                f"using {len(selected)} (~{used_tokens} tokens)")
+    return selected
+
+
+async def _retrieve_then_generate(query: str) -> str:
+    """分离模式：检索（可缓存）后用裁剪过的上下文通过共享模型生成答案"""
+    passages = await retrieve_passages(query)
+    if not passages:
+        return ""
+    context = "\n\n".join(f"[{i}] {p['text']}" for i, p in enumerate(passages, 1))
+    prompt = f"Regulation excerpts:\n{context}\n\nQuestion: {query}"
+    start = time.perf_counter()
+    async with hr_agent_pool.agent_async() as agent:
+        # 不逐 token 转发：HR 答案可能来自缓存或 retrieve_and_generate，统一由调用方一次性输出完整结果
+        agent_response = await invoke_agent(agent, prompt, "hr_employee_regulation_search", stream=False)
+        text_response = str(agent_response)
+    record_model_call("hr_employee_regulation_search", AGENT_TIERS["hr_employee_regulation_search"],
+                      time.perf_counter() - start, text_response)
+    return text_response
+
+
+@limited("knowledge_base")
+@traced("kb.retrieve_and_generate")
+@replayable("kb.retrieve_and_generate")
+def _kb_retrieve_and_generate(**kwargs) -> Dict:
+    return get_client(KB_RUNTIME_SERVICE).retrieve_and_generate(**kwargs)
+
+
+async def _retrieve_and_generate(query: str) -> str:
+    """组合模式：一次 retrieve_and_generate 调用完成检索和生成"""
+    # 格式化查询
+    formatted_query = f"Use Chinese as output language, answer this knowledge question concisely: {query}"
+    logger.info(f"formatted_query: \"{formatted_query}\"")
+    response = await run_limited(
+        "knowledge_base", _kb_retrieve_and_generate,
+        input={"text": formatted_query},
+        retrieveAndGenerateConfiguration={
+            "type": "KNOWLEDGE_BASE",
+            "knowledgeBaseConfiguration": {
+                "knowledgeBaseId": KNOWLEDGE_BASE_ID,
+                "modelArn": MODEL_ARN,
+            },
+        },
+    )
+    return response.get("output", {}).get("text", "")
+
 
 @tool
-def hr_employee_regulation_search(query: str) -> str:
+@traced("tool.hr_employee_regulation_search")
+async def hr_employee_regulation_search(query: str) -> str:
     """
     Handle internal company HR and Employee regulation questions.
     Provides concise, accurate responses to non-specialized questions.
@@ -27,27 +251,29 @@ def hr_employee_regulation_search(query: str) -> str:
     Returns:
         A concise response to queries on the relevant knowledge base
     """
-    # 格式化查询
-    formatted_query = f"Use Chinese as output language, answer this knowledge question concisely: {query}"
     try:
         logger.info("🔧[Routed to HR Employee Regulation Assistant...]")
-        logger.info(f"formatted_query: \"{formatted_query}\"")
-        response = bedrock_agent_client.retrieve_and_generate(
-            input={"text": formatted_query},
-            retrieveAndGenerateConfiguration={
-                "type": "KNOWLEDGE_BASE",
-                "knowledgeBaseConfiguration": {
-                    "knowledgeBaseId": KNOWLEDGE_BASE_ID,
-                    "modelArn": MODEL_ARN,
-                },
-            },
-        )
+        if HR_CACHE_ENABLED:
+            await refresh_cache_version()
+            cached = hr_answer_cache.lookup(query)
+            if cached is not None:
+                return cached
+        start = time.perf_counter()
+        if HR_KB_MODE == "retrieve":
+            text_response = await _retrieve_then_generate(query)
+        else:
+            text_response = await _retrieve_and_generate(query)
 
-        if "output" in response and "text" in response["output"]:
-            logger.debug(f'Response: {response["output"]["text"]} ')
-            return response["output"]["text"] + "\n"
-        return ""
+        if len(text_response) > 0:
+            logger.debug(f"Response: {text_response} ")
+            text_response += "\n"
+            if HR_CACHE_ENABLED:
+                await run_blocking(hr_answer_cache.store, query, text_response,
+                                   time.perf_counter() - start)
+            return text_response
 
+        return "抱歉，知识库中没有找到相关的规章信息。\n"
     except Exception as e:
+        # 返回错误信息
         logger.error(f"Knowledge base query failed: {str(e)}")
-        return ""
+        return f"Knowledge base query failed: {str(e)}"
@@ -0,0 +1,150 @@
+"""模型分级策略 - 为每个 Agent 配置模型档位，股票分析在复杂度或置信度检查触发时才升级到更强的模型
+
+默认所有 Agent 使用 fast 档（Haiku），保持 p50 延迟和成本较低；
+升级受两个 SLO 参数约束：升级比例上限（成本）和升级后预计总延迟上限（延迟）。
+"""
+import os
+import re
+import threading
+from typing import Optional
+from utils import metrics
+from utils.clients import get_model
+from utils.logger import get_logger
+from utils.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+MODEL_TIERS = {
+    "fast": os.environ.get("MODEL_TIER_FAST", "global.anthropic.claude-haiku-4-5-20251001-v1:0"),
+    "strong": os.environ.get("MODEL_TIER_STRONG", "global.anthropic.claude-sonnet-4-5-20250929-v1:0"),
+}
+
+# 各 Agent 的默认档位
+AGENT_TIERS = {
+    "master": os.environ.get("MODEL_TIER_MASTER", "fast"),
+    "general_assistant": os.environ.get("MODEL_TIER_GENERAL", "fast"),
+    "hr_employee_regulation_search": os.environ.get("MODEL_TIER_HR", "fast"),
+    "stock_analysis": os.environ.get("MODEL_TIER_STOCK", "fast"),
+}
+
+STOCK_ESCALATION_ENABLED = os.environ.get("STOCK_ESCALATION_ENABLED", "true").strip().lower() == "true"
+STOCK_ESCALATION_TIER = os.environ.get("STOCK_ESCALATION_TIER", "strong")
+# 升级比例上限：超过后不再升级，控制成本
+ESCALATION_MAX_RATE = float(os.environ.get("ESCALATION_MAX_RATE", "0.2"))
+# 延迟 SLO：已耗时加上升级档位的 p50 延迟超过该值时不再事后升级
+ESCALATION_LATENCY_SLO_MS = float(os.environ.get("ESCALATION_LATENCY_SLO_MS", "60000"))
+# 股票报告的 token 数低于该值视为回答不完整
+STOCK_MIN_ANSWER_TOKENS = int(os.environ.get("STOCK_MIN_ANSWER_TOKENS", "300"))
+
+# 回答中表示数据缺失或没有把握的措辞
+LOW_CONFIDENCE_MARKERS = (
+    "无法获取", "未能获取", "数据不足", "无法确定", "无法判断", "无法提供", "暂无数据",
+    "unable to", "could not retrieve", "insufficient data", "i don't have",
+)
+# 股票报告末尾要求附带的页面链接
+STOCK_PAGE_MARKER = "<myapp://pages/stock/detail"
+# 一次请求中包含多只股票时视为复杂分析
+MULTI_STOCK_PATTERN = re.compile(r"[,，、/&]|\band\b|\bvs\.?\b|和|与|对比", re.IGNORECASE)
+
+
+def model_for(agent: str, tier: Optional[str] = None):
+    """返回 Agent 在指定档位（默认为其配置档位）使用的共享模型"""
+    return get_model(MODEL_TIERS[tier or AGENT_TIERS[agent]])
+
+
+def record_model_call(agent: str, tier: str, seconds: float, text: str):
+    """记录按档位和 Agent 划分的调用次数、延迟和输出 token 数"""
+    metrics.increment(f"model.{tier}.calls")
+    metrics.increment(f"model.{tier}.output_tokens", estimate_tokens(text))
+    metrics.observe(f"model.{tier}.latency_ms", seconds * 1000)
+    metrics.observe(f"{agent}.{tier}.latency_ms", seconds * 1000)
+
+
+class EscalationPolicy:
+    """档位升级策略。
+
+    initial_tier 在调用前做复杂度检查，复杂请求直接使用升级档位；
+    escalation_reason 在基础档位回答后做置信度检查（过短、含缺失数据措辞或缺少必需标记），
+    并确认升级比例和延迟 SLO 仍有余量后返回升级原因。
+    """
+
+    def __init__(self, name: str, base_tier: str, escalation_tier: str, enabled: bool = True,
+                 max_rate: float = ESCALATION_MAX_RATE,
+                 latency_slo_ms: float = ESCALATION_LATENCY_SLO_MS,
+                 min_answer_tokens: int = 0, required_marker: Optional[str] = None):
+        self.name = name
+        self.base_tier = base_tier
+        self.escalation_tier = escalation_tier
+        self.enabled = enabled and escalation_tier != base_tier
+        self.max_rate = max_rate
+        self.latency_slo_ms = latency_slo_ms
+        self.min_answer_tokens = min_answer_tokens
+        self.required_marker = required_marker
+        self.requests = 0
+        self.escalations = 0
+        self._lock = threading.Lock()
+
+    def _try_escalate(self, reason: str) -> bool:
+        with self._lock:
+            if self.escalations >= self.max_rate * self.requests:
+                metrics.increment(f"{self.name}.escalations_skipped.budget")
+                return False
+            self.escalations += 1
+        metrics.increment(f"{self.name}.escalations.{reason}")
+        logger.info(f"[{self.name}] escalating {self.base_tier} -> {self.escalation_tier}: {reason}")
+        return True
+
+    def initial_tier(self, complex_request: bool) -> str:
+        with self._lock:
+            self.requests += 1
+        if self.enabled and complex_request and self._try_escalate("complexity"):
+            return self.escalation_tier
+        return self.base_tier
+
+    def may_escalate(self, tier: str) -> bool:
+        """tier 档位的回答之后是否还可能被升级（策略启用、是基础档位且升级比例仍有余量）"""
+        if not self.enabled or tier != self.base_tier:
+            return False
+        with self._lock:
+            return self.escalations < self.max_rate * self.requests
+
+    def low_confidence_reason(self, text: str) -> Optional[str]:
+        lowered = text.lower()
+        if estimate_tokens(text) < self.min_answer_tokens:
+            return "short_answer"
+        if any(marker in lowered for marker in LOW_CONFIDENCE_MARKERS):
+            return "low_confidence"
+        if self.required_marker and self.required_marker not in text:
+            return "missing_marker"
+        return None
+
+    def escalation_reason(self, tier: str, text: str, elapsed_ms: float) -> Optional[str]:
+        """基础档位的回答需要升级时返回原因，否则返回 None"""
+        if not self.enabled or tier != self.base_tier:
+            return None
+        reason = self.low_confidence_reason(text)
+        if reason is None:
+            return None
+        expected_ms = get_p50(f"model.{self.escalation_tier}.latency_ms")
+        if elapsed_ms + expected_ms > self.latency_slo_ms:
+            metrics.increment(f"{self.name}.escalations_skipped.slo")
+            return None
+        return reason if self._try_escalate(reason) else None
+
+
+def get_p50(histogram: str) -> float:
+    return metrics.get_histogram(histogram)["p50"]
+
+
+def is_multi_stock(stock: str) -> bool:
+    return bool(MULTI_STOCK_PATTERN.search(stock))
+
+
+stock_escalation_policy = EscalationPolicy(
+    "stock_analysis",
+    base_tier=AGENT_TIERS["stock_analysis"],
+    escalation_tier=STOCK_ESCALATION_TIER,
+    enabled=STOCK_ESCALATION_ENABLED,
+    min_answer_tokens=STOCK_MIN_ANSWER_TOKENS,
+    required_marker=STOCK_PAGE_MARKER,
+)
@@ -0,0 +1,194 @@
+"""复合查询规划与执行 - 将涉及多个专业工具的查询拆成带依赖关系的调用计划，独立的调用并发执行
+
+例如 "user_123 的风险等级，然后分析 TSLA，以及公司的股权激励政策" 会生成三个步骤：
+风险等级查询和 HR 查询并发执行，股票分析等待风险等级结果后再执行。总延迟取决于关键路径，而不是所有调用之和。
+"""
+import asyncio
+import inspect
+import os
+import re
+import time
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional
+from agents.router import (
+    DEFAULT_RISK_TOLERANCE_LEVEL, HR_PATTERN, STOCK_PATTERN, FastRouter, explicit_ticker_confidence,
+    find_company_tickers, find_tickers, find_user_ids, USER_ID_PATTERN,
+)
+from utils import metrics
+from utils.executor import run_blocking
+from utils.logger import get_logger
+from utils.streaming import disable_streaming
+
+logger = get_logger(__name__)
+
+PLANNER_ENABLED = os.environ.get("PLANNER_ENABLED", "true").strip().lower() == "true"
+# 单个工具调用的超时时间（秒）和同时执行的工具调用上限
+PLANNER_CALL_TIMEOUT = float(os.environ.get("PLANNER_CALL_TIMEOUT", "120"))
+PLANNER_MAX_CONCURRENCY = int(os.environ.get("PLANNER_MAX_CONCURRENCY", "4"))
+
+# 复合查询中子句的分隔符
+CLAUSE_SEPARATORS = re.compile(
+    r"[，,；;。？?！!\n]|然后|接着|另外|还有|以及|并且|同时|(?i:\bthen\b|\band\b|\balso\b)")
+
+# depends_on 为依赖的步骤 ID；risk_from 指定从哪个步骤的结果获取风险承受等级
+PlanStep = namedtuple("PlanStep", ["id", "tool", "args", "depends_on", "risk_from"])
+StepResult = namedtuple("StepResult", ["step", "text", "ok", "seconds"])
+
+
+def format_tool_result(tool: str, args: Dict, result) -> str:
+    """把工具返回值转换为面向用户的文本"""
+    if tool == "get_user_risk_tolerance_level":
+        return f"用户 {args['user_id']} 的风险承受等级为 {result}（1 为最保守，5 为最激进）。"
+    return str(result)
+
+
+class Planner:
+    """基于规则的复合查询规划器。
+
+    查询按分隔符拆成子句，每个子句识别出用户 ID、股票代码和 HR 意图后生成对应的工具调用；
+    没有专业信号的子句并入上一个子句作为补充说明。只有生成两个及以上步骤时才返回计划，
+    任何子句无法可靠判断（如只出现股票关键词而没有代码）时返回 None，交给主协调器 LLM。
+    """
+
+    def __init__(self, router: Optional[FastRouter] = None):
+        self.router = router or FastRouter()
+
+    def _clauses(self, query: str) -> List[str]:
+        clauses = []
+        for part in (p.strip() for p in CLAUSE_SEPARATORS.split(query)):
+            if not part:
+                continue
+            route = self.router.classify(part)
+            unspecialized = (route is not None and route.tool == "general_assistant"
+                             and route.confidence < self.router.threshold)
+            if clauses and unspecialized:
+                # 没有专业信号的子句（如“谢谢”“顺便说下”）并入上一个子句
+                clauses[-1] = f"{clauses[-1]}，{part}"
+            else:
+                clauses.append(part)
+        return clauses
+
+    def _clause_calls(self, clause: str) -> Optional[List[tuple]]:
+        """返回子句需要的 (tool, args) 列表；无法可靠判断时返回 None"""
+        lowered = clause.lower()
+        user_ids = find_user_ids(clause)
+        without_users = USER_ID_PATTERN.sub(" ", clause)
+        explicit = find_tickers(without_users)
+        has_stock_keyword = bool(STOCK_PATTERN.search(lowered))
+        if explicit and explicit_ticker_confidence(without_users, has_stock_keyword) < self.router.threshold:
+            return None  # 大写缩写不一定是股票代码（如“什么是 ABC”），交给主协调器判断
+        tickers = list(dict.fromkeys(explicit + (find_company_tickers(clause) if has_stock_keyword else [])))
+        is_hr = bool(HR_PATTERN.search(lowered))
+
+        calls = [("get_user_risk_tolerance_level", {"user_id": u}) for u in user_ids]
+        if is_hr:
+            if tickers:
+                return None  # 同一子句里既有 HR 意图又有具体股票，无法确定如何拆分
+            # 如“股票期权政策”：股票关键词属于 HR 问题的一部分
+            calls.append(("hr_employee_regulation_search", {"query": clause}))
+        elif tickers:
+            calls.extend(("stock_analysis", {"stock": t}) for t in tickers)
+        elif has_stock_keyword:
+            return None  # 有股票意图但无法确定股票代码
+        if calls:
+            return calls
+        route = self.router.classify(clause)
+        if route is None or route.confidence < self.router.threshold:
+            return None
+        return [(route.tool, route.args)]
+
+    def plan(self, query: str) -> Optional[List[PlanStep]]:
+        if not PLANNER_ENABLED:
+            return None
+        calls = []
+        for clause in self._clauses(query):
+            clause_calls = self._clause_calls(clause)
+            if clause_calls is None:
+                return None
+            calls.extend(c for c in clause_calls if c not in calls)
+        if len(calls) < 2:
+            return None
+
+        risk_steps = [i for i, (tool, _) in enumerate(calls) if tool == "get_user_risk_tolerance_level"]
+        if len(risk_steps) > 1 and any(tool == "stock_analysis" for tool, _ in calls):
+            return None  # 多个用户的风险等级与股票分析之间的对应关系不明确
+        risk_from = risk_steps[0] if risk_steps else None
+
+        steps = []
+        for i, (tool, args) in enumerate(calls):
+            if tool == "stock_analysis":
+                args = dict(args, user_risk_tolerance_level=DEFAULT_RISK_TOLERANCE_LEVEL)
+                depends_on = (risk_from,) if risk_from is not None else ()
+                steps.append(PlanStep(i, tool, args, depends_on, risk_from))
+            else:
+                steps.append(PlanStep(i, tool, dict(args), (), None))
+        return steps
+
+
+async def call_tool(tool_fn: Callable, args: Dict):
+    """同步工具在阻塞线程池中执行，异步工具返回的协程回到事件循环上等待；快速路径和计划执行共用"""
+    result = await run_blocking(tool_fn, **args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def execute_plan(steps: List[PlanStep], tools: Dict[str, Callable],
+                       timeout: float = PLANNER_CALL_TIMEOUT,
+                       max_concurrency: int = PLANNER_MAX_CONCURRENCY) -> List[StepResult]:
+    """按依赖关系并发执行计划，结果按步骤顺序返回。
+
+    每个调用单独计时并受 timeout 限制；依赖的风险等级查询失败时股票分析使用默认等级。
+    调用方取消（如客户端断开）时，所有未完成的调用随之取消。
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    raw_results: Dict[int, object] = {}
+    tasks: Dict[int, asyncio.Task] = {}
+
+    async def run_step(step: PlanStep) -> StepResult:
+        # 并发的子 Agent 不向调用方逐 token 转发，避免多个回答交错，结果按顺序合并后再输出
+        disable_streaming()
+        if step.depends_on:
+            await asyncio.gather(*(tasks[d] for d in step.depends_on), return_exceptions=True)
+        args = dict(step.args)
+        if step.risk_from is not None:
+            risk = raw_results.get(step.risk_from)
+            if isinstance(risk, int):
+                args["user_risk_tolerance_level"] = risk
+        start = time.perf_counter()
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(call_tool(tools[step.tool], args), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Plan step {step.id} ({step.tool}) timed out after {timeout}s")
+                return StepResult(step, f"（{step.tool} 调用超时）", False, time.perf_counter() - start)
+            except Exception as e:
+                logger.error(f"Plan step {step.id} ({step.tool}) failed: {e}")
+                return StepResult(step, f"（{step.tool} 调用失败：{e}）", False, time.perf_counter() - start)
+        raw_results[step.id] = result
+        return StepResult(step, format_tool_result(step.tool, args, result), True,
+                          time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for step in steps:
+        tasks[step.id] = asyncio.create_task(run_step(step))
+    try:
+        results = await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+
+    elapsed = time.perf_counter() - start
+    serial = sum(r.seconds for r in results)
+    metrics.increment("planner.plans")
+    metrics.increment("planner.steps", len(steps))
+    metrics.observe("planner.total_seconds", elapsed)
+    metrics.observe("planner.serial_seconds", serial)
+    logger.info(f"Executed {len(steps)}-step plan in {elapsed:.2f}s (serial would take {serial:.2f}s)")
+    return results
+
+
+def merge_results(results: List[StepResult]) -> str:
+    """按步骤顺序合并各工具的回答"""
+    return "\n\n".join(r.text for r in results if r.text)
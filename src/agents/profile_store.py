@@ -0,0 +1,238 @@
+"""用户画像存储 - 可插拔的画像后端，带读穿透 LRU 缓存、批量查询和失效回调
+
+股票查询的每一轮都要读取用户的风险承受等级，因此查询路径上只有缓存查找和一次主键查询：
+- 命中缓存时不访问后端；未登记的用户同样缓存（负缓存），冷用户也只查询一次；
+- get_many 把多个用户的未命中合并为一次后端查询（复合查询规划会用它预取所有涉及的用户）；
+- 画像更新后调用 invalidate 使缓存失效，并通知通过 add_invalidation_hook 注册的回调
+  （例如其他进程内缓存或依赖风险等级的派生数据）。
+
+后端由 USER_PROFILE_BACKEND 选择，默认 sqlite（本地文件，用于开发和测试）；
+其他存储实现 ProfileBackend 接口后用 register_backend 注册即可。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional
+from utils import metrics
+from utils.cache import TTLCache
+from utils.clients import get_shared
+from utils.logger import get_logger
+from utils.tracing import span
+
+logger = get_logger(__name__)
+
+USER_PROFILE_BACKEND = os.environ.get("USER_PROFILE_BACKEND", "sqlite").strip().lower()
+USER_PROFILE_PATH = os.environ.get("USER_PROFILE_PATH", ".cache/user_profiles.db")
+# 画像缓存的有效期（秒）和条目上限；未登记用户的负缓存有效期单独设置，便于新用户登记后尽快生效
+USER_PROFILE_CACHE_TTL = float(os.environ.get("USER_PROFILE_CACHE_TTL", "300"))
+USER_PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get("USER_PROFILE_CACHE_MAX_ENTRIES", "10000"))
+USER_PROFILE_NEGATIVE_TTL = float(os.environ.get("USER_PROFILE_NEGATIVE_TTL", "60"))
+
+# 主协调器系统提示词约定：未指定用户或画像中没有有效等级时使用 3 作为默认风险承受等级
+DEFAULT_RISK_TOLERANCE_LEVEL = 3
+
+# SQLite 单条语句的参数个数有上限，批量查询按此分段
+_SQLITE_BATCH = 500
+_MISSING = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_profiles (
+    user_id TEXT PRIMARY KEY, risk_tolerance_level INTEGER, attributes TEXT, updated_at REAL);
+"""
+
+
+class ProfileBackend(ABC):
+    """画像后端接口：画像为 dict，至少包含 risk_tolerance_level；缺少任一方法的实现在创建时即报错"""
+
+    @abstractmethod
+    def get_many(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """一次查询多个用户，返回已登记用户的画像；未登记的用户不出现在结果中"""
+
+    @abstractmethod
+    def put_many(self, profiles: Dict[str, Dict]):
+        """写入（覆盖）多个用户的画像"""
+
+    @abstractmethod
+    def delete(self, user_id: str):
+        """删除用户画像"""
+
+
+class SqliteProfileBackend(ProfileBackend):
+    """基于 SQLite 的画像后端；path 为 ":memory:" 时不落盘"""
+
+    def __init__(self, path: str = USER_PROFILE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def get_many(self, user_ids: List[str]) -> Dict[str, Dict]:
+        profiles = {}
+        with self._lock:
+            for i in range(0, len(user_ids), _SQLITE_BATCH):
+                batch = user_ids[i:i + _SQLITE_BATCH]
+                rows = self._conn.execute(
+                    "SELECT user_id, risk_tolerance_level, attributes FROM user_profiles "
+                    f"WHERE user_id IN ({','.join('?' * len(batch))})", batch).fetchall()
+                for user_id, level, attributes in rows:
+                    profiles[user_id] = dict(json.loads(attributes or "{}"), risk_tolerance_level=level)
+        return profiles
+
+    def put_many(self, profiles: Dict[str, Dict]):
+        now = time.time()
+        rows = []
+        for user_id, profile in profiles.items():
+            attributes = {k: v for k, v in profile.items() if k != "risk_tolerance_level"}
+            rows.append((user_id, profile.get("risk_tolerance_level"),
+                         json.dumps(attributes, ensure_ascii=False), now))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO user_profiles VALUES (?, ?, ?, ?)", rows)
+
+    def delete(self, user_id: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM user_profiles WHERE user_id = ?", (user_id,))
+
+
+PROFILE_BACKENDS: Dict[str, Callable[[], ProfileBackend]] = {
+    "sqlite": SqliteProfileBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], ProfileBackend]):
+    """注册画像后端，之后可通过 USER_PROFILE_BACKEND=name 选用"""
+    PROFILE_BACKENDS[name] = factory
+
+
+def create_profile_backend(name: str = USER_PROFILE_BACKEND) -> ProfileBackend:
+    """按 USER_PROFILE_BACKEND 创建画像后端"""
+    if name not in PROFILE_BACKENDS:
+        raise ValueError(f"Unknown USER_PROFILE_BACKEND {name!r}, expected one of {sorted(PROFILE_BACKENDS)}")
+    logger.info(f"Using {name} user profile backend")
+    return PROFILE_BACKENDS[name]()
+
+
+class UserProfileStore:
+    """画像后端之上的读穿透缓存；线程安全"""
+
+    def __init__(self, backend: ProfileBackend, ttl: float = USER_PROFILE_CACHE_TTL,
+                 max_entries: int = USER_PROFILE_CACHE_MAX_ENTRIES,
+                 negative_ttl: float = USER_PROFILE_NEGATIVE_TTL):
+        self.backend = backend
+        self.negative_ttl = negative_ttl
+        # 未登记的用户缓存为 None
+        self.cache = TTLCache("user_profiles", ttl=ttl, max_entries=max_entries)
+        self._hooks: List[Callable[[Optional[str]], None]] = []
+        # 失效代数：invalidate 使对应用户（全部失效时为 _epoch）的代数加一，
+        # 后端查询期间代数发生变化的结果可能早于这次失效，不写入缓存。
+        # 只有查询进行中时才需要记录，没有进行中的查询时清空，避免随用户数增长
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._loads_in_flight = 0
+
+    def _generation(self, user_id: str) -> tuple:
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def _load(self, user_ids: List[str]) -> Dict[str, Dict]:
+        with self._lock:
+            self._loads_in_flight += 1
+            generations = {user_id: self._generation(user_id) for user_id in user_ids}
+        try:
+            with span("user_profile.lookup", users=len(user_ids)):
+                start = time.perf_counter()
+                profiles = self.backend.get_many(user_ids)
+                metrics.observe("user_profile.backend_ms", (time.perf_counter() - start) * 1000)
+            with self._lock:
+                for user_id in user_ids:
+                    profile = profiles.get(user_id)
+                    if profile is None:
+                        metrics.increment("user_profile.unknown")
+                    if self._generation(user_id) != generations[user_id]:
+                        # 查询期间画像被更新，本次读到的可能是旧数据，留给下一次查询
+                        metrics.increment("user_profile.stale_load")
+                        continue
+                    self.cache.set(user_id, profile, None if profile is not None else self.negative_ttl)
+        finally:
+            with self._lock:
+                self._loads_in_flight -= 1
+                if not self._loads_in_flight:
+                    self._generations.clear()
+        return profiles
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        """返回用户画像，未登记时返回 None"""
+        return self.get_many([user_id])[user_id]
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """批量返回画像：缓存未命中的用户合并为一次后端查询"""
+        result = {}
+        misses = []
+        for user_id in dict.fromkeys(user_ids):
+            profile = self.cache.get(user_id, _MISSING)
+            if profile is _MISSING:
+                misses.append(user_id)
+            else:
+                result[user_id] = profile
+        if misses:
+            loaded = self._load(misses)
+            result.update((user_id, loaded.get(user_id)) for user_id in misses)
+        return result
+
+    def prefetch(self, user_ids: Iterable[str]):
+        """预先把多个用户的画像载入缓存"""
+        self.get_many(user_ids)
+
+    def risk_tolerance_level(self, user_id: str) -> int:
+        """用户的风险承受等级（1-5）；未登记或等级无效时返回默认等级"""
+        profile = self.get(user_id)
+        level = profile.get("risk_tolerance_level") if profile else None
+        if isinstance(level, int) and 1 <= level <= 5:
+            return level
+        return DEFAULT_RISK_TOLERANCE_LEVEL
+
+    def put(self, user_id: str, profile: Dict):
+        """写入画像并使缓存失效"""
+        self.backend.put_many({user_id: profile})
+        self.invalidate(user_id)
+
+    def delete(self, user_id: str):
+        self.backend.delete(user_id)
+        self.invalidate(user_id)
+
+    def add_invalidation_hook(self, hook: Callable[[Optional[str]], None]):
+        """注册失效回调，参数为失效的用户 ID，全部失效时为 None"""
+        self._hooks.append(hook)
+
+    def remove_invalidation_hook(self, hook: Callable[[Optional[str]], None]):
+        self._hooks.remove(hook)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """使指定用户（user_id 为 None 时为全部用户）的缓存失效；画像在外部被修改后也应调用"""
+        with self._lock:
+            if user_id is None:
+                self._epoch += 1
+                self.cache.clear()
+            else:
+                if self._loads_in_flight:
+                    self._generations[user_id] = self._generations.get(user_id, 0) + 1
+                self.cache.invalidate(user_id)
+        for hook in list(self._hooks):
+            try:
+                hook(user_id)
+            except Exception as e:
+                logger.warning(f"User profile invalidation hook failed for {user_id=}: {e}")
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+def get_profile_store() -> UserProfileStore:
+    """共享的画像存储，首次使用时按 USER_PROFILE_BACKEND 创建后端"""
+    return get_shared("user_profile_store", lambda: UserProfileStore(create_profile_backend()))
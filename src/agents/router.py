@@ -0,0 +1,166 @@
+"""快速路由 - 用关键词、股票代码正则和用户 ID 匹配识别意图明确的查询，直接分派到对应工具，跳过主协调器的 LLM 路由"""
+import os
+import re
+from collections import namedtuple
+from typing import Callable, List, Optional, Tuple
+from agents.profile_store import DEFAULT_RISK_TOLERANCE_LEVEL
+
+# 置信度不低于该阈值的路由结果才会走快速路径，否则交给主协调器 LLM
+FAST_ROUTER_THRESHOLD = float(os.environ.get("FAST_ROUTER_THRESHOLD", "0.8"))
+FAST_ROUTER_ENABLED = os.environ.get("FAST_ROUTER_ENABLED", "true").strip().lower() == "true"
+
+Route = namedtuple("Route", ["tool", "args", "confidence", "reason"])
+
+USER_ID_PATTERN = re.compile(r"(?<![A-Za-z0-9_])user[_-]?\d+(?![A-Za-z0-9_])", re.IGNORECASE)
+# 美股代码（可带交易所后缀）和 A 股/港股数字代码
+TICKER_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9.])([A-Z]{1,5}(?:\.[A-Z]{1,2})?|\d{6}\.(?:SS|SZ)|\d{4}\.HK)(?![A-Za-z0-9])")
+
+# 常见的非股票大写缩写，避免被误识别为股票代码
+NON_TICKERS = {
+    "A", "I", "AI", "HR", "CEO", "CFO", "CTO", "IT", "OK", "PDF", "API", "USD", "CNY", "RMB",
+    "ETF", "IPO", "KPI", "OKR", "PPT", "FAQ", "VS", "Q", "QA", "AWS", "LLM", "GDP", "CPI", "ID",
+    "GPT", "ESG", "VPN", "ROE", "ROI", "NASA", "NYT", "SQL", "URL", "UI", "UX", "PR", "OA", "CRM", "ERP",
+    "SOP", "SWOT", "FYI", "ASAP", "TBD", "EOD", "NDA", "PTO", "RSU", "WFH",
+}
+
+COMPANY_TICKERS = {
+    "苹果": "AAPL", "apple": "AAPL", "特斯拉": "TSLA", "tesla": "TSLA", "英伟达": "NVDA",
+    "nvidia": "NVDA", "微软": "MSFT", "microsoft": "MSFT", "谷歌": "GOOGL", "google": "GOOGL",
+    "亚马逊": "AMZN", "amazon": "AMZN", "脸书": "META", "meta": "META", "奈飞": "NFLX",
+    "netflix": "NFLX", "阿里巴巴": "BABA", "alibaba": "BABA", "腾讯": "0700.HK", "贵州茅台": "600519.SS",
+    "茅台": "600519.SS", "台积电": "TSM", "英特尔": "INTC", "intel": "INTC", "amd": "AMD",
+}
+
+STOCK_KEYWORDS = (
+    "股票", "股价", "个股", "行情", "走势", "涨", "跌", "市值", "估值", "财报", "买入", "卖出", "持仓",
+    "投资建议", "值得投资", "stock", "share price", "shares", "ticker", "invest", "buy or sell",
+)
+
+# 只用于确认显式股票代码的词：本身不足以判断股票意图，但与大写代码同时出现时说明代码确实指股票
+TICKER_CONTEXT_KEYWORDS = (
+    "分析", "对比", "比较", "价格", "报价", "分红", "price", "quote", "analy", "compare", "earnings", "dividend",
+    "trading",
+)
+
+HR_KEYWORDS = (
+    "年假", "假期", "请假", "休假", "病假", "事假", "产假", "陪产假", "婚假", "丧假", "调休", "考勤",
+    "打卡", "加班", "报销", "差旅", "出差", "薪资", "工资", "薪酬", "奖金", "绩效", "社保", "公积金",
+    "入职", "离职", "转正", "试用期", "劳动合同", "员工", "规章", "制度", "福利", "期权政策", "股权激励",
+    "hr", "employee", "leave policy", "vacation", "reimbursement", "payroll", "stock option", "stock-option",
+    "rsu", "benefits", "overtime", "onboarding", "resignation", "probation", "maternity", "paternity",
+)
+
+GENERAL_PATTERNS = (
+    "什么是", "是什么", "为什么", "怎么理解", "解释一下", "介绍一下", "是谁", "的区别",
+    "what is", "what are", "who is", "why do", "why does", "how does", "explain",
+)
+
+
+def _keyword_pattern(keywords) -> re.Pattern:
+    """英文关键词要求从单词边界开始匹配（避免 "hr" 命中 "three"），中文关键词直接按子串匹配"""
+    parts = [(r"\b" if k.isascii() else "") + re.escape(k) for k in keywords]
+    return re.compile("|".join(parts))
+
+
+STOCK_PATTERN = _keyword_pattern(STOCK_KEYWORDS)
+TICKER_CONTEXT_PATTERN = _keyword_pattern(TICKER_CONTEXT_KEYWORDS)
+HR_PATTERN = _keyword_pattern(HR_KEYWORDS)
+GENERAL_PATTERN = _keyword_pattern(GENERAL_PATTERNS)
+
+
+def find_user_ids(query: str) -> List[str]:
+    return list(dict.fromkeys(m.group(0) for m in USER_ID_PATTERN.finditer(query)))
+
+
+def find_tickers(query: str) -> List[str]:
+    """识别查询中显式写出的股票代码"""
+    return list(dict.fromkeys(t for t in TICKER_PATTERN.findall(query) if t not in NON_TICKERS))
+
+
+def explicit_ticker_confidence(query: str, has_stock_keyword: bool) -> float:
+    """显式股票代码的置信度。
+
+    大写缩写常常不是股票代码（“What is GPT?”“公司的 VPN 怎么连”），只有同时出现股票关键词、
+    价格或分析类的词，或者查询只有代码本身（如 "GOOGL"）时才达到默认阈值。
+    """
+    if has_stock_keyword:
+        return 0.95
+    bare = not re.sub(r"[\W_]+", "", TICKER_PATTERN.sub("", query))
+    if bare or TICKER_CONTEXT_PATTERN.search(query.lower()):
+        return 0.85
+    return 0.6
+
+
+def find_company_tickers(query: str) -> List[str]:
+    """识别查询中的常见公司名并映射为股票代码"""
+    lowered = query.lower()
+    return list(dict.fromkeys(ticker for name, ticker in COMPANY_TICKERS.items() if name in lowered))
+
+
+class FastRouter:
+    """基于规则的快速路由器。
+
+    只处理单一工具即可完成的查询；涉及多个领域、多只股票或规则无法判断的查询返回 None，
+    交给主协调器 LLM 处理。classifier 为可选的补充分类器（如本地 TF-IDF/embedding 模型），
+    签名为 classifier(query) -> (tool, confidence)，仅在规则无法判断时调用。
+    """
+
+    def __init__(self, threshold: float = FAST_ROUTER_THRESHOLD,
+                 classifier: Optional[Callable[[str], Tuple[str, float]]] = None):
+        self.threshold = threshold
+        self.classifier = classifier
+
+    def classify(self, query: str) -> Optional[Route]:
+        """返回最可能的路由及其置信度；多意图查询返回 None"""
+        text = query.strip()
+        lowered = text.lower()
+        user_ids = find_user_ids(text)
+        # 去掉用户 ID 后再识别股票代码，避免 user_123 中的片段被误识别
+        explicit_tickers = find_tickers(USER_ID_PATTERN.sub(" ", text))
+        tickers = list(dict.fromkeys(explicit_tickers + find_company_tickers(text)))
+        has_stock_keyword = bool(STOCK_PATTERN.search(lowered))
+        is_stock = bool(tickers) or has_stock_keyword
+        is_hr = bool(HR_PATTERN.search(lowered))
+        if is_hr and not tickers:
+            # 如“股票期权政策”“stock option policy”：股票关键词属于 HR 问题的一部分
+            is_stock = False
+
+        intents = sum([is_stock, is_hr, bool(user_ids) and not is_stock])
+        if intents > 1 or len(user_ids) > 1 or len(tickers) > 1:
+            return None
+
+        if is_stock:
+            if user_ids or not tickers:
+                # 需要先查询风险等级，或无法确定股票代码，交给 LLM 协调
+                return None
+            # 只有公司名而没有股票关键词时（如“苹果和香蕉”）容易误判，置信度低于默认阈值
+            if explicit_tickers:
+                confidence = explicit_ticker_confidence(text, has_stock_keyword)
+            else:
+                confidence = 0.95 if has_stock_keyword else 0.6
+            return Route("stock_analysis",
+                         {"stock": tickers[0], "user_risk_tolerance_level": DEFAULT_RISK_TOLERANCE_LEVEL},
+                         confidence, f"ticker {tickers[0]}")
+        if is_hr:
+            return Route("hr_employee_regulation_search", {"query": text}, 0.9, "hr keyword")
+        if user_ids:
+            return Route("get_user_risk_tolerance_level", {"user_id": user_ids[0]}, 0.95,
+                         f"user id {user_ids[0]}")
+
+        if self.classifier is not None:
+            tool, confidence = self.classifier(text)
+            if tool:
+                return Route(tool, {"query": text}, confidence, "classifier")
+        if GENERAL_PATTERN.search(lowered):
+            return Route("general_assistant", {"query": text}, 0.85, "general question")
+        return Route("general_assistant", {"query": text}, 0.5, "no specialized signal")
+
+    def route(self, query: str) -> Optional[Route]:
+        """返回可以直接分派的高置信度路由，否则返回 None"""
+        if not FAST_ROUTER_ENABLED:
+            return None
+        route = self.classify(query)
+        if route is None or route.confidence < self.threshold:
+            return None
+        return route
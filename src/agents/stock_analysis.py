@@ -1,14 +1,42 @@
 """股票分析 Agent - 提供实时股票数据分析和投资建议"""
+import asyncio
+import contextvars
+import functools
 import os
+import threading
+import time
 from strands import Agent, tool
-from strands.models import BedrockModel
 from tools.web_search import web_search
-from tools.stock_data import stock_data_lookup
+from tools.stock_data import stock_data_lookup, stock_data_batch_lookup
+from agents.agent_pool import AgentPool
+from agents.model_tiers import (
+    MODEL_TIERS, is_multi_stock, model_for, record_model_call, stock_escalation_policy,
+)
+from utils import metrics
+from utils.cache import TTLCache
 from utils.logger import get_logger
+from utils.streaming import emit, invoke_agent, streaming_enabled
+from utils.tracing import traced
 
 logger = get_logger(__name__)
 
-REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
+# 分析结果缓存：同一股票代码和风险等级在同一个新鲜度窗口（按整点对齐的 STOCK_ANALYSIS_CACHE_WINDOW 秒）内只生成一次
+STOCK_ANALYSIS_CACHE_ENABLED = os.environ.get("STOCK_ANALYSIS_CACHE_ENABLED", "true").strip().lower() == "true"
+STOCK_ANALYSIS_CACHE_WINDOW = float(os.environ.get("STOCK_ANALYSIS_CACHE_WINDOW", "300"))
+STOCK_ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("STOCK_ANALYSIS_CACHE_MAX_ENTRIES", "512"))
+# 热门股票提前刷新：当前窗口内请求数达到 MIN_HITS 的股票，在窗口结束前 LEAD 秒内被请求时后台生成下一个窗口的结果
+STOCK_ANALYSIS_REFRESH_ENABLED = os.environ.get("STOCK_ANALYSIS_REFRESH_ENABLED", "true").strip().lower() == "true"
+STOCK_ANALYSIS_REFRESH_MIN_HITS = int(os.environ.get("STOCK_ANALYSIS_REFRESH_MIN_HITS", "3"))
+STOCK_ANALYSIS_REFRESH_LEAD = float(os.environ.get("STOCK_ANALYSIS_REFRESH_LEAD", "30"))
+
+analysis_cache = TTLCache("stock_analysis", ttl=STOCK_ANALYSIS_CACHE_WINDOW,
+                          max_entries=STOCK_ANALYSIS_CACHE_MAX_ENTRIES)
+# 当前窗口内各 key 的请求数，以及正在后台刷新的 key
+_request_counts = {}
+_refreshing = set()
+_refresh_tasks = set()
+_counts_lock = threading.Lock()
+
 
 STOCK_ANALYSIS_SYSTEM_PROMPT = """
 You are a seasoned stock investment analyst. For the given stock ticker, perform the following analysis in sequence:
@@ -19,7 +47,8 @@ You are a seasoned stock investment analyst. For the given stock ticker, perform
 4. Analysis should be conducted according to the user's risk tolerance level
 
 Requirements:
-- Use tools sequentially, not in parallel
+- When several tickers are involved (e.g. comparing with peers), fetch them with a single stock_data_batch_lookup call instead of repeated stock_data_lookup calls
+- Independent tool calls (price data and news) may run in parallel
 - Provide a comprehensive investment report including:
   * Price trend analysis
   * Fundamental assessment based on news
@@ -35,16 +64,103 @@ Add a stock page in new line at the end of content, pattern: <myapp://pages/stoc
 
 """
 
-# Create a BedrockModel
-bedrock_model = BedrockModel(
-    model_id="global.anthropic.claude-haiku-4-5-20251001-v1:0",
-    region_name=REGION,
-    temperature=0.3,
-    streaming=True,
-)
+def _create_stock_agent(tier: str):
+    """创建指定模型档位的股票分析 Agent 实例，供 Agent 池复用"""
+    return Agent(
+        model=model_for("stock_analysis", tier),
+        system_prompt=STOCK_ANALYSIS_SYSTEM_PROMPT,
+        tools=[web_search, stock_data_lookup, stock_data_batch_lookup],
+    )
+
+
+# 每个模型档位一个 Agent 池，实例在首次借出时才创建
+stock_agent_pools = {
+    tier: AgentPool(f"stock_analysis.{tier}", functools.partial(_create_stock_agent, tier))
+    for tier in MODEL_TIERS
+}
+
+
+async def _analyze(tier: str, query: str, stream: bool = True) -> str:
+    start = time.perf_counter()
+    async with stock_agent_pools[tier].agent_async() as agent:
+        agent_response = await invoke_agent(agent, query, "stock_analysis", stream=stream)
+        text_response = str(agent_response)
+    record_model_call("stock_analysis", tier, time.perf_counter() - start, text_response)
+    return text_response
+
+
+def normalize_stock(stock: str) -> str:
+    """规范化股票名称或代码：去除空白并转为大写"""
+    return "".join(stock.split()).upper()
+
+
+def freshness_bucket(now: float = None) -> int:
+    return int((time.time() if now is None else now) // STOCK_ANALYSIS_CACHE_WINDOW)
+
+
+def _bucket_ttl(bucket: int) -> float:
+    """缓存条目在所属窗口结束时过期；作为 ttl 传给缓存时需包装成函数，在生成完成、写入缓存时才求值"""
+    return max(0.0, (bucket + 1) * STOCK_ANALYSIS_CACHE_WINDOW - time.time())
+
+
+async def _generate(stock: str, user_risk_tolerance_level: int) -> str:
+    """运行股票分析 Agent 生成报告"""
+    formatted_query = f"Analyze this stock: {stock} for user risk tolerance level: {user_risk_tolerance_level}."
+    logger.info(f"formatted_query: \"{formatted_query}\"")
+
+    # 同时分析多只股票时直接使用更强的模型；否则先用基础档位，回答没有把握时再升级
+    start = time.perf_counter()
+    tier = stock_escalation_policy.initial_tier(is_multi_stock(stock))
+    streaming = streaming_enabled()
+    # 流式输出时，可能被升级的基础档位回答先缓冲，确认不升级后再一次性转发，调用方不会先收到一份随后被替换的回答；
+    # 不缓冲时 token 已经转发给调用方，不再做事后升级
+    buffered = streaming and stock_escalation_policy.may_escalate(tier)
+    text_response = await _analyze(tier, formatted_query, stream=not buffered)
+    if streaming and not buffered:
+        return text_response
+    reason = stock_escalation_policy.escalation_reason(
+        tier, text_response, (time.perf_counter() - start) * 1000)
+    if reason is not None:
+        text_response = await _analyze(stock_escalation_policy.escalation_tier, formatted_query)
+    elif buffered:
+        emit("stock_analysis", text_response)
+    return text_response
+
+
+async def _refresh(stock: str, user_risk_tolerance_level: int, key: tuple):
+    try:
+        await analysis_cache.get_or_await(key, lambda: _generate(stock, user_risk_tolerance_level),
+                                          ttl=functools.partial(_bucket_ttl, key[2]))
+        metrics.increment("stock_analysis.cache.refreshes")
+        logger.info(f"Refreshed stock analysis for {key} ahead of its window")
+    except Exception as e:
+        logger.warning(f"Background stock analysis refresh for {key} failed: {e}")
+    finally:
+        _refreshing.discard(key)
+
+
+def _count_request(stock: str, user_risk_tolerance_level: int, key: tuple):
+    """统计当前窗口的请求数；热门 key 临近窗口结束时在后台生成下一个窗口的结果"""
+    ticker, level, bucket = key
+    with _counts_lock:
+        for stale in [k for k in _request_counts if k[2] < bucket]:
+            del _request_counts[stale]
+        count = _request_counts[key] = _request_counts.get(key, 0) + 1
+        next_key = (ticker, level, bucket + 1)
+        if (not STOCK_ANALYSIS_REFRESH_ENABLED or count < STOCK_ANALYSIS_REFRESH_MIN_HITS
+                or _bucket_ttl(bucket) > STOCK_ANALYSIS_REFRESH_LEAD or next_key in _refreshing):
+            return
+        _refreshing.add(next_key)
+    # 在空白上下文中创建任务：刷新不属于当前请求，不向调用方转发 token，也不计入当前请求的 trace
+    task = contextvars.Context().run(
+        asyncio.ensure_future, _refresh(stock, user_risk_tolerance_level, next_key))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
 
 @tool
-def stock_analysis(stock: str, user_risk_tolerance_level: int = 3) -> str:
+@traced("tool.stock_analysis")
+async def stock_analysis(stock: str, user_risk_tolerance_level: int = 3) -> str:
     """
     Conduct a matches comprehensive analysis of a single stock and user_risk_tolerance_level.
     According to user risk tolerance level, deliver matched actionable insights that help investors make informed decisions.
@@ -56,20 +172,27 @@ def stock_analysis(stock: str, user_risk_tolerance_level: int = 3) -> str:
     Returns:
         A comprehensive stock analysis report
     """
-    # 格式化查询
-    formatted_query = f"Analyze this stock: {stock} for user risk tolerance level: {user_risk_tolerance_level}."
-
     try:
         logger.info("🔧[Routed to Stock Analysis Agent...]")
-        logger.info(f"formatted_query: \"{formatted_query}\"")
-
-        agent = Agent(
-            model=bedrock_model,
-            system_prompt=STOCK_ANALYSIS_SYSTEM_PROMPT,
-            tools=[web_search, stock_data_lookup],
-        )
-        agent_response = agent(formatted_query)
-        text_response = str(agent_response)
+        if not STOCK_ANALYSIS_CACHE_ENABLED:
+            text_response = await _generate(stock, user_risk_tolerance_level)
+        else:
+            level = min(5, max(1, int(user_risk_tolerance_level)))
+            key = (normalize_stock(stock), level, freshness_bucket())
+            generated = False
+
+            async def load():
+                nonlocal generated
+                generated = True
+                return await _generate(stock, level)
+
+            text_response = await analysis_cache.get_or_await(key, load, ttl=functools.partial(_bucket_ttl, key[2]))
+            if not text_response:
+                analysis_cache.invalidate(key)
+            elif not generated:
+                # 命中缓存或共享了其他请求的生成结果，调用方没有收到逐 token 输出，这里一次性转发
+                emit("stock_analysis", text_response)
+            _count_request(stock, level, key)
 
         if len(text_response) > 0:
             logger.debug(f"Response: {text_response} ")
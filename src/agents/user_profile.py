@@ -1,11 +1,13 @@
 """用户画像 Tool - 获取用户风险承受能力等个人信息"""
-import random
 from strands import tool
+from agents.profile_store import get_profile_store
 from utils.logger import get_logger
+from utils.tracing import traced
 
 logger = get_logger(__name__)
 
 @tool
+@traced("tool.get_user_risk_tolerance_level")
 def get_user_risk_tolerance_level(user_id):
     """
     Finding user risk tolerance for specific user_id.
@@ -18,7 +20,7 @@ def get_user_risk_tolerance_level(user_id):
     """
     logger.info("🔧[Routed to User Profile Agent...]")
     logger.info(f"executing get_user_risk_tolerance with {user_id=}")
-    # 生成随机数 1-5
-    risk_tolerance = random.randint(1, 5)
+    # 画像存储带读穿透缓存；未登记的用户返回默认等级
+    risk_tolerance = get_profile_store().risk_tolerance_level(user_id)
     logger.debug(f"risk_tolerance: {risk_tolerance}")
     return risk_tolerance
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""离线替身 - 模拟 Tavily、yfinance 和 Bedrock 知识库，延迟和返回数据量可配置，用于无网络环境下的压测
+
+Bedrock 模型使用 MODEL_BACKEND=fake（utils/fake_model.py），记忆使用 MEMORY_BACKEND=local。
+"""
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+_WORDS = ("revenue", "growth", "market", "guidance", "quarter", "margin", "demand", "analyst",
+          "营收", "增长", "市场", "预期", "季度", "利润率", "需求", "分析师")
+
+# yfinance 周期对应的交易日数
+_PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252, "2y": 504,
+                "5y": 1260, "ytd": 200, "max": 2520}
+
+
+def filler_text(seed: str, chars: int) -> str:
+    """由 seed 确定的伪随机文本，长度为 chars"""
+    state = zlib.crc32(seed.encode("utf-8"))
+    words = []
+    length = 0
+    while length < chars:
+        state = (state * 1103515245 + 12345) & 0x7FFFFFFF
+        word = _WORDS[(state >> 16) % len(_WORDS)]
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+class FakeTavilyServer:
+    """本地 HTTP 桩服务，实现 Tavily 的 POST /search；将 TAVILY_API_URL 指向 url 即可使用"""
+
+    def __init__(self, latency_ms: float = 300, results: int = 8, content_chars: int = 1500,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency_ms = latency_ms
+        self.results = results
+        self.content_chars = content_chars
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                query = json.loads(body or b"{}").get("query", "")
+                fake.requests += 1
+                time.sleep(fake.latency_ms / 1000)
+                data = json.dumps(fake.search(query)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-tavily", daemon=True)
+
+    def search(self, query: str) -> Dict:
+        return {
+            "query": query,
+            "results": [{
+                "title": f"{query} - result {i}",
+                "url": f"https://news.example.com/{zlib.crc32(query.encode('utf-8'))}/{i}",
+                "content": filler_text(f"{query}/{i}", self.content_chars),
+                "published_date": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() - i * 86400)),
+                "score": round(1.0 - i * 0.05, 2),
+            } for i in range(self.results)],
+        }
+
+    def start(self) -> "FakeTavilyServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeYFinance:
+    """替代 yfinance 模块的 Ticker(...).history 和 download，按股票代码生成确定的随机游走价格"""
+
+    def __init__(self, latency_ms: float = 200, max_days: int = 0):
+        self.latency_ms = latency_ms
+        self.max_days = max_days
+        self.requests = 0
+
+    def _days(self, period: str) -> int:
+        days = _PERIOD_DAYS.get(period, 21)
+        return min(days, self.max_days) if self.max_days else days
+
+    def _history(self, ticker: str, days: int):
+        import numpy as np
+        import pandas as pd
+        rng = np.random.default_rng(zlib.crc32(ticker.encode("utf-8")))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+        spread = close * rng.uniform(0.002, 0.02, days)
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days, name="Date")
+        return pd.DataFrame({
+            "Open": close + rng.uniform(-1, 1, days) * spread,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(1_000_000, 50_000_000, days),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        }, index=index)
+
+    def Ticker(self, ticker: str):
+        fake = self
+
+        class Ticker:
+            def history(self, period: str = "1mo"):
+                fake.requests += 1
+                time.sleep(fake.latency_ms / 1000)
+                return fake._history(ticker, fake._days(period))
+
+        return Ticker()
+
+    def download(self, tickers: List[str], period: str = "1mo", **kwargs):
+        import pandas as pd
+        self.requests += 1
+        time.sleep(self.latency_ms / 1000)
+        frames = {t: self._history(t, self._days(period)) for t in tickers}
+        data = pd.concat(frames, axis=1)  # 列为 (ticker, field)
+        return data.swaplevel(axis=1).sort_index(axis=1)  # 与 group_by="column" 一致：(field, ticker)
+
+
+class FakeKnowledgeBaseClient:
+    """替代 bedrock-agent-runtime 客户端的 retrieve 和 retrieve_and_generate"""
+
+    def __init__(self, latency_ms: float = 400, passages: int = 5, passage_chars: int = 800,
+                 answer_chars: int = 400):
+        self.latency_ms = latency_ms
+        self.passages = passages
+        self.passage_chars = passage_chars
+        self.answer_chars = answer_chars
+        self.requests = 0
+
+    def retrieve(self, knowledgeBaseId=None, retrievalQuery=None, retrievalConfiguration=None, **kwargs):
+        self.requests += 1
+        time.sleep(self.latency_ms / 1000)
+        query = (retrievalQuery or {}).get("text", "")
+        return {"retrievalResults": [{
+            "content": {"text": filler_text(f"{query}/{i}", self.passage_chars)},
+            "location": {"s3Location": {"uri": f"s3://hr-regulations/doc-{i}.pdf"}},
+            "score": round(0.9 - i * 0.05, 2),
+        } for i in range(self.passages)]}
+
+    def retrieve_and_generate(self, input=None, retrieveAndGenerateConfiguration=None, **kwargs):
+        self.requests += 1
+        time.sleep(self.latency_ms / 1000)
+        query = (input or {}).get("text", "")
+        return {"output": {"text": filler_text(query, self.answer_chars)}}
@@ -0,0 +1,296 @@
+"""离线压测 - 在本地替身（模拟模型、Tavily、yfinance、知识库和本地记忆）上以目标并发度回放查询集
+
+用法（在 src 目录下）：
+    python -m benchmarks.load_test [--mix benchmarks/load_mix.jsonl] [--concurrency 8] [--requests 200]
+                                   [--output .cache/load_test.json] [--baseline old.json]
+
+查询集每行一个请求：{"target": "master", "query": ...} 经主协调器处理，
+{"target": "<工具名>", "args": {...}} 直接调用对应工具；没有 target 的行（如 routing_cases.jsonl）按 master 处理。
+结果（吞吐量、各目标的 p50/p95/p99 延迟、每请求 token 数、内存占用和各阶段耗时）写入 --output；
+指定 --baseline 时与之前版本的结果比较，延迟或吞吐量退化超过 --tolerance 时以状态码 1 退出。
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+from benchmarks.fakes import FakeKnowledgeBaseClient, FakeTavilyServer, FakeYFinance
+
+DEFAULT_MIX = os.path.join(os.path.dirname(__file__), "load_mix.jsonl")
+DEFAULT_OUTPUT = ".cache/load_test.json"
+
+
+class SpanCollector:
+    """收集压测期间结束的所有 span"""
+
+    def __init__(self):
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        item = span.to_dict()
+        with self._lock:
+            self.spans.append(item)
+
+
+def load_mix(path: str, targets=None) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    for item in items:
+        item.setdefault("target", "master")
+    if targets:
+        items = [i for i in items if i["target"] in targets]
+    if not items:
+        raise SystemExit(f"no requests in {path} for targets {targets}")
+    return items
+
+
+def configure_environment(args, workdir: str, tavily_url: str):
+    """在导入项目模块之前设置离线后端；已显式设置的环境变量保持不变"""
+    defaults = {
+        "MODEL_BACKEND": "fake",
+        "FAKE_MODEL_LATENCY_MS": str(args.model_latency_ms),
+        "FAKE_MODEL_TOKENS_PER_SECOND": str(args.model_tokens_per_second),
+        "FAKE_MODEL_OUTPUT_CHARS": str(args.model_output_chars),
+        "MEMORY_BACKEND": "local",
+        "LOCAL_MEMORY_PATH": os.path.join(workdir, "local_memory.db"),
+        "MEMORY_METADATA_PATH": os.path.join(workdir, "memory_metadata.json"),
+        "MEMORY_WRITE_SPOOL_PATH": os.path.join(workdir, "memory_spool.jsonl"),
+        "TAVILY_API_URL": tavily_url,
+        "TAVILY_API_KEY": "loadtest",
+        "KNOWLEDGE_BASE_VERSION": "loadtest",
+        "HR_CACHE_PATH": os.path.join(workdir, "hr_answer_cache.json"),
+    }
+    if not args.with_caches:
+        # 查询集会循环回放，默认关闭结果缓存，测量的是每次都访问上游的路径
+        defaults.update({"HR_CACHE_ENABLED": "false", "HR_RETRIEVAL_CACHE_TTL": "0",
+                         "STOCK_ANALYSIS_CACHE_ENABLED": "false",
+                         "STOCK_DATA_CACHE_TTL": "0", "WEB_SEARCH_CACHE_TTL": "0"})
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 以 KB 为单位，macOS 上以字节为单位
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_load(items: List[Dict], total: int, concurrency: int, stream: bool,
+                   session_turns: int) -> List[Dict]:
+    # 项目模块在 configure_environment 之后才能导入
+    import master_agent
+    from tools.stock_data import stock_data_batch_lookup, stock_data_lookup
+    from tools.web_search import web_search
+    from utils.executor import run_blocking
+    from utils.tracing import span
+
+    tools = {t.tool_name: t for t in (*master_agent.MASTER_TOOLS, stock_data_lookup,
+                                      stock_data_batch_lookup, web_search)}
+    counter = itertools.count()
+    records = []
+
+    async def call_master(agent, query: str, record: Dict):
+        if not stream:
+            return await master_agent.ask_async(agent, query)
+        start = time.perf_counter()
+        chunks = []
+        async for chunk in master_agent.stream_async(agent, query):
+            if not chunks:
+                record["ttft_ms"] = (time.perf_counter() - start) * 1000
+            chunks.append(chunk["text"])
+        return "".join(chunks)
+
+    async def call_tool(target: str, args: Dict):
+        result = tools[target](**args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def worker(worker_id: int):
+        agent, turns, sessions = None, 0, 0
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            item = items[i % len(items)]
+            if item["target"] == "master" and (agent is None or turns >= session_turns):
+                sessions += 1
+                agent = await run_blocking(master_agent.create_master_agent,
+                                           f"load_user_{worker_id}", f"load_session_{worker_id}_{sessions}")
+                turns = 0
+            record = {"target": item["target"], "ok": True}
+            start = time.perf_counter()
+            with span("loadtest", target=item["target"]) as root:
+                try:
+                    if item["target"] == "master":
+                        turns += 1
+                        text = await call_master(agent, item["query"], record)
+                    else:
+                        text = await call_tool(item["target"], item.get("args", {}))
+                    root.record_text("output", str(text))
+                except Exception as e:
+                    record.update(ok=False, error=f"{type(e).__name__}: {e}")
+            record.update(trace_id=root.trace_id, latency_ms=(time.perf_counter() - start) * 1000)
+            records.append(record)
+
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return records
+
+
+def summarize_records(records: List[Dict], tokens: Dict[str, Dict], wall_seconds: float) -> Dict:
+    from utils.metrics import summarize
+    ok = [r for r in records if r["ok"]]
+    summary = {
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "throughput_rps": round(len(ok) / wall_seconds, 3) if wall_seconds else 0.0,
+        "latency_ms": summarize(r["latency_ms"] for r in ok),
+        "llm_tokens_per_request": summarize(tokens.get(r["trace_id"], {}).get("llm", 0) for r in ok),
+        "output_tokens_per_request": summarize(tokens.get(r["trace_id"], {}).get("output", 0) for r in ok),
+    }
+    ttft = [r["ttft_ms"] for r in ok if "ttft_ms" in r]
+    if ttft:
+        summary["ttft_ms"] = summarize(ttft)
+    return summary
+
+
+def tokens_by_trace(spans: List[Dict]) -> Dict[str, Dict]:
+    """每个请求中所有模型调用的输入加输出 token 数，以及返回给调用方的 token 数"""
+    tokens: Dict[str, Dict] = {}
+    for item in spans:
+        entry = tokens.setdefault(item["trace_id"], {"llm": 0, "output": 0})
+        attributes = item["attributes"]
+        if item["name"].startswith("llm."):
+            entry["llm"] += attributes.get("input_tokens", 0) + attributes.get("output_tokens", 0)
+        elif item["parent_id"] is None:
+            entry["output"] = attributes.get("output_tokens", 0)
+    return tokens
+
+
+def compare(baseline: Dict, report: Dict, tolerance: float) -> List[str]:
+    """列出相对基线退化超过 tolerance 的延迟百分位和吞吐量"""
+    regressions = []
+    for target, current in report["targets"].items():
+        base = baseline.get("targets", {}).get(target)
+        if not base:
+            continue
+        for q in ("p50", "p95", "p99"):
+            before, after = base["latency_ms"][q], current["latency_ms"][q]
+            if before and after > before * (1 + tolerance):
+                regressions.append(f"{target} latency {q}: {before:.1f} -> {after:.1f} ms")
+        before, after = base["throughput_rps"], current["throughput_rps"]
+        if after < before * (1 - tolerance):
+            regressions.append(f"{target} throughput: {before:.2f} -> {after:.2f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="查询集 JSONL 文件（合成或录制）")
+    parser.add_argument("--targets", default="", help="逗号分隔，只回放这些目标（master 或工具名）")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=200, help="计入统计的请求总数")
+    parser.add_argument("--warmup", type=int, default=10, help="预热请求数（不计入统计）")
+    parser.add_argument("--stream", action="store_true", help="master 请求使用流式接口并记录首 token 延迟")
+    parser.add_argument("--session-turns", type=int, default=10, help="每个压测会话的轮数，之后换新会话")
+    parser.add_argument("--with-caches", action="store_true", help="保留股票、搜索和 HR 结果缓存")
+    parser.add_argument("--model-latency-ms", type=float, default=200, help="模拟模型首 token 延迟")
+    parser.add_argument("--model-tokens-per-second", type=float, default=200, help="模拟模型输出速度")
+    parser.add_argument("--model-output-chars", type=int, default=600, help="模拟模型回答的最少字符数")
+    parser.add_argument("--search-latency-ms", type=float, default=300, help="Tavily 替身延迟")
+    parser.add_argument("--search-results", type=int, default=8, help="Tavily 替身每次返回的结果数")
+    parser.add_argument("--search-content-chars", type=int, default=1500, help="每条搜索结果的正文长度")
+    parser.add_argument("--stock-latency-ms", type=float, default=200, help="yfinance 替身延迟")
+    parser.add_argument("--stock-max-days", type=int, default=0, help="价格历史的最大交易日数（0 为按周期）")
+    parser.add_argument("--kb-latency-ms", type=float, default=400, help="知识库替身延迟")
+    parser.add_argument("--kb-passages", type=int, default=5, help="知识库替身每次返回的片段数")
+    parser.add_argument("--kb-passage-chars", type=int, default=800, help="每个知识库片段的长度")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果 JSON 文件")
+    parser.add_argument("--baseline", default=None, help="之前版本的结果 JSON，用于检测退化")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的相对退化比例")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    items = load_mix(args.mix, targets)
+    tavily = FakeTavilyServer(args.search_latency_ms, args.search_results, args.search_content_chars).start()
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    configure_environment(args, workdir, tavily.url)
+
+    from tools import stock_data
+    from agents.hr_employee_regulation import KB_RUNTIME_SERVICE
+    from utils import clients, tracing
+
+    stock_data.yf = FakeYFinance(args.stock_latency_ms, args.stock_max_days)
+    kb_client = FakeKnowledgeBaseClient(args.kb_latency_ms, args.kb_passages, args.kb_passage_chars)
+    clients.get_shared(("client", KB_RUNTIME_SERVICE, clients.REGION), lambda: kb_client)
+
+    collector = SpanCollector()
+
+    async def run():
+        if args.warmup:
+            await run_load(items, args.warmup, min(args.concurrency, args.warmup), args.stream,
+                           args.session_turns)
+        tracing.add_exporter(collector)
+        try:
+            start = time.perf_counter()
+            records = await run_load(items, args.requests, args.concurrency, args.stream,
+                                     args.session_turns)
+            return records, time.perf_counter() - start
+        finally:
+            tracing.remove_exporter(collector)
+
+    rss_before = peak_rss_mb()
+    try:
+        records, wall_seconds = asyncio.run(run())
+    finally:
+        tavily.stop()
+
+    tokens = tokens_by_trace(collector.spans)
+    by_target: Dict[str, List[Dict]] = {}
+    for record in records:
+        by_target.setdefault(record["target"], []).append(record)
+    report = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "summary": dict(summarize_records(records, tokens, wall_seconds),
+                        wall_seconds=round(wall_seconds, 3),
+                        peak_rss_mb=peak_rss_mb(), peak_rss_before_mb=rss_before),
+        "targets": {t: summarize_records(r, tokens, wall_seconds) for t, r in sorted(by_target.items())},
+        "stages": tracing.stage_report(collector.spans, root="loadtest")["stages"],
+        "errors": sorted({r["error"] for r in records if not r["ok"]}),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({"summary": report["summary"], "output": args.output}, ensure_ascii=False, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""记忆路径基准 - 使用本地记忆后端测量 MemoryHookProvider 的开销随会话历史长度的变化
+
+用法（在 src 目录下）：
+    python -m benchmarks.memory_benchmark [--history-sizes 10,100,1000,5000] [--iterations 20] [--db :memory:]
+
+对每个历史长度分别测量：写入一条消息（同步 / write-behind）、新建 Agent 时加载会话上下文（冷 / 热）、
+单次长期记忆检索的延迟，以及注入系统提示词的上下文 token 数。
+"""
+import argparse
+import json
+import tempfile
+import time
+from types import SimpleNamespace
+from agentcore.local_memory import LocalMemoryClient
+from agentcore.memory_helper import MemoryHookProvider, create_long_term_memory
+from agentcore.memory_writer import MemoryWriteBehind
+from utils.metrics import summarize
+from utils.tokens import estimate_tokens
+
+ACTOR_ID = "bench_user"
+QUESTIONS = (
+    "帮我分析一下AAPL股票，我比较喜欢稳健的投资",
+    "公司的年假政策是什么？",
+    "什么是市盈率？",
+    "TSLA 最近走势怎么样",
+    "出差报销的标准是多少",
+)
+ANSWER = "这是一段较长的分析报告。" * 60
+
+
+def populate(client, memory_id: str, session_id: str, turns: int):
+    for i in range(turns):
+        client.create_event(memory_id=memory_id, actor_id=ACTOR_ID, session_id=session_id,
+                            messages=[(QUESTIONS[i % len(QUESTIONS)], "user"), (ANSWER, "assistant")])
+
+
+def agent_event(session_id: str):
+    agent = SimpleNamespace(state={"actor_id": ACTOR_ID, "session_id": session_id},
+                            system_prompt="", messages=[])
+    return SimpleNamespace(agent=agent)
+
+
+def timed(func, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {k: round(v, 3) for k, v in summarize(samples).items()}
+
+
+def run(history_sizes, iterations: int, db: str):
+    client = LocalMemoryClient(db)
+    memory_id = create_long_term_memory(client, "memory_benchmark")
+    results = []
+    for size in history_sizes:
+        session_id = f"bench_session_{size}"
+        start = time.perf_counter()
+        populate(client, memory_id, session_id, size)
+        populate_ms = (time.perf_counter() - start) * 1000
+
+        hook = MemoryHookProvider(client, memory_id)
+
+        def init_cold():
+            hook.session_memories.clear()
+            hook.session_contexts.clear()
+            hook.on_agent_initialized(agent_event(session_id))
+
+        def init_warm():
+            hook.on_agent_initialized(agent_event(session_id))
+
+        def save_sync():
+            hook.save_message(ACTOR_ID, session_id, QUESTIONS[0], "user")
+
+        with tempfile.TemporaryDirectory() as spool_dir:
+            writer = MemoryWriteBehind(client, spool_path=f"{spool_dir}/spool.jsonl")
+            async_hook = MemoryHookProvider(client, memory_id, writer=writer)
+            save_write_behind = timed(
+                lambda: async_hook.save_message(ACTOR_ID, session_id, QUESTIONS[1], "user"), iterations)
+            writer.close()
+
+        event = agent_event(session_id)
+        hook.on_agent_initialized(event)
+        results.append({
+            "history_turns": size,
+            "populate_ms_per_turn": round(populate_ms / size, 3) if size else 0.0,
+            "agent_init_cold_ms": timed(init_cold, iterations),
+            "agent_init_warm_ms": timed(init_warm, iterations),
+            "save_message_sync_ms": timed(save_sync, iterations),
+            "save_message_write_behind_ms": save_write_behind,
+            "retrieve_memories_ms": timed(lambda: client.retrieve_memories(
+                memory_id=memory_id, namespace=f"users/{ACTOR_ID}/semantic", query="年假"), iterations),
+            "context_tokens": estimate_tokens(event.agent.system_prompt),
+        })
+    client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history-sizes", default="10,100,1000,5000",
+                        help="逗号分隔的会话历史轮数")
+    parser.add_argument("--iterations", type=int, default=20, help="每项测量的重复次数")
+    parser.add_argument("--db", default=":memory:", help="本地记忆后端的 SQLite 文件")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.history_sizes.split(",") if s.strip()]
+    print(json.dumps(run(sizes, args.iterations, args.db), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""追踪报告 - 汇总 JSONL 追踪文件，输出各阶段（主协调器、工具、上游服务、记忆 Hook）耗时及占比的 p50/p95/p99
+
+用法（在 src 目录下，先以 TRACE_EXPORTER=jsonl 运行服务或压测）：
+    python -m benchmarks.trace_report [--traces .cache/traces.jsonl] [--top 20]
+"""
+import argparse
+import json
+from utils.tracing import TRACE_JSONL_PATH, load_spans, stage_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--traces", default=TRACE_JSONL_PATH, help="JsonlExporter 写入的追踪文件")
+    parser.add_argument("--top", type=int, default=0, help="只输出总耗时最高的前 N 个阶段（0 为全部）")
+    args = parser.parse_args()
+
+    report = stage_report(load_spans(args.traces))
+    if args.top:
+        report["stages"] = dict(list(report["stages"].items())[:args.top])
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
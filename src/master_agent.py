@@ -1,11 +1,11 @@
 """主协调器模块 - 负责智能路由用户查询到相应的专业 Agent"""
+import asyncio
 import os
 import readline
+import threading
 from utils.logger import get_logger
 
 from strands import Agent
-from strands.models import BedrockModel
-from bedrock_agentcore.memory import MemoryClient
 
 from agents.user_profile import get_user_risk_tolerance_level
 from agents.general_assist import general_assistant
@@ -13,28 +13,33 @@ from agents.stock_analysis import stock_analysis
 from agents.hr_employee_regulation import hr_employee_regulation_search
 from agentcore import memory_helper
 from agentcore.memory_helper import MemoryHookProvider
+from agentcore.memory_metadata import get_memory_metadata
+from agentcore.memory_writer import MemoryWriteBehind
+from agents.model_tiers import model_for
+from agents.planner import Planner, call_tool, execute_plan, format_tool_result, merge_results
+from agents.profile_store import get_profile_store
+from agents.router import FastRouter, Route
+from utils.clients import REGION, get_shared
+from utils.executor import run_blocking
+from utils.streaming import stream_events
+from utils.tracing import record_usage, span
 
 logger = get_logger(__name__)
 
-REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
 ACTOR_ID = "user_123"  # 用户唯一标识符
 SESSION_ID = "personal_session_001"  # 会话唯一标识符
 
 SHORT_TERM_MEMORY_NAME="short_term_memory_demo2"
 LONG_TERM_MEMORY_NAME="long_term_memory_demo2"
 
-memory_client = MemoryClient(region_name=REGION)
+# 默认异步批量写入记忆事件；设为 false 时每条消息同步调用 create_event
+MEMORY_WRITE_BEHIND = os.environ.get("MEMORY_WRITE_BEHIND", "true").strip().lower() == "true"
 
-MEMORY_ID = memory_helper.create_long_term_memory(memory_client, LONG_TERM_MEMORY_NAME);
 
-# 创建 Bedrock 模型
-# model_id="global.anthropic.claude-sonnet-4-5-20250929-v1:0",
-bedrock_model = BedrockModel(
-    model_id="global.anthropic.claude-haiku-4-5-20251001-v1:0",
-    region_name=REGION,
-    temperature=0.3,
-    streaming=True,
-)
+
+def get_memory_client():
+    """共享的记忆客户端，首次使用时创建"""
+    return get_shared("memory_client", lambda: memory_helper.create_memory_client(REGION))
 
 # 定义主协调器系统提示词
 MASTER_SYSTEM_PROMPT = """
@@ -67,63 +72,209 @@ Your role is to:
    - DO NOT remove any tag <link> | <myapp> from original response.
 """
 
-memroy_hook = MemoryHookProvider(memory_client, MEMORY_ID)
-
-master_agent = Agent(
-    model=bedrock_model,
-    system_prompt=MASTER_SYSTEM_PROMPT,
-    callback_handler=None,
-    tools=[
-        stock_analysis,
-        hr_employee_regulation_search,
-        get_user_risk_tolerance_level,
-        general_assistant,
-    ],
-    hooks=[memroy_hook],
-    state={"actor_id": ACTOR_ID, "session_id": SESSION_ID}
-)
-
-print("记忆体内容：")
-memroy_hook.view_memories(ACTOR_ID, SESSION_ID)
-print()
-print(memroy_hook.retrieve_user_preference(ACTOR_ID))
-print()
-print(memroy_hook.retrieve_semantic(ACTOR_ID))
-print()
-print(memroy_hook.retrieve_summaries(ACTOR_ID, SESSION_ID))
-print()
-
-# 检查内存中存储的内容
+_memory_hook = None
+_memory_hook_lock = threading.Lock()
 
 
-# 主程序入口
-if __name__ == "__main__":
-    logger.info("Starting Strands Multi-Agent Demo...")
-    print("\n📁 Strands Multi-Agent Demo 📁\n")
-    
-    print(
-        "请输入问题, 我将路由到匹配的 Agent 来回答："
+def get_memory_hook() -> MemoryHookProvider:
+    """获取记忆 Hook；长期记忆资源只在首次使用时创建（或查找）一次，所有会话共享。
+    Memory ID 和命名空间优先从本地元数据缓存读取，热启动时无需访问 AgentCore。
+    创建失败（没有拿到 Memory ID）时不缓存，返回本次使用的 Hook，下次调用重新尝试"""
+    global _memory_hook
+    if _memory_hook is None:
+        with _memory_hook_lock:
+            if _memory_hook is None:
+                memory_client = get_memory_client()
+                memory_id, namespaces = get_memory_metadata(
+                    memory_client, LONG_TERM_MEMORY_NAME, memory_helper.create_long_term_memory)
+                if not memory_id:
+                    logger.warning(f"Memory [{LONG_TERM_MEMORY_NAME}] is unavailable, will retry on next use")
+                    return MemoryHookProvider(memory_client, memory_id, namespaces=namespaces)
+                writer = MemoryWriteBehind(memory_client) if MEMORY_WRITE_BEHIND else None
+                _memory_hook = MemoryHookProvider(memory_client, memory_id, writer=writer,
+                                                  namespaces=namespaces)
+    return _memory_hook
+
+
+MASTER_TOOLS = [
+    stock_analysis,
+    hr_employee_regulation_search,
+    get_user_risk_tolerance_level,
+    general_assistant,
+]
+
+# 快速路由：意图明确的查询直接调用对应工具，省去一次主协调器 LLM 往返
+fast_router = FastRouter()
+# 复合查询规划：涉及多个专业工具的查询按依赖关系并发调用，省去主协调器的逐个串行调用
+planner = Planner(fast_router)
+FAST_PATH_TOOLS = {t.tool_name: t for t in MASTER_TOOLS}
+# 这些工具内部是子 Agent，开启流式输出时会自行转发 token
+STREAMING_TOOLS = {"stock_analysis", "general_assistant"}
+
+
+def create_master_agent(actor_id: str, session_id: str) -> Agent:
+    """为指定用户会话创建主协调器 Agent；Agent 不能被并发调用，每个并发会话需要独立实例"""
+    return Agent(
+        model=model_for("master"),
+        system_prompt=MASTER_SYSTEM_PROMPT,
+        callback_handler=None,
+        tools=MASTER_TOOLS,
+        hooks=[get_memory_hook()],
+        state={"actor_id": actor_id, "session_id": session_id}
     )
-    print("Type 'exit' to quit.")
 
-    # 交互式循环
+
+
+async def dispatch_route(agent: Agent, route: Route, user_input: str) -> str:
+    """快速路径：直接调用路由到的工具，并把这一轮对话记入会话历史和 Memory"""
+    logger.info(f"⚡[Fast path] {route.tool} ({route.reason}, confidence={route.confidence})")
+    result = await call_tool(FAST_PATH_TOOLS[route.tool], route.args)
+    text = format_tool_result(route.tool, route.args, result)
+    await record_turn(agent, user_input, text)
+    return text
+
+
+async def dispatch_plan(agent: Agent, steps, user_input: str) -> str:
+    """复合查询：按计划并发调用多个工具，按顺序合并结果并记入会话历史和 Memory"""
+    logger.info(f"⚡[Plan] {[(s.tool, s.depends_on) for s in steps]}")
+    # 计划涉及的所有用户画像一次批量查询载入缓存，各步骤的风险等级查询随后直接命中缓存
+    user_ids = [s.args["user_id"] for s in steps if s.tool == "get_user_risk_tolerance_level"]
+    if len(user_ids) > 1:
+        await run_blocking(get_profile_store().prefetch, user_ids)
+    text = merge_results(await execute_plan(steps, FAST_PATH_TOOLS))
+    await record_turn(agent, user_input, text)
+    return text
+
+
+async def record_turn(agent: Agent, user_input: str, text: str):
+    """把绕过主协调器 LLM 完成的一轮对话记入会话历史和 Memory"""
+    # 保持主协调器的对话历史完整，后续经过 LLM 的轮次仍能看到这一轮
+    agent.messages.append({"role": "user", "content": [{"text": user_input}]})
+    agent.messages.append({"role": "assistant", "content": [{"text": text}]})
+    actor_id = agent.state.get("actor_id")
+    session_id = agent.state.get("session_id")
+    memory_hook = get_memory_hook()
+    for message_text, role in ((user_input, "user"), (text, "assistant")):
+        try:
+            await run_blocking(memory_hook.save_message, actor_id, session_id, message_text, role)
+        except Exception as e:
+            logger.error(f"Memory save error: {e}")
+
+
+def _route(user_input: str):
+    """返回 (快速路由, 复合查询计划)，两者至多一个不为 None"""
+    with span("router") as item:
+        route = fast_router.route(user_input)
+        steps = planner.plan(user_input) if route is None else None
+        item.set(path="fast" if route is not None else "plan" if steps is not None else "llm")
+        return route, steps
+
+
+async def ask_async(agent: Agent, user_input: str) -> str:
+    """异步处理一次用户查询；意图明确的查询走快速路径，其余交给主协调器 LLM。
+    子 Agent 调用均被 await，阻塞的 SDK 调用在有界线程池中执行，
+    因此同一事件循环上可以同时处理多个会话的请求"""
+    with span("request", streaming=False) as request:
+        request.record_text("input", user_input)
+        route, steps = _route(user_input)
+        if route is not None:
+            text = await dispatch_route(agent, route, user_input)
+        elif steps is not None:
+            text = await dispatch_plan(agent, steps, user_input)
+        else:
+            with span("llm.master") as item:
+                response = await agent.invoke_async(user_input)
+                record_usage(response, item)
+            text = str(response)
+        request.record_text("output", text)
+        return text
+
+
+async def _master_events(agent: Agent, user_input: str):
+    """主协调器的事件流：快速路径或复合查询计划命中时直接调用工具，否则交给 LLM"""
+    with span("request", streaming=True) as request:
+        request.record_text("input", user_input)
+        route, steps = _route(user_input)
+        if route is not None:
+            text = await dispatch_route(agent, route, user_input)
+            request.record_text("output", text)
+            if route.tool not in STREAMING_TOOLS:
+                yield {"data": text}
+        elif steps is not None:
+            # 计划中的工具并发执行，合并后的结果一次性输出
+            text = await dispatch_plan(agent, steps, user_input)
+            request.record_text("output", text)
+            yield {"data": text}
+        else:
+            with span("llm.master") as item:
+                async for event in agent.stream_async(user_input):
+                    if "data" in event:
+                        request.record_text("output", event["data"])
+                    elif "result" in event:
+                        record_usage(event["result"], item)
+                    yield event
+
+
+def stream_async(agent: Agent, user_input: str):
+    """流式处理一次用户查询，返回异步迭代器，逐段产出 {"source": ..., "text": ...}；
+    子 Agent 的 token 会在生成时立即转发，而不是等整个调用链结束"""
+    return stream_events(_master_events(agent, user_input), source="master")
+
+
+def show_memories(actor_id: str, session_id: str):
+    """打印记忆体中当前用户会话的内容；各项记忆由一次并发预取得到，随后创建 Agent 时直接复用"""
+    memory_hook = get_memory_hook()
+    print("记忆体内容：")
+    memory_hook.view_memories(actor_id, session_id)
+    print()
+    print(memory_hook.retrieve_user_preference(actor_id, session_id))
+    print()
+    print(memory_hook.retrieve_semantic(actor_id, session_id))
+    print()
+    print(memory_hook.retrieve_summaries(actor_id, session_id))
+    print()
+
+
+async def main_async():
+    """交互式循环，在事件循环上处理用户输入"""
+    master_agent = await run_blocking(create_master_agent, ACTOR_ID, SESSION_ID)
     while True:
         try:
-            user_input = input("\n> ")
+            user_input = await run_blocking(input, "\n> ")
             if user_input.lower() == "exit":
                 break
 
-            response = master_agent(
-                user_input,
-            )
-            content = str(response)
             print()
             print("🤖[Master Agent] Response ->")
-            print(content)
+            source = None
+            async for chunk in stream_async(master_agent, user_input):
+                if chunk["source"] != source:
+                    source = chunk["source"]
+                    print(f"\n[{source}] ", end="", flush=True)
+                print(chunk["text"], end="", flush=True)
+            print()
 
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, EOFError):
             logger.info("Execution interrupted by user")
             break
         except Exception as e:
             logger.error(f"An error occurred: {str(e)}")
             print(f"\nAn error occurred: {str(e)}")
+
+
+# 主程序入口
+if __name__ == "__main__":
+    show_memories(ACTOR_ID, SESSION_ID)
+
+    logger.info("Starting Strands Multi-Agent Demo...")
+    print("\n📁 Strands Multi-Agent Demo 📁\n")
+    
+    print(
+        "请输入问题, 我将路由到匹配的 Agent 来回答："
+    )
+    print("Type 'exit' to quit.")
+
+    try:
+        asyncio.run(main_async())
+    except KeyboardInterrupt:
+        logger.info("Execution interrupted by user")
@@ -0,0 +1,196 @@
+"""多会话服务入口 - 在本地提供 HTTP 接口，每个 actor_id/session_id 使用独立的主协调器 Agent
+
+接口：
+    POST   /chat                 {"actor_id": "...", "session_id": "...", "query": "..."}
+    POST   /chat/stream          同上，以分块传输的 NDJSON 逐段返回 {"source": ..., "text": ...}
+    DELETE /sessions/<actor_id>/<session_id>
+    GET    /stats
+    GET    /health
+"""
+import asyncio
+import json
+import os
+import time
+from urllib.parse import unquote
+from utils.logger import get_logger
+
+from agents.agent_pool import pool_stats
+from agentcore.session_registry import SessionLimitError, SessionRegistry
+from master_agent import ask_async, create_master_agent, stream_async
+from utils import metrics
+from utils.limiter import limiter_stats
+
+logger = get_logger(__name__)
+
+SERVER_HOST = os.environ.get("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "8080"))
+# 请求体大小上限，以及空闲会话的清理间隔秒数
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", str(64 * 1024)))
+SESSION_SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", "60"))
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+           429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class BadRequest(Exception):
+    pass
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """解析 HTTP 请求行、请求头和请求体"""
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        raise BadRequest("empty request")
+    method, target, _ = request_line.split(" ", 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_REQUEST_BYTES:
+        raise BadRequest("payload too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], body
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1") + body
+    )
+
+
+def _write_chunk(writer: asyncio.StreamWriter, payload: dict):
+    line = json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+    writer.write(f"{len(line):X}\r\n".encode("latin-1") + line + b"\r\n")
+
+
+class AgentServer:
+    """基于 asyncio 的 HTTP 服务，所有会话共享一个事件循环"""
+
+    def __init__(self, registry: SessionRegistry):
+        self.registry = registry
+
+    @staticmethod
+    def parse_chat_request(body: bytes):
+        """解析聊天请求体，返回 (actor_id, session_id, query)，格式错误时抛出 BadRequest"""
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise BadRequest("invalid JSON body")
+        if not isinstance(request, dict):
+            raise BadRequest("JSON body must be an object")
+        fields = [request.get(name) for name in ("actor_id", "session_id", "query")]
+        if not all(isinstance(value, str) and value for value in fields):
+            raise BadRequest("actor_id, session_id and query are required non-empty strings")
+        actor_id, session_id, query = fields
+        return actor_id, session_id, query
+
+    async def handle_chat(self, body: bytes):
+        actor_id, session_id, query = self.parse_chat_request(body)
+        try:
+            content = await self.registry.run(
+                actor_id, session_id, lambda agent: ask_async(agent, query))
+        except SessionLimitError as e:
+            return 429, {"error": str(e)}
+        return 200, {"actor_id": actor_id, "session_id": session_id, "response": content}
+
+    async def handle_chat_stream(self, body: bytes, writer: asyncio.StreamWriter):
+        """流式聊天：先写出响应头，再把每段 token 作为一行 JSON 立即发送给客户端"""
+        actor_id, session_id, query = self.parse_chat_request(body)
+        start = time.perf_counter()
+        ttft_ms = None
+
+        async def forward(agent):
+            nonlocal ttft_ms
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/x-ndjson; charset=utf-8\r\n"
+                b"Transfer-Encoding: chunked\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            try:
+                async for chunk in stream_async(agent, query):
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+                    _write_chunk(writer, chunk)
+                    await writer.drain()
+                done = {"done": True, "ttft_ms": ttft_ms,
+                        "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            except Exception as e:
+                logger.error(f"An error occurred: {str(e)}")
+                done = {"done": True, "error": str(e)}
+            _write_chunk(writer, done)
+            writer.write(b"0\r\n\r\n")
+
+        try:
+            await self.registry.run(actor_id, session_id, forward)
+        except SessionLimitError as e:
+            _write_response(writer, 429, {"error": str(e)})
+
+    async def dispatch(self, method: str, path: str, body: bytes):
+        if method == "POST" and path == "/chat":
+            return await self.handle_chat(body)
+        if method == "GET" and path == "/stats":
+            return 200, {"sessions": self.registry.stats(), "agent_pools": pool_stats(),
+                         "limiters": limiter_stats(), "metrics": metrics.snapshot()}
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if method == "DELETE" and len(parts) == 3 and parts[0] == "sessions":
+            return 200, {"closed": self.registry.close(parts[1], parts[2])}
+        return 404, {"error": f"no route for {method} {path}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, path, body = await _read_request(reader)
+                if method == "POST" and path == "/chat/stream":
+                    await self.handle_chat_stream(body, writer)
+                    await writer.drain()
+                    return
+                status, payload = await self.dispatch(method, path, body)
+            except BadRequest as e:
+                status, payload = (413 if "too large" in str(e) else 400), {"error": str(e)}
+            except (ValueError, asyncio.IncompleteReadError) as e:
+                status, payload = 400, {"error": f"malformed request: {e}"}
+            except Exception as e:
+                logger.error(f"An error occurred: {str(e)}")
+                status, payload = 500, {"error": str(e)}
+            _write_response(writer, status, payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def sweep_sessions(self):
+        """定期清理空闲会话"""
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+            self.registry.evict_idle()
+
+    async def serve(self, host: str = SERVER_HOST, port: int = SERVER_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        sweeper = asyncio.create_task(self.sweep_sessions())
+        logger.info(f"Serving multi-agent HTTP API on http://{host}:{port}")
+        print(f"\n📁 Strands Multi-Agent Server: http://{host}:{port} 📁\n")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+
+# 主程序入口
+if __name__ == "__main__":
+    try:
+        asyncio.run(AgentServer(SessionRegistry(create_master_agent)).serve())
+    except KeyboardInterrupt:
+        logger.info("Server stopped by user")
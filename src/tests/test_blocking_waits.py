@@ -0,0 +1,88 @@
+"""池满或缓存加载中时，等待者不能占住阻塞线程池的线程"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from agents.agent_pool import AgentPool
+from utils import executor
+from utils.cache import TTLCache
+from utils.executor import run_blocking
+
+
+@pytest.fixture
+def small_executor(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(executor, "_executor", pool)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_agent_pool_waiters_do_not_hold_executor_threads(small_executor):
+    pool = AgentPool("test-waiters", factory=object, max_size=1, timeout=5, reset=lambda agent: None)
+    call_seconds = []
+
+    async def request():
+        async with pool.agent_async():
+            start = time.perf_counter()
+            await run_blocking(time.sleep, 0.05)  # 借出的 Agent 执行工具调用
+            call_seconds.append(time.perf_counter() - start)
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(8)))
+
+    asyncio.run(main())
+    assert len(call_seconds) == 8
+    assert max(call_seconds) < 0.5
+    assert pool.stats()["created"] == 1
+
+
+def test_agent_pool_async_wait_times_out():
+    pool = AgentPool("test-timeout", factory=object, max_size=1, timeout=0.1, reset=lambda agent: None)
+
+    async def main():
+        held = await pool.acquire_async()
+        with pytest.raises(TimeoutError):
+            await pool.acquire_async()
+        pool.release(held)
+        assert await pool.acquire_async() is held
+
+    asyncio.run(main())
+
+
+def test_agent_pool_cancelled_waiter_passes_on_release():
+    pool = AgentPool("test-cancel", factory=object, max_size=1, timeout=5, reset=lambda agent: None)
+
+    async def main():
+        held = await pool.acquire_async()
+        cancelled = asyncio.ensure_future(pool.acquire_async())
+        second = asyncio.ensure_future(pool.acquire_async())
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        pool.release(held)
+        assert await asyncio.wait_for(second, 1) is held
+
+    asyncio.run(main())
+
+
+def test_cache_waiters_do_not_hold_executor_threads(small_executor):
+    cache = TTLCache("test-coalesce", ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.3)
+        return "value"
+
+    async def main():
+        waiters = asyncio.gather(*(cache.get_or_load_async("key", loader) for _ in range(16)))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await run_blocking(lambda: 1)  # 无关的阻塞调用不应排在等待者后面
+        unrelated = time.perf_counter() - start
+        return await waiters, unrelated
+
+    results, unrelated = asyncio.run(main())
+    assert results == ["value"] * 16
+    assert loads == [1]
+    assert unrelated < 0.1
+    assert cache.stats()["coalesced"] == 15
@@ -0,0 +1,26 @@
+import asyncio
+import time
+from utils.cache import TTLCache
+
+
+def test_callable_ttl_is_evaluated_when_value_is_stored():
+    cache = TTLCache("test", ttl=60)
+    window_end = time.monotonic() + 0.15
+
+    async def slow_load():
+        await asyncio.sleep(0.1)
+        return "report"
+
+    async def main():
+        return await cache.get_or_await("key", slow_load, ttl=lambda: window_end - time.monotonic())
+
+    assert asyncio.run(main()) == "report"
+    _, expires_at, _ = cache._data["key"]
+    # 过期时间对齐窗口结束，而不是发起加载时刻 + 剩余时间
+    assert abs(expires_at - window_end) < 0.02
+
+
+def test_value_generated_past_its_window_expires_immediately():
+    cache = TTLCache("test", ttl=60)
+    cache.get_or_load("key", lambda: "late", ttl=lambda: max(0.0, -1.0))
+    assert cache.get("key") is None
@@ -0,0 +1,23 @@
+import asyncio
+import threading
+import master_agent
+from agents.router import Route
+
+
+async def no_record(agent, user_input, text):
+    pass
+
+
+def test_sync_fast_path_tool_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def get_user_risk_tolerance_level(user_id):
+        threads.append(threading.current_thread())
+        return 4
+
+    monkeypatch.setitem(master_agent.FAST_PATH_TOOLS, "get_user_risk_tolerance_level", get_user_risk_tolerance_level)
+    monkeypatch.setattr(master_agent, "record_turn", no_record)
+    route = Route("get_user_risk_tolerance_level", {"user_id": "user_1"}, 0.9, "test")
+    text = asyncio.run(master_agent.dispatch_route(None, route, "user_1 的风险等级"))
+    assert "4" in text
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,64 @@
+import pytest
+from agents.hr_employee_regulation import HR_FILLER_PHRASES, HR_KEY_TERMS, HR_CACHE_THRESHOLD
+from utils.embedding import filler_stripper, key_term_extractor
+from utils.semantic_cache import SemanticCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticCache(
+        "test_hr_cache",
+        path=str(tmp_path / "hr_cache.json"),
+        threshold=HR_CACHE_THRESHOLD,
+        normalize_fn=filler_stripper(HR_FILLER_PHRASES),
+        key_terms_fn=key_term_extractor(HR_KEY_TERMS),
+    )
+
+
+# 字面高度相似但答案不同的问题，不能互相命中
+NEAR_MISSES = [
+    ("产假有多少天", "陪产假有多少天"),
+    ("入职需要准备什么材料", "离职需要准备什么材料"),
+    ("What is the maternity leave policy?", "What is the paternity leave policy?"),
+    ("年假政策是什么", "病假政策是什么"),
+    ("2023年的年终奖怎么发", "2024年的年终奖怎么发"),
+]
+
+# 同一问题的不同问法，应命中缓存
+PARAPHRASES = [
+    ("公司的年假政策是什么", "年假政策是怎样的"),
+    ("请问加班有加班费吗", "加班有加班费吗"),
+    ("What is the company's overtime policy?", "overtime policy"),
+]
+
+
+@pytest.mark.parametrize("cached, query", NEAR_MISSES + [(b, a) for a, b in NEAR_MISSES])
+def test_near_miss_questions_do_not_share_answers(cache, cached, query):
+    cache.store(cached, f"answer for {cached}")
+    assert cache.lookup(query) is None
+
+
+@pytest.mark.parametrize("cached, query", PARAPHRASES)
+def test_paraphrases_hit(cache, cached, query):
+    cache.store(cached, "answer")
+    assert cache.lookup(query) == "answer"
+
+
+def test_key_terms_use_longest_match():
+    extract = key_term_extractor(HR_KEY_TERMS)
+    assert extract("陪产假有多少天") == {"陪产假"}
+    assert extract("产假和陪产假") == {"产假", "陪产假"}
+    assert extract("Paternity leave") == {"paternity"}
+
+
+def test_key_terms_survive_reload(cache, tmp_path):
+    cache.store("产假有多少天", "maternity answer")
+    reloaded = SemanticCache(
+        "test_hr_cache",
+        path=str(tmp_path / "hr_cache.json"),
+        threshold=HR_CACHE_THRESHOLD,
+        normalize_fn=filler_stripper(HR_FILLER_PHRASES),
+        key_terms_fn=key_term_extractor(HR_KEY_TERMS),
+    )
+    assert reloaded.lookup("陪产假有多少天") is None
+    assert reloaded.lookup("产假有多少天") == "maternity answer"
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from utils import executor, limiter, replay, tracing
+from utils.executor import run_blocking
+from utils.limiter import UpstreamLimiter, UpstreamOverloaded, limited, run_limited
+from utils.replay import ReplayStore, replayable
+from utils.tracing import traced
+
+
+@pytest.fixture
+def small_executor(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(executor, "_executor", pool)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    test_limiter = UpstreamLimiter("test", max_concurrency=2, rate=0, max_queue=64, queue_timeout=5)
+    monkeypatch.setitem(limiter.limiters, "test", test_limiter)
+    return test_limiter
+
+
+def test_queued_calls_wait_on_event_loop(small_executor, upstream):
+    @limited("test")
+    def call(i):
+        time.sleep(0.02)
+        return i
+
+    async def main():
+        calls = asyncio.gather(*(run_limited("test", call, i) for i in range(40)))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await run_blocking(lambda: 1)
+        unrelated = time.perf_counter() - start
+        return await calls, unrelated
+
+    results, unrelated = asyncio.run(main())
+    assert results == list(range(40))
+    assert unrelated < 0.1
+    assert upstream.rejected == 0
+    assert upstream.in_flight == 0
+
+
+def test_unused_permit_is_returned(small_executor, upstream):
+    @limited("test")
+    def call():
+        return "upstream"
+
+    def maybe_cached(hit):
+        # 模拟回放命中：外层装饰直接返回，没有到达 limited
+        return "cached" if hit else call()
+
+    async def main():
+        async with upstream.slot_async(), upstream.slot_async():
+            pending = asyncio.ensure_future(run_limited("test", maybe_cached, False))
+            await asyncio.sleep(0.05)
+            assert upstream.waiting == 1
+        assert await pending == "upstream"
+        assert await run_limited("test", maybe_cached, True) == "cached"
+
+    asyncio.run(main())
+    assert upstream.in_flight == 0
+
+
+def test_queue_full_rejects(small_executor, monkeypatch):
+    tight = UpstreamLimiter("tight", max_concurrency=1, rate=0, max_queue=1, queue_timeout=5)
+    monkeypatch.setitem(limiter.limiters, "tight", tight)
+
+    @limited("tight")
+    def call():
+        time.sleep(0.1)
+
+    async def main():
+        return await asyncio.gather(*(run_limited("tight", call) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert sum(isinstance(r, UpstreamOverloaded) for r in results) == 1
+    assert tight.in_flight == 0
+
+
+def test_throttle_halves_concurrency(small_executor, upstream):
+    class ThrottlingException(Exception):
+        pass
+
+    @limited("test")
+    def call():
+        raise ThrottlingException()
+
+    with pytest.raises(ThrottlingException):
+        asyncio.run(run_limited("test", call))
+    assert upstream.concurrency == 1
+    assert upstream.throttles == 1
+
+
+def test_queued_call_records_one_span_and_one_replay_entry(small_executor, upstream, tmp_path, monkeypatch):
+    store = ReplayStore(str(tmp_path))
+    monkeypatch.setattr(replay, "_store", store)
+    monkeypatch.setattr(replay, "REPLAY_MODE", "auto")
+    spans = []
+
+    class Collector:
+        def export(self, item):
+            spans.append(item)
+
+    collector = Collector()
+    tracing.add_exporter(collector)
+
+    @limited("test")
+    @traced("test.call")
+    @replayable("test.call")
+    def call(i):
+        return i
+
+    async def main():
+        async with upstream.slot_async(), upstream.slot_async():
+            # 两个许可都被占用，调用需要先在事件循环上排队
+            pending = asyncio.ensure_future(run_limited("test", call, 1))
+            await asyncio.sleep(0.05)
+            assert upstream.waiting == 1
+        return await pending
+
+    try:
+        assert asyncio.run(main()) == 1
+    finally:
+        tracing.remove_exporter(collector)
+        store.close()
+    call_spans = [item for item in spans if item.name == "test.call"]
+    assert len(call_spans) == 1 and "error" not in call_spans[0].attributes
+    assert store.misses == 1 and store.records == 1
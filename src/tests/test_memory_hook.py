@@ -0,0 +1,14 @@
+import master_agent
+
+
+def test_failed_memory_initialization_is_retried(monkeypatch):
+    results = iter([(None, {}), ("mem-1", {"SEMANTIC": "/facts/{actorId}"})])
+    monkeypatch.setattr(master_agent, "get_memory_client", lambda: object())
+    monkeypatch.setattr(master_agent, "get_memory_metadata", lambda *args: next(results))
+    monkeypatch.setattr(master_agent, "MEMORY_WRITE_BEHIND", False)
+    monkeypatch.setattr(master_agent, "_memory_hook", None)
+
+    assert master_agent.get_memory_hook().memory_id is None
+    hook = master_agent.get_memory_hook()
+    assert hook.memory_id == "mem-1"
+    assert master_agent.get_memory_hook() is hook
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+import pytest
+from agentcore import memory_writer
+from agentcore.memory_writer import MemoryWriteBehind
+
+
+class FakeMemoryClient:
+    """create_event 遇到 poison 文本时失败；记录每次成功写入的消息"""
+
+    def __init__(self, error=RuntimeError("service unavailable"), delay: float = 0.0):
+        self.error = error
+        self.delay = delay
+        self.events = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create_event(self, memory_id, actor_id, session_id, messages, event_timestamp=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if any(text == "poison" for text, _ in messages):
+            raise self.error
+        with self._lock:
+            self.events.append((session_id, [text for text, _ in messages]))
+
+    def written(self, session_id):
+        return [text for sid, texts in self.events if sid == session_id for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(memory_writer, "_retry_delay", lambda attempts: 0.01)
+
+
+def make_writer(tmp_path, client, **kwargs):
+    kwargs.setdefault("flush_interval", 0.01)
+    return MemoryWriteBehind(client, spool_path=str(tmp_path / "spool.jsonl"),
+                             dead_letter_path=str(tmp_path / "dead.jsonl"), **kwargs)
+
+
+def spool_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] if path.exists() else []
+
+
+def test_poison_record_is_dead_lettered_without_blocking_its_session(tmp_path):
+    client = FakeMemoryClient()
+    writer = make_writer(tmp_path, client, max_retries=3)
+    for text in ("a", "poison", "b", "c"):
+        writer.submit("mem", "actor", "s1", text, "USER")
+    assert writer.flush(5)
+    writer.close()
+
+    assert client.written("s1") == ["a", "b", "c"]
+    dead = spool_lines(tmp_path / "dead.jsonl")
+    assert [r["text"] for r in dead] == ["poison"]
+    assert dead[0]["attempts"] == 4
+    assert spool_lines(tmp_path / "spool.jsonl") == []
+    assert writer.stats()["dead_lettered"] == 1
+
+
+def test_non_retryable_error_is_dead_lettered_immediately(tmp_path):
+    client = FakeMemoryClient(error=ValueError("bad message"))
+    writer = make_writer(tmp_path, client, max_retries=3)
+    writer.submit("mem", "actor", "s1", "poison", "USER")
+    writer.submit("mem", "actor", "s1", "ok", "USER")
+    assert writer.flush(5)
+    writer.close()
+    assert spool_lines(tmp_path / "dead.jsonl")[0]["attempts"] == 1
+    assert client.written("s1") == ["ok"]
+
+
+def test_backoff_does_not_stall_other_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_writer, "_retry_delay", lambda attempts: 0.5)
+    client = FakeMemoryClient()
+    writer = make_writer(tmp_path, client, max_retries=1)
+    writer.submit("mem", "actor", "blocked", "poison", "USER")
+    time.sleep(0.1)  # 第一次写入失败，blocked 会话进入退避
+    writer.submit("mem", "actor", "other", "hello", "USER")
+    deadline = time.monotonic() + 0.3
+    while not client.written("other") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.written("other") == ["hello"]
+    assert writer.flush(5)
+    writer.close()
+
+
+def test_submit_never_blocks_and_counts_drops_when_writer_is_stuck(tmp_path):
+    client = FakeMemoryClient()
+    gate = threading.Event()
+    create_event = client.create_event
+    client.create_event = lambda *args, **kwargs: (gate.wait(5), create_event(*args, **kwargs))
+    writer = make_writer(tmp_path, client, max_queue=2, batch_size=1)
+    start = time.perf_counter()
+    for i in range(20):
+        writer.submit("mem", "actor", "s1", f"m{i}", "USER")
+    assert time.perf_counter() - start < 0.2
+    gate.set()
+    assert writer.flush(5)
+    writer.close()
+    written = client.written("s1")
+    assert writer.stats()["dropped"] == 20 - len(written) > 0
+    assert written == sorted(written, key=lambda text: int(text[1:]))
+
+
+def test_backlog_past_the_cap_is_kept_only_in_the_spool(tmp_path, monkeypatch):
+    client = FakeMemoryClient()
+    failing = threading.Event()
+    failing.set()
+    create_event = client.create_event
+
+    def flaky_create_event(*args, **kwargs):
+        if failing.is_set():
+            raise RuntimeError("service unavailable")
+        return create_event(*args, **kwargs)
+
+    client.create_event = flaky_create_event
+    compactions = []
+    compact = MemoryWriteBehind._compact
+    monkeypatch.setattr(MemoryWriteBehind, "_compact", lambda self: (compactions.append(1), compact(self)))
+    writer = make_writer(tmp_path, client, max_queue=4, max_retries=1000)
+    for i in range(200):
+        writer.submit("mem", "actor", "s1", f"m{i}", "USER")
+        if i % 4 == 3:
+            time.sleep(0.005)  # 让后台线程取走队列中的消息，不触发丢弃
+    time.sleep(0.1)
+    stats = writer.stats()
+    assert stats["pending"] <= 4
+    assert stats["pending"] + stats["spilled"] == 200
+    assert stats["dropped"] == 0
+
+    failing.clear()
+    assert writer.flush(10)
+    writer.close()
+    assert client.written("s1") == [f"m{i}" for i in range(200)]
+    assert spool_lines(tmp_path / "spool.jsonl") == []
+    # 确认只追加确认记录，排空积压不会每次都重写整个 spool
+    assert len(compactions) <= 2
+
+
+def test_spool_is_written_by_the_writer_thread(tmp_path, monkeypatch):
+    threads = []
+    write_spool = MemoryWriteBehind._write_spool
+    monkeypatch.setattr(MemoryWriteBehind, "_write_spool",
+                        lambda self, entry: (threads.append(threading.current_thread().name),
+                                             write_spool(self, entry)))
+    client = FakeMemoryClient()
+    writer = make_writer(tmp_path, client)
+    for i in range(5):
+        writer.submit("mem", "actor", "s1", f"m{i}", "USER")
+    assert writer.flush(5)
+    writer.close()
+    assert threads and set(threads) == {"memory-writer"}
+
+
+def test_replay_spool_larger_than_queue(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    with open(spool, "w", encoding="utf-8") as f:
+        for i in range(5):
+            f.write(json.dumps({"id": str(i), "memory_id": "mem", "actor_id": "actor", "session_id": "s1",
+                                "text": f"m{i}", "role": "USER", "ts": time.time()}) + "\n")
+        f.write('{"id": "partial')  # 崩溃时留下的不完整行
+    client = FakeMemoryClient()
+    writer = make_writer(tmp_path, client, max_queue=2)
+    assert writer.flush(5)
+    writer.close()
+    assert client.written("s1") == [f"m{i}" for i in range(5)]
@@ -0,0 +1,89 @@
+import asyncio
+import time
+import pytest
+from agents.planner import Planner, execute_plan, merge_results
+
+planner = Planner()
+
+
+def summary(steps):
+    return [(s.tool, s.args.get("stock") or s.args.get("user_id"), s.depends_on) for s in steps]
+
+
+def test_plans_chinese_compound_query():
+    steps = planner.plan("user_123 的风险等级，然后分析 TSLA，以及公司的股权激励政策")
+    assert summary(steps) == [
+        ("get_user_risk_tolerance_level", "user_123", ()),
+        ("stock_analysis", "TSLA", (0,)),
+        ("hr_employee_regulation_search", None, ()),
+    ]
+    assert steps[1].risk_from == 0
+
+
+def test_plans_english_compound_query():
+    steps = planner.plan("user_123's risk level, then analyze TSLA, and what's our stock-option policy")
+    assert summary(steps) == [
+        ("get_user_risk_tolerance_level", "user_123", ()),
+        ("stock_analysis", "TSLA", (0,)),
+        ("hr_employee_regulation_search", None, ()),
+    ]
+
+
+def test_plans_hr_and_general_question():
+    steps = planner.plan("年假有几天？另外什么是 ESG")
+    assert [s.tool for s in steps] == ["hr_employee_regulation_search", "general_assistant"]
+
+
+@pytest.mark.parametrize("query", [
+    "年假有几天？另外什么是 ABC",              # 未知缩写不能当成股票代码
+    "年假有几天？另外 NYT 那篇文章说了什么",
+    "帮 user_1 和 user_2 查一下风险等级，然后分析 TSLA",  # 风险等级与股票的对应关系不明确
+    "年假政策是什么",                          # 单一工具，交给快速路由
+    "分析一下股票，另外年假有几天",             # 有股票意图但没有代码
+])
+def test_ambiguous_queries_are_not_planned(query):
+    assert planner.plan(query) is None
+
+
+def test_execute_plan_runs_independent_steps_concurrently():
+    steps = planner.plan("user_123 的风险等级，然后分析 TSLA，以及公司的股权激励政策")
+    seen = {}
+
+    def get_user_risk_tolerance_level(user_id):
+        time.sleep(0.1)
+        return 5
+
+    async def stock_analysis(stock, user_risk_tolerance_level):
+        seen["level"] = user_risk_tolerance_level
+        await asyncio.sleep(0.1)
+        return f"{stock} report"
+
+    async def hr_employee_regulation_search(query):
+        await asyncio.sleep(0.15)
+        return "hr answer"
+
+    tools = {f.__name__: f for f in (get_user_risk_tolerance_level, stock_analysis,
+                                     hr_employee_regulation_search)}
+    start = time.perf_counter()
+    results = asyncio.run(execute_plan(steps, tools))
+    elapsed = time.perf_counter() - start
+
+    assert seen["level"] == 5
+    assert [r.ok for r in results] == [True, True, True]
+    assert "TSLA report" in merge_results(results)
+    assert elapsed < 0.3  # 关键路径 0.2s，而不是 0.35s 之和
+
+
+def test_execute_plan_times_out_single_step():
+    steps = planner.plan("年假有几天？另外什么是 ESG")
+
+    async def hr_employee_regulation_search(query):
+        await asyncio.sleep(1)
+
+    async def general_assistant(query):
+        return "general answer"
+
+    tools = {"hr_employee_regulation_search": hr_employee_regulation_search,
+             "general_assistant": general_assistant}
+    results = asyncio.run(execute_plan(steps, tools, timeout=0.05))
+    assert [r.ok for r in results] == [False, True]
@@ -0,0 +1,97 @@
+import threading
+import time
+import pytest
+from agents.profile_store import (
+    PROFILE_BACKENDS, ProfileBackend, SqliteProfileBackend, UserProfileStore, create_profile_backend, register_backend,
+)
+
+
+class CountingBackend(SqliteProfileBackend):
+    """记录每次 get_many 的参数；设置 gate 时查询读完数据后等待 gate 才返回"""
+
+    def __init__(self):
+        super().__init__(":memory:")
+        self.calls = []
+        self.gate = None
+        self.read = threading.Event()
+
+    def get_many(self, user_ids):
+        self.calls.append(list(user_ids))
+        profiles = super().get_many(user_ids)
+        self.read.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return profiles
+
+
+@pytest.fixture
+def backend():
+    backend = CountingBackend()
+    backend.put_many({"u1": {"risk_tolerance_level": 2}, "u2": {"risk_tolerance_level": 4, "name": "Bob"}})
+    return backend
+
+
+def test_read_through_hits_backend_once(backend):
+    store = UserProfileStore(backend)
+    assert store.get("u2") == {"risk_tolerance_level": 4, "name": "Bob"}
+    assert store.risk_tolerance_level("u2") == 4
+    assert backend.calls == [["u2"]]
+
+
+def test_unknown_user_is_negatively_cached(backend):
+    store = UserProfileStore(backend, negative_ttl=0.05)
+    assert store.get("ghost") is None
+    assert store.risk_tolerance_level("ghost") == 3
+    assert backend.calls == [["ghost"]]
+    time.sleep(0.06)
+    store.get("ghost")
+    assert backend.calls == [["ghost"], ["ghost"]]
+
+
+def test_put_invalidates_and_notifies_hooks(backend):
+    store = UserProfileStore(backend)
+    invalidated = []
+    store.add_invalidation_hook(invalidated.append)
+    assert store.risk_tolerance_level("u1") == 2
+    store.put("u1", {"risk_tolerance_level": 5})
+    assert store.risk_tolerance_level("u1") == 5
+    store.invalidate()
+    assert invalidated == ["u1", None]
+
+
+def test_get_many_batches_misses(backend):
+    store = UserProfileStore(backend)
+    store.get("u1")
+    result = store.get_many(["u1", "u2", "ghost", "u2"])
+    assert result == {"u1": {"risk_tolerance_level": 2}, "u2": {"risk_tolerance_level": 4, "name": "Bob"},
+                      "ghost": None}
+    assert backend.calls == [["u1"], ["u2", "ghost"]]
+
+
+@pytest.mark.parametrize("invalidate_all", [False, True])
+def test_stale_load_does_not_overwrite_concurrent_invalidate(backend, invalidate_all):
+    store = UserProfileStore(backend)
+    backend.gate = threading.Event()
+    reader = threading.Thread(target=store.get, args=("u1",))
+    reader.start()
+    assert backend.read.wait(5)
+    # 查询已读到旧值但尚未写入缓存时画像被更新
+    backend.put_many({"u1": {"risk_tolerance_level": 5}})
+    store.invalidate(None if invalidate_all else "u1")
+    backend.gate.set()
+    reader.join(5)
+    assert store.risk_tolerance_level("u1") == 5
+    assert store._generations == {}
+
+
+def test_backend_missing_a_method_fails_at_creation():
+    class ReadOnlyBackend(ProfileBackend):
+        def get_many(self, user_ids):
+            return {}
+
+    register_backend("read_only", ReadOnlyBackend)
+    try:
+        with pytest.raises(TypeError):
+            create_profile_backend("read_only")
+    finally:
+        PROFILE_BACKENDS.pop("read_only")
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import uuid
+import pytest
+from utils import replay
+from utils.fake_model import FakeModel
+from utils.replay import ReplayMissError, ReplayModel, ReplayStore, replayable
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ReplayStore(str(tmp_path))
+    monkeypatch.setattr(replay, "_store", store)
+    yield store
+    store.close()
+
+
+def counting_model(calls):
+    def responder(model_id, messages, system_prompt):
+        calls.append(model_id)
+        return f"answer {len(calls)}"
+    return FakeModel(model_id="fake-model", latency_ms=0, tokens_per_second=1e9, responder=responder)
+
+
+def invocation_kwargs():
+    """模拟 strands 传给 Model.stream 的 kwargs：每次运行都含新的对象和随机 ID"""
+    return {"invocation_state": {"agent": object(), "event_loop_cycle_id": uuid.uuid4(),
+                                 "cancel": threading.Event()}}
+
+
+def collect(model, messages, **kwargs):
+    async def run():
+        return [event async for event in model.stream(messages, system_prompt="sys", **kwargs)]
+    return asyncio.run(run())
+
+
+def test_model_record_then_replay_round_trip(store, monkeypatch):
+    conversation = [[{"role": "user", "content": [{"text": f"turn {i}"}]}] for i in range(4)]
+    calls = []
+    monkeypatch.setattr(replay, "REPLAY_MODE", "record")
+    recorded = [collect(ReplayModel(counting_model(calls)), messages, **invocation_kwargs())
+                for messages in conversation]
+    assert len(calls) == 4
+
+    # 回放时用新的模型实例和新的 invocation_state，模拟另一个进程
+    monkeypatch.setattr(replay, "REPLAY_MODE", "replay")
+    replay_calls = []
+    replayed = [collect(ReplayModel(counting_model(replay_calls)), messages, **invocation_kwargs())
+                for messages in conversation]
+    assert replayed == recorded
+    assert replay_calls == []
+    assert store.hits == 4 and store.misses == 0
+
+
+def test_model_replay_miss_raises(store, monkeypatch):
+    monkeypatch.setattr(replay, "REPLAY_MODE", "replay")
+    with pytest.raises(ReplayMissError):
+        collect(ReplayModel(counting_model([])), [{"role": "user", "content": [{"text": "new"}]}])
+
+
+def test_replayable_function_round_trip(store, monkeypatch):
+    calls = []
+
+    @replayable("test.lookup")
+    def lookup(query, limit=3):
+        calls.append(query)
+        return {"query": query, "limit": limit}
+
+    monkeypatch.setattr(replay, "REPLAY_MODE", "auto")
+    assert lookup("a") == {"query": "a", "limit": 3}
+    assert lookup("a", limit=3) == {"query": "a", "limit": 3}
+    assert calls == ["a"]
+
+
+def test_store_recovers_unindexed_records(tmp_path):
+    store = ReplayStore(str(tmp_path))
+    key = replay.content_key("call", "x", {"a": 1})
+    store.put(key, [1, 2, 3])
+    store.close()
+    (tmp_path / "replay.idx").write_bytes(b"")
+    reopened = ReplayStore(str(tmp_path))
+    assert reopened.lookup(key) == (True, [1, 2, 3])
+    reopened.close()
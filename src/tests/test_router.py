@@ -0,0 +1,35 @@
+import pytest
+from agents.router import FastRouter
+from benchmarks.routing_benchmark import DEFAULT_CASES, load_cases
+
+router = FastRouter()
+
+
+@pytest.mark.parametrize("case", load_cases(DEFAULT_CASES), ids=lambda case: case["query"])
+def test_fast_path_never_misroutes(case):
+    route = router.route(case["query"])
+    if route is not None:
+        assert route.tool == case["expected"]
+
+
+@pytest.mark.parametrize("query", [
+    "What is GPT?", "什么是ESG？", "NASA是什么", "公司的 VPN 怎么连", "我想了解一下 ROE 指标",
+    "Please summarise the NYT article", "ABC 是什么意思",
+])
+def test_acronyms_are_not_routed_to_stock_analysis(query):
+    route = router.route(query)
+    assert route is None or route.tool != "stock_analysis"
+
+
+@pytest.mark.parametrize("query, ticker", [
+    ("GOOGL", "GOOGL"), ("AMD?", "AMD"), ("TSLA 现在什么价格", "TSLA"), ("analyze MSFT please", "MSFT"),
+    ("帮我分析一下AAPL股票", "AAPL"),
+])
+def test_confirmed_tickers_take_fast_path(query, ticker):
+    route = router.route(query)
+    assert route is not None and route.tool == "stock_analysis" and route.args["stock"] == ticker
+
+
+def test_stock_keyword_inside_hr_question_routes_to_hr():
+    route = router.route("What's our stock option policy?")
+    assert route is not None and route.tool == "hr_employee_regulation_search"
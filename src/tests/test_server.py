@@ -0,0 +1,25 @@
+import pytest
+from server import AgentServer, BadRequest
+
+
+@pytest.mark.parametrize("body", [b"[]", b'"hello"', b"42", b"null", b"not json"])
+def test_rejects_body_that_is_not_a_json_object(body):
+    with pytest.raises(BadRequest):
+        AgentServer.parse_chat_request(body)
+
+
+def test_parses_chat_request():
+    body = b'{"actor_id": "u1", "session_id": "s1", "query": "hi"}'
+    assert AgentServer.parse_chat_request(body) == ("u1", "s1", "hi")
+
+
+@pytest.mark.parametrize("body", [
+    b'{"actor_id": "u1", "session_id": "s1", "query": 123}',
+    b'{"actor_id": "u1", "session_id": "s1", "query": ["a"]}',
+    b'{"actor_id": 1, "session_id": "s1", "query": "hi"}',
+    b'{"actor_id": "u1", "session_id": {"id": 1}, "query": "hi"}',
+    b'{"actor_id": "u1", "session_id": "s1", "query": ""}',
+])
+def test_rejects_non_string_fields(body):
+    with pytest.raises(BadRequest):
+        AgentServer.parse_chat_request(body)
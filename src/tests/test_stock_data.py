@@ -0,0 +1,32 @@
+import json
+import pandas as pd
+import pytest
+from tools import stock_data
+
+
+def fake_download(frame):
+    def download(tickers, **kwargs):
+        return frame
+    return download
+
+
+@pytest.mark.parametrize("frame", [
+    pd.DataFrame(),
+    pd.DataFrame({("Close", "XXXX"): [float("nan")] * 3, ("Close", "YYYY"): [float("nan")] * 3},
+                 index=pd.date_range("2024-01-01", periods=3)),
+], ids=["empty", "all-nan"])
+def test_batch_summary_without_any_data(monkeypatch, frame):
+    monkeypatch.setattr(stock_data.yf, "download", fake_download(frame))
+    payload = json.loads(stock_data._fetch_batch_summary(("XXXX", "YYYY"), "1mo"))
+    assert payload == {"period": "1mo", "ticker": ["XXXX", "YYYY"], "error": "No price data found"}
+
+
+def test_batch_summary_keeps_valid_tickers(monkeypatch):
+    index = pd.date_range("2024-01-01", periods=3)
+    frame = pd.DataFrame({("Close", "AAPL"): [100.0, 101.0, 102.0], ("Close", "XXXX"): [float("nan")] * 3},
+                         index=index)
+    monkeypatch.setattr(stock_data.yf, "download", fake_download(frame))
+    payload = json.loads(stock_data._fetch_batch_summary(("AAPL", "XXXX"), "1mo"))
+    assert payload["ticker"] == ["AAPL", "XXXX"]
+    assert payload["last"] == [102.0, None]
+    assert payload["as_of"] == "2024-01-03"
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from agents import stock_analysis
+from agents.model_tiers import EscalationPolicy
+from utils import streaming
+from utils.streaming import emit
+
+ANSWERS = {"fast": "fast answer", "strong": "strong answer <page>"}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def fake_analyze(tier, query, stream=True):
+        calls.append((tier, stream))
+        if stream:
+            emit("stock_analysis", ANSWERS[tier])
+        return ANSWERS[tier]
+
+    monkeypatch.setattr(stock_analysis, "_analyze", fake_analyze)
+    return calls
+
+
+def use_policy(monkeypatch, max_rate=1.0):
+    policy = EscalationPolicy("test", base_tier="fast", escalation_tier="strong", max_rate=max_rate,
+                              required_marker="<page>")
+    monkeypatch.setattr(stock_analysis, "stock_escalation_policy", policy)
+
+
+def generate_streaming(fast_answer="fast answer"):
+    ANSWERS["fast"] = fast_answer
+
+    async def main():
+        queue = asyncio.Queue()
+        streaming._stream_queue.set(queue)
+        text = await stock_analysis._generate("TSLA", 3)
+        chunks = []
+        while not queue.empty():
+            chunks.append(queue.get_nowait()["text"])
+        return text, chunks
+
+    return asyncio.run(main())
+
+
+def test_escalated_base_answer_is_never_streamed(monkeypatch, calls):
+    use_policy(monkeypatch)
+    text, chunks = generate_streaming()
+    assert text == "strong answer <page>"
+    assert chunks == ["strong answer <page>"]
+    assert calls == [("fast", False), ("strong", True)]
+
+
+def test_confident_base_answer_is_forwarded_once(monkeypatch, calls):
+    use_policy(monkeypatch)
+    text, chunks = generate_streaming("fast answer <page>")
+    assert chunks == [text] == ["fast answer <page>"]
+    assert calls == [("fast", False)]
+
+
+def test_streams_directly_when_escalation_budget_is_spent(monkeypatch, calls):
+    use_policy(monkeypatch, max_rate=0)
+    text, chunks = generate_streaming()
+    assert chunks == [text] == ["fast answer"]
+    assert calls == [("fast", True)]
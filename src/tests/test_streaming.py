@@ -0,0 +1,43 @@
+import asyncio
+import contextlib
+import master_agent
+from agents import hr_employee_regulation as hr
+
+ANSWER = "年假为每年 15 天。"
+
+
+class FakeAgent:
+    async def invoke_async(self, prompt):
+        return ANSWER
+
+    async def stream_async(self, prompt):
+        for i in range(0, len(ANSWER), 4):
+            yield {"data": ANSWER[i:i + 4]}
+        yield {"result": ANSWER}
+
+
+class FakePool:
+    @contextlib.asynccontextmanager
+    async def agent_async(self):
+        yield FakeAgent()
+
+
+async def no_record(agent, user_input, text):
+    pass
+
+
+def test_hr_answer_in_retrieve_mode_is_streamed_once(monkeypatch):
+    async def retrieve_passages(query):
+        return [{"text": "员工每年享有 15 天年假", "source": "", "score": 1.0}]
+
+    monkeypatch.setattr(hr, "HR_KB_MODE", "retrieve")
+    monkeypatch.setattr(hr, "HR_CACHE_ENABLED", False)
+    monkeypatch.setattr(hr, "retrieve_passages", retrieve_passages)
+    monkeypatch.setattr(hr, "hr_agent_pool", FakePool())
+    monkeypatch.setattr(master_agent, "record_turn", no_record)
+
+    async def main():
+        return [chunk["text"] async for chunk in master_agent.stream_async(None, "年假有几天")]
+
+    text = "".join(asyncio.run(main()))
+    assert text.count(ANSWER) == 1
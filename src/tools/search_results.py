@@ -0,0 +1,115 @@
+"""搜索结果后处理 - 对 Tavily 返回结果去重、截断并按时效和相关度排序，减少传给模型的 token"""
+import json
+import math
+import os
+import re
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from utils.logger import get_logger
+from utils.tokens import reduction_report, truncate_to_tokens
+
+logger = get_logger(__name__)
+
+# 每条摘要的 token 预算、内容相似度去重阈值，以及时效性在排序中的权重和半衰期
+WEB_SEARCH_SNIPPET_TOKENS = int(os.environ.get("WEB_SEARCH_SNIPPET_TOKENS", "120"))
+WEB_SEARCH_DEDUP_THRESHOLD = float(os.environ.get("WEB_SEARCH_DEDUP_THRESHOLD", "0.8"))
+WEB_SEARCH_RECENCY_WEIGHT = float(os.environ.get("WEB_SEARCH_RECENCY_WEIGHT", "0.3"))
+WEB_SEARCH_RECENCY_HALF_LIFE_DAYS = float(os.environ.get("WEB_SEARCH_RECENCY_HALF_LIFE_DAYS", "7"))
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+|[^\sa-z0-9]", re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """规范化 URL：去掉协议差异、www 前缀、跟踪参数、锚点和末尾斜杠"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith("utm_")])
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    tokens = _WORD_PATTERN.findall(text.lower())
+    if len(tokens) < size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    """解析 Tavily 返回的发布时间（RFC 2822 或 ISO 8601 格式）"""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _rank_score(result: Dict, published: Optional[datetime], now: datetime) -> float:
+    """综合相关度和时效性的排序分数；无发布时间的结果时效性按 0.5 计"""
+    relevance = float(result.get("score") or 0.0)
+    if published is None:
+        recency = 0.5
+    else:
+        age_days = max(0.0, (now - published).total_seconds() / 86400)
+        recency = math.pow(0.5, age_days / WEB_SEARCH_RECENCY_HALF_LIFE_DAYS)
+    return (1 - WEB_SEARCH_RECENCY_WEIGHT) * relevance + WEB_SEARCH_RECENCY_WEIGHT * recency
+
+
+def compact_results(results: List[Dict], snippet_tokens: int = WEB_SEARCH_SNIPPET_TOKENS,
+                    now: Optional[datetime] = None) -> List[Dict]:
+    """去重、排序并截断搜索结果，只保留 title/url/date/snippet 字段"""
+    now = now or datetime.now(timezone.utc)
+    ranked = []
+    for result in results:
+        published = _parse_date(result.get("published_date"))
+        ranked.append((_rank_score(result, published, now), published, result))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+
+    seen_urls = set()
+    kept_shingles = []
+    compact = []
+    for _, published, result in ranked:
+        url = result.get("url", "")
+        url_key = normalize_url(url)
+        if url_key in seen_urls:
+            continue
+        content = " ".join((result.get("content") or "").split())
+        shingles = _shingles(content)
+        if any(_jaccard(shingles, other) >= WEB_SEARCH_DEDUP_THRESHOLD for other in kept_shingles):
+            continue
+        seen_urls.add(url_key)
+        kept_shingles.append(shingles)
+        item = {"title": result.get("title", ""), "url": url}
+        if published is not None:
+            item["date"] = published.strftime("%Y-%m-%d")
+        item["snippet"] = truncate_to_tokens(content, snippet_tokens)
+        compact.append(item)
+    return compact
+
+
+def postprocess_search_response(response_data: str) -> str:
+    """将 Tavily 原始响应压缩为精简的结果列表 JSON，并记录节省的字节数和 token 数"""
+    try:
+        results = json.loads(response_data).get("results", [])
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"unable to parse Tavily response, returning it unchanged: {e}")
+        return response_data
+    compact = json.dumps(compact_results(results), ensure_ascii=False, separators=(",", ":"))
+    logger.info(f"web_search compact payload: {reduction_report(response_data, compact)}")
+    return compact
@@ -1,22 +1,183 @@
 """股票数据工具 - 使用 yfinance 获取股票历史价格数据"""
 import json
+import os
+import numpy as np
+import pandas as pd
 import yfinance as yf
 from strands import tool
+from utils.cache import TTLCache
+from utils.limiter import limited, run_limited
 from utils.logger import get_logger
+from utils.replay import replayable
+from utils.tokens import reduction_report
+from utils.tracing import traced
 
 logger = get_logger(__name__)
 
+# 价格历史缓存：进程内所有会话共享，缓存各详细程度序列化后的 JSON，命中时无需任何 pandas 计算
+STOCK_DATA_CACHE_TTL = float(os.environ.get("STOCK_DATA_CACHE_TTL", "60"))
+STOCK_DATA_CACHE_MAX_ENTRIES = int(os.environ.get("STOCK_DATA_CACHE_MAX_ENTRIES", "1024"))
+STOCK_DATA_CACHE_MAX_BYTES = int(os.environ.get("STOCK_DATA_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+price_history_cache = TTLCache(
+    "stock_data",
+    ttl=STOCK_DATA_CACHE_TTL,
+    max_entries=STOCK_DATA_CACHE_MAX_ENTRIES,
+    max_bytes=STOCK_DATA_CACHE_MAX_BYTES,
+)
+
+# 批量查询：单次最多股票数，以及 yfinance 批量下载的并发线程数
+STOCK_DATA_BATCH_MAX_TICKERS = int(os.environ.get("STOCK_DATA_BATCH_MAX_TICKERS", "20"))
+STOCK_DATA_BATCH_THREADS = int(os.environ.get("STOCK_DATA_BATCH_THREADS", "8"))
+
+# 单只股票查询的默认详细程度，以及 compact 模式下降采样后的序列点数
+STOCK_DATA_DETAIL_LEVELS = ("summary", "compact", "full")
+STOCK_DATA_DETAIL = os.environ.get("STOCK_DATA_DETAIL", "compact").strip().lower()
+STOCK_DATA_SERIES_POINTS = int(os.environ.get("STOCK_DATA_SERIES_POINTS", "10"))
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _summarize_closes(close: pd.DataFrame) -> pd.DataFrame:
+    """按列（每只股票）向量化计算收盘价的汇总指标"""
+    close = close.dropna(how="all")
+    daily_returns = close.pct_change(fill_method=None)
+    first = close.bfill().iloc[0]
+    last = close.ffill().iloc[-1]
+    summary = pd.DataFrame({
+        "last": last,
+        "change_pct": (last / first - 1) * 100,
+        "volatility_pct": daily_returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR) * 100,
+        "min": close.min(),
+        "max": close.max(),
+        "ma5": close.tail(5).mean(),
+        "ma20": close.tail(20).mean(),
+    })
+    return summary.round(2)
+
+
+def _render_compact(ticker: str, period: str, hist: pd.DataFrame, series_points: int) -> dict:
+    """将价格历史压缩为汇总指标 + 降采样序列，时间戳转换为相对首个交易日的天数"""
+    close = hist["Close"]
+    stats = _summarize_closes(close.to_frame(name=ticker)).iloc[0]
+    summary = {k: (None if pd.isna(v) else float(v)) for k, v in stats.items()}
+    summary["avg_volume"] = int(hist["Volume"].mean())
+    start = hist.index[0]
+    points = np.unique(np.linspace(0, len(hist) - 1, num=min(len(hist), series_points)).round().astype(int))
+    sampled = hist.iloc[points]
+    payload = {
+        "ticker": ticker,
+        "period": period,
+        "start": start.strftime("%Y-%m-%d"),
+        "summary": summary,
+    }
+    if series_points > 0:
+        payload["series"] = {
+            "day": [int(d) for d in (sampled.index - start).days],
+            "close": sampled["Close"].round(2).tolist(),
+            "volume": sampled["Volume"].astype(int).tolist(),
+        }
+    return payload
+
+
+@limited("yfinance")
+@traced("yfinance.history")
+@replayable("yfinance.history")
+def _fetch_price_history(ticker: str, period: str) -> dict:
+    """从 yfinance 拉取价格历史，一次性序列化出各详细程度的 JSON"""
+    logger.info(f"fetching price history from yfinance with {ticker=}, {period=}")
+    stock = yf.Ticker(ticker)
+    hist = stock.history(period=period)
+    full = hist.reset_index().to_json(orient="split", index=False, date_format="iso")
+    if hist.empty:
+        no_data = json.dumps({"ticker": ticker, "period": period, "error": "No price data found"})
+        return {"full": full, "compact": no_data, "summary": no_data}
+    return {
+        "full": full,
+        "compact": json.dumps(_render_compact(ticker, period, hist, STOCK_DATA_SERIES_POINTS),
+                              separators=(",", ":")),
+        "summary": json.dumps(_render_compact(ticker, period, hist, 0), separators=(",", ":")),
+    }
+
+
 @tool
-def stock_data_lookup(ticker):
+@traced("tool.stock_data_lookup")
+async def stock_data_lookup(ticker, period="1mo", detail=None):
     """Finding stock price history for specific stocks.
     Args:
-        ticker (str): The ticker of stock.        
+        ticker (str): The ticker of stock.
+        period (str): The history period, e.g. '5d', '1mo', '3mo'. Defaults to '1mo'.
+        detail (str): Level of detail: 'summary' (stats only), 'compact' (stats plus a downsampled close/volume series, days counted from start) or 'full' (all daily OHLCV rows). Prefer the default.
     Returns:
-        List with search results.
+        JSON with price history for the stock.
     """
-    logger.info(f"executing stock data lookup with {ticker=}")
-    stock = yf.Ticker(ticker)
-    hist = stock.history(period="1mo")
-    hist = hist.reset_index().to_json(orient="split", index=False, date_format="iso")
+    detail = detail or STOCK_DATA_DETAIL
+    if detail not in STOCK_DATA_DETAIL_LEVELS:
+        detail = "compact"
+    logger.info(f"executing stock data lookup with {ticker=}, {period=}, {detail=}")
+    key = (ticker.strip().upper(), period)
+    payloads = await price_history_cache.get_or_await(
+        key, lambda: run_limited("yfinance", _fetch_price_history, *key))
+    hist = payloads[detail]
+    if detail != "full":
+        logger.info(f"stock_data_lookup {detail} payload for {key}: {reduction_report(payloads['full'], hist)}")
     logger.debug(f"Price history for {ticker=}: {hist=}")
-    return hist
\ No newline at end of file
+    return hist
+
+
+@limited("yfinance")
+@traced("yfinance.download")
+@replayable("yfinance.download")
+def _fetch_batch_summary(tickers: tuple, period: str) -> str:
+    """一次批量下载多只股票的价格历史，返回列式汇总 JSON"""
+    logger.info(f"fetching batch price history from yfinance with {tickers=}, {period=}")
+    data = yf.download(
+        list(tickers),
+        period=period,
+        group_by="column",
+        progress=False,
+        threads=min(len(tickers), STOCK_DATA_BATCH_THREADS),
+    )
+    no_data = json.dumps({"period": period, "ticker": list(tickers), "error": "No price data found"})
+    # 所有代码都无效时 yfinance 返回空表，或者只有全为 NaN 的行
+    if data.empty or "Close" not in data:
+        return no_data
+    close = data["Close"]
+    if isinstance(close, pd.Series):
+        close = close.to_frame(name=tickers[0])
+    close = close.reindex(columns=list(tickers))
+    if close.dropna(how="all").empty:
+        return no_data
+    summary = _summarize_closes(close)
+    # NaN 无法序列化为合法 JSON，统一转为 null
+    summary = summary.astype(object).where(summary.notna(), None)
+    payload = {
+        "period": period,
+        "as_of": close.index[-1].strftime("%Y-%m-%d") if len(close.index) else None,
+        "ticker": list(summary.index),
+        **summary.to_dict(orient="list"),
+    }
+    return json.dumps(payload, separators=(",", ":"))
+
+
+@tool
+@traced("tool.stock_data_batch_lookup")
+async def stock_data_batch_lookup(tickers: list, period: str = "1mo") -> str:
+    """Finding price summaries for several stocks at once, e.g. when comparing stocks.
+    Args:
+        tickers (list): The tickers of stocks, e.g. ["AAPL", "MSFT", "NVDA"].
+        period (str): The history period, e.g. '5d', '1mo', '3mo'. Defaults to '1mo'.
+    Returns:
+        Columnar JSON with per-ticker last close, change_pct, annualized volatility_pct, min, max, ma5 and ma20.
+    """
+    logger.info(f"executing batch stock data lookup with {tickers=}, {period=}")
+    normalized = tuple(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    if not normalized:
+        return "No tickers provided."
+    if len(normalized) > STOCK_DATA_BATCH_MAX_TICKERS:
+        return f"Too many tickers, at most {STOCK_DATA_BATCH_MAX_TICKERS} per call."
+    key = ("batch", normalized, period)
+    summary = await price_history_cache.get_or_await(
+        key, lambda: run_limited("yfinance", _fetch_batch_summary, normalized, period))
+    logger.debug(f"Batch price summary for {normalized=}: {summary=}")
+    return summary
@@ -1,14 +1,76 @@
 """网络搜索工具 - 使用 Tavily AI 搜索引擎进行网络信息检索"""
+import http.client
 import json
-import urllib.request
-import urllib.error
+import os
 from strands import tool
+from tools.search_results import postprocess_search_response
+from utils.cache import TTLCache
+from utils.http_client import HttpError, HttpSession
+from utils.limiter import UpstreamOverloaded, limited, run_limited
 from utils.logger import get_logger
+from utils.replay import replayable
+from utils.tracing import traced
 
 logger = get_logger(__name__)
 
+# Tavily 接口配置，TAVILY_API_URL 可指向本地桩服务用于测试
+TAVILY_API_URL = os.environ.get("TAVILY_API_URL", "https://api.tavily.com")
+TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY", "")
+
+# 连接池、超时和重试配置
+WEB_SEARCH_POOL_SIZE = int(os.environ.get("WEB_SEARCH_POOL_SIZE", "10"))
+WEB_SEARCH_CONNECT_TIMEOUT = float(os.environ.get("WEB_SEARCH_CONNECT_TIMEOUT", "3"))
+WEB_SEARCH_READ_TIMEOUT = float(os.environ.get("WEB_SEARCH_READ_TIMEOUT", "20"))
+WEB_SEARCH_RETRIES = int(os.environ.get("WEB_SEARCH_RETRIES", "2"))
+
+# 搜索结果缓存配置
+WEB_SEARCH_CACHE_TTL = float(os.environ.get("WEB_SEARCH_CACHE_TTL", "300"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("WEB_SEARCH_CACHE_MAX_ENTRIES", "512"))
+
+tavily_session = HttpSession(
+    TAVILY_API_URL,
+    pool_size=WEB_SEARCH_POOL_SIZE,
+    connect_timeout=WEB_SEARCH_CONNECT_TIMEOUT,
+    read_timeout=WEB_SEARCH_READ_TIMEOUT,
+    max_retries=WEB_SEARCH_RETRIES,
+)
+
+search_result_cache = TTLCache(
+    "web_search", ttl=WEB_SEARCH_CACHE_TTL, max_entries=WEB_SEARCH_CACHE_MAX_ENTRIES)
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询文本：去除首尾空白、合并连续空白并转为小写"""
+    return " ".join(query.split()).lower()
+
+
+@limited("tavily")
+@traced("tavily.search")
+@replayable("tavily.search")
+def _tavily_search(query: str, topic: str, days: int, target_website: str) -> str:
+    """调用 Tavily 搜索接口，返回去重、排序和截断后的精简结果"""
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    payload = {
+        "api_key": TAVILY_API_KEY,
+        "query": query,
+        "search_depth": "advanced",
+        "include_images": False,
+        "include_answer": False,
+        "include_raw_content": False,
+        "max_results": 4,
+        "topic": topic,
+        "days": days,
+        "include_domains": [target_website] if target_website else [],
+        "exclude_domains": [],
+    }
+    data = json.dumps(payload).encode("utf-8")
+    response = tavily_session.request("POST", "/search", body=data, headers=headers)
+    return postprocess_search_response(response.body.decode("utf-8"))
+
+
 @tool
-def web_search(
+@traced("tool.web_search")
+async def web_search(
     search_query: str, target_website: str = "", topic: str = None, days: int = None
 ) -> str:
     """Searches the web for information.
@@ -18,42 +80,30 @@ def web_search(
         topic (str): The topic being searched. 'news' or 'general'. Helps narrow the search when news is the focus.
         days (str): The number of days of history to search. Helps when looking for recent events or news..
     Returns:
-        List with search results.
+        JSON list of deduplicated search results with title, url, date and a short snippet, most relevant and recent first.
     """
-    
-    logger.info(f"executing Tavily AI search with {search_query=}")
 
-    base_url = "https://api.tavily.com/search"
-    headers = {"Content-Type": "application/json", "Accept": "application/json"}
-    payload = {
-        "api_key": "",
-        "query": search_query,
-        "search_depth": "advanced",
-        "include_images": False,
-        "include_answer": False,
-        "include_raw_content": False,
-        "max_results": 4,
-        "topic": "general" if topic is None else topic,
-        "days": 30 if days is None else days,
-        "include_domains": [target_website] if target_website else [],
-        "exclude_domains": [],
-    }
+    logger.info(f"executing Tavily AI search with {search_query=}")
 
-    data = json.dumps(payload).encode("utf-8")
-    request = urllib.request.Request(
-        base_url, data=data, headers=headers
-    )  # nosec: B310 fixed url we want to open
+    topic = "general" if topic is None else topic
+    days = 30 if days is None else days
+    target_website = target_website.strip().lower()
+    key = (normalize_query(search_query), topic, days, target_website)
 
     try:
-        response = urllib.request.urlopen(
-            request
-        )  # nosec: B310 fixed url we want to open
-        response_data: str = response.read().decode("utf-8")
+        response_data = await search_result_cache.get_or_await(
+            key, lambda: run_limited("tavily", _tavily_search, search_query, topic, days, target_website))
         logger.debug(f"response from Tavily AI search {response_data=}")
         return response_data
-    except urllib.error.HTTPError as e:
+    except HttpError as e:
+        logger.error(
+            f"failed to retrieve search results from Tavily AI Search, error: {e.status}"
+        )
+    except (OSError, http.client.HTTPException) as e:
         logger.error(
-            f"failed to retrieve search results from Tavily AI Search, error: {e.code}"
+            f"failed to connect to Tavily AI Search, error: {e!r}"
         )
+    except UpstreamOverloaded as e:
+        logger.warning(f"skipping Tavily AI Search: {e}")
 
-    return ""
\ No newline at end of file
+    return ""
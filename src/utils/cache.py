@@ -0,0 +1,187 @@
+"""缓存工具模块 - 提供进程内共享的 TTL + LRU 缓存，支持内存上限和并发请求合并"""
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Union
+from utils.executor import run_blocking
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 过期时间可以是秒数，也可以是在写入时才求值的函数（例如条目在某个时间窗口结束时过期，加载耗时不应计入）
+TTL = Optional[Union[float, Callable[[], float]]]
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存值占用的字节数"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """线程安全的 TTL 缓存，按最近使用顺序淘汰，并限制条目数和总字节数。
+
+    get_or_load 会合并同一个 key 的并发未命中请求，只有第一个请求真正调用 loader，
+    其余请求等待并共享其结果。ttl 参数传入函数时，在值写入缓存的那一刻才计算过期时间。
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 1024,
+                 max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = estimate_size):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        """在持锁状态下查找未过期的条目"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: TTL = None):
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            logger.debug(f"Cache [{self.name}] skip oversized value for {key=} ({size} bytes)")
+            return
+        if callable(ttl):
+            ttl = ttl()
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _claim(self, key: Hashable):
+        """返回 (命中的条目, 加载中的 Future, 是否由本请求负责加载)"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry, None, False
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+            return None, future, owner
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: TTL = None):
+        """命中则直接返回；未命中时由第一个请求调用 loader，并发的相同请求共享其结果"""
+        entry, future, owner = self._claim(key)
+        if entry is not None:
+            return entry[0]
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Any], ttl: TTL = None):
+        """get_or_load 的异步版本：未命中时在阻塞线程池中加载；等待同一 key 的并发请求在事件循环上等待，
+        不占用线程池的线程"""
+        return await self.get_or_await(key, lambda: run_blocking(loader), ttl)
+
+    async def get_or_await(self, key: Hashable, loader: Callable[[], Awaitable], ttl: TTL = None):
+        """loader 返回协程时使用：在事件循环上等待加载，并发的相同请求共享同一次加载。
+
+        加载在独立任务中进行，发起请求的调用方被取消时加载仍会完成，等待同一结果的其他请求不受影响。
+        """
+        entry, future, owner = self._claim(key)
+        if entry is not None:
+            return entry[0]
+        if not owner:
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        async def load():
+            try:
+                value = await loader()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                self.set(key, value, ttl)
+                future.set_result(value)
+                return value
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return await asyncio.shield(asyncio.ensure_future(load()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+            }
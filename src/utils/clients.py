@@ -0,0 +1,92 @@
+"""模型与客户端注册表 - 首次使用时才创建 Bedrock 模型和 boto3 客户端，并在整个进程内共享
+
+所有 boto3 客户端使用同一个 Session 和同一份 botocore Config（连接池大小、超时、重试模式），
+相同配置的 BedrockModel 只创建一次，多个 Agent 因此共用同一个 bedrock-runtime 连接池。
+导入本模块不会创建任何客户端，也不会访问网络。
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable
+import boto3
+from botocore.config import Config
+from strands.models import BedrockModel
+from utils.fake_model import FakeModel
+from utils.limiter import limit_model
+from utils.logger import get_logger
+from utils.replay import wrap_model
+
+logger = get_logger(__name__)
+
+REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
+# 每个 boto3 客户端的最大连接数、建连和读取超时（秒）、重试模式（legacy / standard / adaptive）和最大尝试次数
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "50"))
+AWS_CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "5"))
+AWS_READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "120"))
+AWS_RETRY_MODE = os.environ.get("AWS_RETRY_MODE", "adaptive")
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "3"))
+# 模型后端：bedrock 或 fake（本地模拟模型，用于离线测试和压测）
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "bedrock").strip().lower()
+
+_registry: Dict[Hashable, Any] = {}
+# 可重入：工厂函数内部可能再次获取其他共享对象（如模型依赖 Session）
+_lock = threading.RLock()
+
+
+def get_shared(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """返回 key 对应的共享对象，首次使用时调用 factory 创建"""
+    try:
+        return _registry[key]
+    except KeyError:
+        pass
+    with _lock:
+        if key not in _registry:
+            _registry[key] = factory()
+            logger.debug(f"Created shared client {key!r}")
+        return _registry[key]
+
+
+def botocore_config():
+    """统一的 botocore 客户端配置"""
+    def create():
+        return Config(
+            max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+            connect_timeout=AWS_CONNECT_TIMEOUT,
+            read_timeout=AWS_READ_TIMEOUT,
+            retries={"mode": AWS_RETRY_MODE, "max_attempts": AWS_MAX_ATTEMPTS},
+        )
+    return get_shared("botocore_config", create)
+
+
+def get_session(region_name: str = REGION):
+    """共享的 boto3 Session；boto3 的默认 Session 并发创建客户端不安全，这里统一加锁创建"""
+    return get_shared(("session", region_name), lambda: boto3.Session(region_name=region_name))
+
+
+def get_client(service_name: str, region_name: str = REGION):
+    """共享的 boto3 客户端（客户端本身是线程安全的）"""
+    return get_shared(
+        ("client", service_name, region_name),
+        lambda: get_session(region_name).client(service_name, config=botocore_config()))
+
+
+def get_model(model_id: str, temperature: float = 0.3, streaming: bool = True,
+              region_name: str = REGION):
+    """共享的 BedrockModel（MODEL_BACKEND=fake 时为本地模拟模型）；相同参数的模型只创建一次。
+    模型调用受 bedrock 上游限流器约束；REPLAY_MODE 开启时先经过录制/回放层，回放命中不占用许可"""
+    def create():
+        if MODEL_BACKEND == "fake":
+            return wrap_model(limit_model(FakeModel(model_id=model_id, temperature=temperature)))
+        return wrap_model(limit_model(BedrockModel(
+            model_id=model_id,
+            boto_session=get_session(region_name),
+            boto_client_config=botocore_config(),
+            temperature=temperature,
+            streaming=streaming,
+        )))
+    return get_shared(("model", model_id, temperature, streaming, region_name), create)
+
+
+def reset():
+    """清空注册表（测试或切换配置时使用）"""
+    with _lock:
+        _registry.clear()
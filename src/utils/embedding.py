@@ -0,0 +1,69 @@
+"""本地文本向量 - 基于字符 n-gram 哈希的稀疏向量，无需模型即可计算文本相似度"""
+import math
+import re
+import unicodedata
+import zlib
+from typing import Dict, FrozenSet, Iterable
+
+_PUNCTUATION = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全角转半角、转小写、去除标点和空白"""
+    return _PUNCTUATION.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def filler_stripper(phrases: Iterable[str]):
+    """构造规范化函数：先去掉疑问句式等不影响语义的填充词，再做 normalize_text。
+
+    句式模板（如“……政策是什么”）在短问题中占比很高，不去掉会让“年假政策是什么”和
+    “病假政策是什么”高度相似；英文填充词按单词边界匹配。
+    """
+    parts = [(r"\b%s\b" if p.isascii() else "%s") % re.escape(p.lower())
+             for p in sorted(phrases, key=len, reverse=True)]
+    pattern = re.compile("|".join(parts))
+
+    def normalize(text: str) -> str:
+        lowered = unicodedata.normalize("NFKC", text).lower()
+        return normalize_text(pattern.sub(" ", lowered)) or normalize_text(lowered)
+    return normalize
+
+
+def key_term_extractor(terms: Iterable[str]):
+    """构造关键词提取函数：返回文本中出现的关键词集合，按最长匹配，“陪产假”不会同时匹配出“产假”。
+
+    字符 n-gram 向量无法区分只差一两个字的问题（“产假”与“陪产假”、“入职”与“离职”），
+    语义匹配时要求两边的关键词集合一致；文本中的数字也作为关键词。
+    """
+    parts = [(r"\b%s\b" if t.isascii() else "%s") % re.escape(t.lower())
+             for t in sorted(terms, key=len, reverse=True)]
+    pattern = re.compile("|".join(parts + [r"\d+"]))
+
+    def extract(text: str) -> FrozenSet[str]:
+        return frozenset(pattern.findall(unicodedata.normalize("NFKC", text).lower()))
+    return extract
+
+
+def embed(text: str, ngram_sizes=(1, 2, 3), dim: int = 1 << 20) -> Dict[int, float]:
+    """将规范化后的文本编码为 L2 归一化的稀疏向量 {特征哈希: 权重}"""
+    normalized = normalize_text(text)
+    vector: Dict[int, float] = {}
+    for n in ngram_sizes:
+        if len(normalized) < n:
+            grams = [normalized] if normalized else []
+        else:
+            grams = [normalized[i:i + n] for i in range(len(normalized) - n + 1)]
+        for gram in grams:
+            key = zlib.crc32(gram.encode("utf-8")) % dim
+            vector[key] = vector.get(key, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    if norm:
+        vector = {k: v / norm for k, v in vector.items()}
+    return vector
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """两个归一化稀疏向量的余弦相似度"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
@@ -0,0 +1,42 @@
+"""阻塞调用执行器 - 将 boto3、yfinance 等同步 SDK 调用放到有界线程池中执行，避免阻塞事件循环"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# 阻塞调用线程池的最大线程数，即同时进行中的阻塞 SDK 调用上限
+BLOCKING_POOL_SIZE = int(os.environ.get("BLOCKING_POOL_SIZE", "32"))
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """获取（首次使用时创建）共享的阻塞调用线程池"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+    return _executor
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """在共享线程池中执行阻塞函数并等待结果，与 asyncio.to_thread 一样传递当前上下文变量"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(ctx.run, func, *args, **kwargs))
+
+
+def shutdown_executor(wait: bool = True):
+    """关闭共享线程池"""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
@@ -0,0 +1,79 @@
+"""本地模拟模型 - 实现 Strands 的 Model 接口，按配置的延迟流式返回固定格式的文本，不访问 Bedrock
+
+用于在没有 AWS 凭证的环境下测试模型分级策略、压测和基准测试。
+"""
+import asyncio
+import os
+from typing import Any, AsyncIterable, Callable, Dict, List, Optional
+from strands.models import Model
+from utils.tokens import estimate_tokens
+
+# 首 token 延迟（毫秒）和之后的输出速度（token/秒）
+FAKE_MODEL_LATENCY_MS = float(os.environ.get("FAKE_MODEL_LATENCY_MS", "200"))
+FAKE_MODEL_TOKENS_PER_SECOND = float(os.environ.get("FAKE_MODEL_TOKENS_PER_SECOND", "200"))
+# 回答的最少字符数，不足时用填充文本补齐，用于模拟不同长度的回答
+FAKE_MODEL_OUTPUT_CHARS = int(os.environ.get("FAKE_MODEL_OUTPUT_CHARS", "0"))
+# 每个流式片段包含的字符数
+_CHUNK_CHARS = 16
+_FILLER = " 模拟回答内容 lorem ipsum."
+
+
+def default_responder(model_id: str, messages: List[Dict], system_prompt: Optional[str]) -> str:
+    """默认回答：复述最后一条用户消息"""
+    last_text = ""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            last_text = next((c["text"] for c in message.get("content", []) if "text" in c), "")
+            break
+    return f"[{model_id}] {last_text}"
+
+
+class FakeModel(Model):
+    """模拟模型：不调用工具，只输出 responder 生成的文本（结构化输出时按 JSON 解析该文本）。
+
+    latency_ms 为首 token 前的等待时间，之后按 tokens_per_second 分片输出，回答不足 output_chars 时补齐；
+    responder(model_id, messages, system_prompt) -> str 可替换为自定义的回答逻辑。
+    """
+
+    def __init__(self, model_id: str = "fake", latency_ms: float = FAKE_MODEL_LATENCY_MS,
+                 tokens_per_second: float = FAKE_MODEL_TOKENS_PER_SECOND,
+                 output_chars: int = FAKE_MODEL_OUTPUT_CHARS,
+                 responder: Callable[[str, List[Dict], Optional[str]], str] = default_responder,
+                 **model_config):
+        self.config = dict(model_config, model_id=model_id, latency_ms=latency_ms,
+                           tokens_per_second=tokens_per_second, output_chars=output_chars)
+        self.responder = responder
+
+    def update_config(self, **model_config):
+        self.config.update(model_config)
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.config
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        """把 responder 的回答当作 JSON 解析为 output_model；需要结构化输出的测试应替换 responder 使其返回 JSON"""
+        text = self.responder(self.config["model_id"], prompt, system_prompt)
+        await asyncio.sleep(self.config["latency_ms"] / 1000)
+        yield {"output": output_model.model_validate_json(text)}
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs) -> AsyncIterable[Dict]:
+        text = self.responder(self.config["model_id"], messages, system_prompt)
+        missing = self.config["output_chars"] - len(text)
+        if missing > 0:
+            text += (_FILLER * (missing // len(_FILLER) + 1))[:missing]
+        await asyncio.sleep(self.config["latency_ms"] / 1000)
+        yield {"messageStart": {"role": "assistant"}}
+        yield {"contentBlockStart": {"start": {}}}
+        for i in range(0, len(text), _CHUNK_CHARS):
+            chunk = text[i:i + _CHUNK_CHARS]
+            await asyncio.sleep(estimate_tokens(chunk) / self.config["tokens_per_second"])
+            yield {"contentBlockDelta": {"delta": {"text": chunk}}}
+        yield {"contentBlockStop": {}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        input_tokens = sum(estimate_tokens(c.get("text", "")) for m in messages for c in m.get("content", []))
+        output_tokens = estimate_tokens(text)
+        yield {"metadata": {
+            "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens,
+                      "totalTokens": input_tokens + output_tokens},
+            "metrics": {"latencyMs": int(self.config["latency_ms"])},
+        }}
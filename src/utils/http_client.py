@@ -0,0 +1,124 @@
+"""HTTP 客户端模块 - 基于标准库的长连接连接池，支持分离的连接/读取超时和带抖动的重试"""
+import http.client
+import queue
+import random
+import ssl
+import time
+from collections import namedtuple
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+HttpResponse = namedtuple("HttpResponse", ["status", "headers", "body"])
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpError(Exception):
+    """重试耗尽后仍返回非 2xx 状态码"""
+
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.body = body
+
+
+class HttpSession:
+    """面向单个服务端点的 keep-alive 连接池。
+
+    空闲连接在请求之间复用，避免每次请求重新建立 TCP/TLS 连接；
+    连接失败和可重试的状态码会按指数退避加随机抖动重试。
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 10, connect_timeout: float = 3.0,
+                 read_timeout: float = 20.0, max_retries: int = 2, backoff: float = 0.3,
+                 max_backoff: float = 5.0):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.connect_timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+
+    def _get_connection(self) -> http.client.HTTPConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _put_connection(self, conn: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _sleep_before_retry(self, attempt: int, retry_after: Optional[str] = None):
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = min(self.max_backoff, float(retry_after))
+        # 全抖动：在 [0, delay] 区间内随机等待，避免并发请求同时重试
+        time.sleep(random.uniform(0, delay))
+
+    def _send(self, method: str, path: str, body: Optional[bytes], headers: Dict) -> HttpResponse:
+        conn = self._get_connection()
+        try:
+            if conn.sock is None:
+                conn.connect()
+            # 建连使用 connect_timeout，之后的读写使用 read_timeout
+            conn.sock.settimeout(self.read_timeout)
+            conn.request(method, self.base_path + path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._put_connection(conn)
+        return HttpResponse(resp.status, dict(resp.getheaders()), data)
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict] = None) -> HttpResponse:
+        """发送请求，连接错误和可重试状态码最多重试 max_retries 次，最终非 2xx 时抛出 HttpError"""
+        headers = dict(headers or {})
+        headers.setdefault("Connection", "keep-alive")
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                resp = self._send(method, path, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                if last:
+                    raise
+                logger.warning(f"HTTP {method} {self.host}{path} failed ({e!r}), retry #{attempt + 1}")
+                self._sleep_before_retry(attempt)
+                continue
+            if resp.status in RETRY_STATUSES and not last:
+                logger.warning(f"HTTP {method} {self.host}{path} returned {resp.status}, retry #{attempt + 1}")
+                self._sleep_before_retry(attempt, resp.headers.get("Retry-After"))
+                continue
+            if resp.status >= 400:
+                raise HttpError(resp.status, resp.body)
+            return resp
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,338 @@
+"""上游准入控制 - 为 Bedrock、知识库、Tavily 和 yfinance 分别限制并发数和请求速率，超出排队上限时快速拒绝
+
+每个上游一个 UpstreamLimiter，由调用它的所有工具和 Agent 共享：
+- 令牌桶限制请求速率，并发上限限制同时进行中的调用；
+- 被限流（ThrottlingException、HTTP 429 等）时按 AIMD 调整：速率和并发上限减半并按指数退避暂停放行，
+  之后每次成功调用逐步恢复，避免所有调用同时重试把上游压垮；
+- 等待许可的调用数超过队列上限，或排队超过 LIMITER_QUEUE_TIMEOUT 秒时抛出 UpstreamOverloaded（负载削减）。
+
+异步代码通过 run_limited 调用被 limited 装饰的阻塞函数：需要排队时在事件循环上等待许可，
+不占用 run_blocking 线程池的线程（排队的调用占满线程池会拖住所有其他阻塞调用）。
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterable, Dict, Iterator, List, Optional
+from strands.models import Model
+from utils import metrics
+from utils.executor import run_blocking
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+LIMITER_ENABLED = os.environ.get("LIMITER_ENABLED", "true").strip().lower() == "true"
+# 排队等待许可的最长时间（秒）
+LIMITER_QUEUE_TIMEOUT = float(os.environ.get("LIMITER_QUEUE_TIMEOUT", "10"))
+# 被限流后的初始和最大退避时间（秒）
+LIMITER_BACKOFF = float(os.environ.get("LIMITER_BACKOFF", "0.5"))
+LIMITER_MAX_BACKOFF = float(os.environ.get("LIMITER_MAX_BACKOFF", "10"))
+
+# 各上游的并发上限、每秒请求数（0 为不限速）和排队上限
+UPSTREAM_LIMITS = {
+    "bedrock": {
+        "max_concurrency": int(os.environ.get("LIMIT_BEDROCK_CONCURRENCY", "16")),
+        "rate": float(os.environ.get("LIMIT_BEDROCK_RATE", "10")),
+        "max_queue": int(os.environ.get("LIMIT_BEDROCK_QUEUE", "64")),
+    },
+    "knowledge_base": {
+        "max_concurrency": int(os.environ.get("LIMIT_KB_CONCURRENCY", "8")),
+        "rate": float(os.environ.get("LIMIT_KB_RATE", "5")),
+        "max_queue": int(os.environ.get("LIMIT_KB_QUEUE", "32")),
+    },
+    "tavily": {
+        "max_concurrency": int(os.environ.get("LIMIT_TAVILY_CONCURRENCY", "8")),
+        "rate": float(os.environ.get("LIMIT_TAVILY_RATE", "5")),
+        "max_queue": int(os.environ.get("LIMIT_TAVILY_QUEUE", "32")),
+    },
+    "yfinance": {
+        "max_concurrency": int(os.environ.get("LIMIT_YFINANCE_CONCURRENCY", "4")),
+        "rate": float(os.environ.get("LIMIT_YFINANCE_RATE", "2")),
+        "max_queue": int(os.environ.get("LIMIT_YFINANCE_QUEUE", "32")),
+    },
+}
+
+# 表示被上游限流的错误码和异常类名片段
+THROTTLE_CODES = ("ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException",
+                  "ProvisionedThroughputExceededException", "RequestLimitExceeded")
+THROTTLE_NAME_MARKERS = ("Throttl", "RateLimit", "TooManyRequests")
+_POLL_INTERVAL = 0.02
+
+
+class UpstreamOverloaded(Exception):
+    """上游排队已满或排队超时，请求被拒绝"""
+
+    def __init__(self, upstream: str, reason: str):
+        super().__init__(f"upstream {upstream} is overloaded ({reason}), please retry later")
+        self.upstream = upstream
+        self.reason = reason
+
+
+def is_throttle(error: BaseException) -> bool:
+    """判断异常是否表示被上游限流"""
+    code = getattr(error, "response", None)
+    if isinstance(code, dict) and code.get("Error", {}).get("Code") in THROTTLE_CODES:
+        return True
+    if getattr(error, "status", None) == 429:
+        return True
+    return any(marker in type(error).__name__ for marker in THROTTLE_NAME_MARKERS)
+
+
+class UpstreamLimiter:
+    """单个上游的令牌桶限速、自适应并发上限和有界等待队列；同步线程和事件循环都可使用"""
+
+    def __init__(self, name: str, max_concurrency: int, rate: float = 0.0, max_queue: int = 64,
+                 queue_timeout: float = LIMITER_QUEUE_TIMEOUT, burst: Optional[float] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.base_rate = rate
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.burst = burst or max(1.0, float(max_concurrency))
+        self.concurrency = max_concurrency
+        self.rate = rate
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._backoff_until = 0.0
+        self._throttle_streak = 0
+        self._successes = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def _try_enter(self, now: float) -> float:
+        """持锁调用：获得许可时返回 0，否则返回建议的等待秒数"""
+        if now < self._backoff_until:
+            return self._backoff_until - now
+        if self.in_flight >= self.concurrency:
+            return _POLL_INTERVAL
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        self.in_flight += 1
+        return 0.0
+
+    def _waits(self, timeout: Optional[float]) -> Iterator[float]:
+        """依次产出需要等待的秒数，获得许可后结束；队列已满或排队超时时抛出 UpstreamOverloaded"""
+        start = time.monotonic()
+        with self._lock:
+            wait = self._try_enter(start)
+            if wait == 0:
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                metrics.increment(f"limiter.{self.name}.rejected.queue_full")
+                raise UpstreamOverloaded(self.name, "queue full")
+            self.waiting += 1
+            metrics.observe(f"limiter.{self.name}.queue_depth", self.waiting)
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self.rejected += 1
+                    metrics.increment(f"limiter.{self.name}.rejected.timeout")
+                    raise UpstreamOverloaded(self.name, "queue timeout")
+                yield min(wait, remaining, 0.25)
+                with self._lock:
+                    wait = self._try_enter(time.monotonic())
+                if wait == 0:
+                    break
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        metrics.observe(f"limiter.{self.name}.wait_ms", (time.monotonic() - start) * 1000)
+
+    def try_acquire(self) -> bool:
+        """不等待：能立即获得许可时返回 True"""
+        with self._lock:
+            return self._try_enter(time.monotonic()) == 0
+
+    def acquire(self, timeout: Optional[float] = None):
+        for delay in self._waits(timeout):
+            time.sleep(delay)
+
+    async def acquire_async(self, timeout: Optional[float] = None):
+        for delay in self._waits(timeout):
+            await asyncio.sleep(delay)
+
+    def release(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self.in_flight -= 1
+            if error is not None and is_throttle(error):
+                self._on_throttle()
+            elif error is None:
+                self._on_success()
+
+    def _on_throttle(self):
+        """持锁调用：乘性减小并发上限和速率，并按指数退避暂停放行"""
+        self.throttles += 1
+        self._throttle_streak += 1
+        self._successes = 0
+        self.concurrency = max(1, self.concurrency // 2)
+        if self.base_rate > 0:
+            self.rate = max(self.base_rate * 0.1, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+        backoff = min(LIMITER_MAX_BACKOFF, LIMITER_BACKOFF * 2 ** (self._throttle_streak - 1))
+        self._backoff_until = time.monotonic() + random.uniform(backoff / 2, backoff)
+        metrics.increment(f"limiter.{self.name}.throttled")
+        logger.warning(f"[{self.name}] throttled, concurrency -> {self.concurrency}, "
+                       f"rate -> {self.rate:.2f}/s, backing off {backoff:.1f}s")
+
+    def _on_success(self):
+        """持锁调用：加性恢复，每完成当前并发上限次数的成功调用，并发上限加一"""
+        self._throttle_streak = 0
+        if self.base_rate > 0 and self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+        if self.concurrency < self.max_concurrency:
+            self._successes += 1
+            if self._successes >= self.concurrency:
+                self._successes = 0
+                self.concurrency += 1
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        self.acquire(timeout)
+        try:
+            yield
+        except BaseException as e:
+            self.release(e)
+            raise
+        self.release()
+
+    @asynccontextmanager
+    async def slot_async(self, timeout: Optional[float] = None):
+        await self.acquire_async(timeout)
+        try:
+            yield
+        except BaseException as e:
+            self.release(e)
+            raise
+        self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "concurrency": self.concurrency,
+                "max_concurrency": self.max_concurrency,
+                "rate": round(self.rate, 3),
+                "rejected": self.rejected,
+                "throttles": self.throttles,
+            }
+
+
+limiters: Dict[str, UpstreamLimiter] = {
+    name: UpstreamLimiter(name, **config) for name, config in UPSTREAM_LIMITS.items()
+}
+
+
+# run_limited 分派的调用：上游名 -> 是否已在事件循环上获得许可；未经 run_limited 调用时为 None
+_dispatch: contextvars.ContextVar[Optional[Dict[str, bool]]] = contextvars.ContextVar(
+    "limiter_dispatch", default=None)
+
+
+class _PermitRequired(Exception):
+    """run_limited 分派的调用不能立即获得许可，回到事件循环上排队"""
+
+
+def limited(upstream: str):
+    """装饰访问上游的同步函数：调用前获取该上游的许可。
+
+    经 run_limited 调用时只尝试立即获取许可，需要排队时抛出 _PermitRequired 交给事件循环等待；
+    直接同步调用时在当前线程等待。应作为最外层装饰，traced、replayable 等放在其内侧。
+    """
+    def decorator(func):
+        if not LIMITER_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            limiter = limiters[upstream]
+            dispatch = _dispatch.get()
+            if dispatch is None:
+                limiter.acquire()
+            elif not dispatch.pop(upstream, False) and not limiter.try_acquire():
+                raise _PermitRequired(upstream)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                limiter.release(e)
+                raise
+            limiter.release()
+            return result
+        return wrapper
+    return decorator
+
+
+async def run_limited(upstream: str, func, *args, **kwargs):
+    """在阻塞线程池中执行被 limited(upstream) 装饰的函数。
+
+    能立即获得许可时直接执行；否则在事件循环上排队获得许可后再分派到线程池，排队期间不占用线程。
+    limited 应是最外层装饰（在 traced、replayable 之外）：需要排队时函数体尚未执行，
+    span 和回放查找只在真正分派的那一次发生。
+    """
+    if not LIMITER_ENABLED:
+        return await run_blocking(func, *args, **kwargs)
+    dispatch: Dict[str, bool] = {}
+    token = _dispatch.set(dispatch)
+    try:
+        try:
+            return await run_blocking(func, *args, **kwargs)
+        except _PermitRequired:
+            pass
+        limiter = limiters[upstream]
+        await limiter.acquire_async()
+        dispatch[upstream] = True
+        try:
+            return await run_blocking(func, *args, **kwargs)
+        finally:
+            # 许可没有被使用（如这次命中了回放，或调用在分派前被取消）时归还
+            if dispatch.pop(upstream, False):
+                limiter.release()
+    finally:
+        _dispatch.reset(token)
+
+
+class LimitedModel(Model):
+    """包装 Strands 模型：每次模型调用在流式输出期间占用一个 bedrock 许可"""
+
+    def __init__(self, model: Model, limiter: UpstreamLimiter):
+        self.model = model
+        self.limiter = limiter
+
+    def update_config(self, **model_config):
+        self.model.update_config(**model_config)
+
+    def get_config(self):
+        return self.model.get_config()
+
+    def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        return self.model.structured_output(output_model, prompt, system_prompt=system_prompt, **kwargs)
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs) -> AsyncIterable:
+        async with self.limiter.slot_async():
+            async for event in self.model.stream(messages, tool_specs=tool_specs,
+                                                 system_prompt=system_prompt, **kwargs):
+                yield event
+
+
+def limit_model(model: Model) -> Model:
+    """LIMITER_ENABLED 时返回受 bedrock 限流器约束的模型"""
+    return LimitedModel(model, limiters["bedrock"]) if LIMITER_ENABLED else model
+
+
+def limiter_stats() -> List[Dict]:
+    return [limiter.stats() for limiter in limiters.values()]
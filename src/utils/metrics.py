@@ -0,0 +1,91 @@
+"""指标工具模块 - 进程内的计数器和延迟直方图，提供 p50/p95/p99 快照"""
+import math
+import os
+import threading
+from collections import deque
+from typing import Dict, Iterable, List
+
+# 每个直方图保留的最近样本数
+METRICS_RESERVOIR_SIZE = int(os.environ.get("METRICS_RESERVOIR_SIZE", "2048"))
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_histograms: Dict[str, "Histogram"] = {}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法计算百分位数，values 需已排序"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+def summarize(values: Iterable[float]) -> Dict:
+    """计算样本的数量、均值、p50/p95/p99 和最大值"""
+    ordered = sorted(values)
+    count = len(ordered)
+    return {
+        "count": count,
+        "mean": round(sum(ordered) / count, 4) if count else 0.0,
+        "p50": round(percentile(ordered, 50), 4),
+        "p95": round(percentile(ordered, 95), 4),
+        "p99": round(percentile(ordered, 99), 4),
+        "max": round(ordered[-1], 4) if count else 0.0,
+    }
+
+
+class Histogram:
+    """保留最近样本的直方图，count/total 统计全部样本"""
+
+    def __init__(self, size: int = METRICS_RESERVOIR_SIZE):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict:
+        summary = summarize(self.samples)
+        summary["count"] = self.count
+        summary["total"] = round(self.total, 4)
+        return summary
+
+
+def increment(name: str, value: float = 1):
+    """累加计数器"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, value: float):
+    """记录一个样本（通常是秒或毫秒为单位的延迟）"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value)
+
+
+def get_histogram(name: str) -> Dict:
+    with _lock:
+        histogram = _histograms.get(name)
+        return histogram.snapshot() if histogram else summarize([])
+
+
+def snapshot() -> Dict:
+    """所有计数器和直方图的快照"""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {name: h.snapshot() for name, h in _histograms.items()},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,243 @@
+"""录制与回放 - 按内容寻址保存模型调用和上游调用（yfinance、Tavily、知识库等）的输入输出，重跑时直接从磁盘返回
+
+REPLAY_MODE：
+    off     不录制也不回放（默认）
+    record  总是访问真实服务，并把结果追加到日志
+    replay  只从日志返回，未录制的调用抛出 ReplayMissError
+    auto    命中时回放，未命中时访问真实服务并录制
+
+存储为 REPLAY_PATH 目录下的两个只追加文件：replay.log 中每条记录为 32 字节 SHA-256 键、4 字节长度和 zlib 压缩的 JSON，
+replay.idx 中每条为 32 字节键、8 字节偏移和 4 字节长度。启动时读取索引，索引落后于日志（如进程中途退出）时扫描日志补齐，
+末尾不完整的记录被截断。同一个键多次录制时以最后一次为准。
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Any, AsyncIterable, Dict, Optional, Tuple
+from strands.models import Model
+from utils import metrics
+from utils.logger import get_logger
+from utils.tracing import current_span
+
+logger = get_logger(__name__)
+
+REPLAY_MODE = os.environ.get("REPLAY_MODE", "off").strip().lower()
+REPLAY_PATH = os.environ.get("REPLAY_PATH", ".cache/replay")
+
+_LOG_HEADER = struct.Struct(">32sI")
+_INDEX_ENTRY = struct.Struct(">32sQI")
+
+
+class ReplayMissError(LookupError):
+    """replay 模式下请求的调用没有录制"""
+
+
+def content_key(kind: str, name: str, payload: Any) -> bytes:
+    """对调用类型、名称和规范化后的参数取 SHA-256"""
+    canonical = json.dumps([kind, name, payload], sort_keys=True, ensure_ascii=False,
+                           separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+
+class ReplayStore:
+    """只追加的内容寻址日志，带内存索引；线程安全"""
+
+    def __init__(self, path: str = REPLAY_PATH):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._log_path = os.path.join(path, "replay.log")
+        self._index_path = os.path.join(path, "replay.idx")
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.records = 0
+        self._load()
+        self._log = open(self._log_path, "a+b")
+        self._index_file = open(self._index_path, "ab")
+
+    def _load(self):
+        indexed_end = 0
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % _INDEX_ENTRY.size
+            for i in range(0, usable, _INDEX_ENTRY.size):
+                key, offset, length = _INDEX_ENTRY.unpack_from(data, i)
+                self._index[key] = (offset, length)
+                indexed_end = max(indexed_end, offset + length)
+            if usable != len(data):
+                with open(self._index_path, "r+b") as f:
+                    f.truncate(usable)
+        if not os.path.exists(self._log_path):
+            return
+        log_size = os.path.getsize(self._log_path)
+        if indexed_end > log_size:
+            # 索引指向日志之外（日志被替换或截断），以日志为准重建索引
+            self._index.clear()
+            indexed_end = 0
+            os.remove(self._index_path)
+        if indexed_end < log_size:
+            self._recover(indexed_end, log_size)
+
+    def _recover(self, start: int, log_size: int):
+        """扫描索引之后的日志记录补齐索引，截断末尾不完整的记录"""
+        recovered = []
+        with open(self._log_path, "r+b") as f:
+            f.seek(start)
+            offset = start
+            while offset + _LOG_HEADER.size <= log_size:
+                key, length = _LOG_HEADER.unpack(f.read(_LOG_HEADER.size))
+                payload_offset = offset + _LOG_HEADER.size
+                if payload_offset + length > log_size:
+                    break
+                f.seek(length, os.SEEK_CUR)
+                recovered.append((key, payload_offset, length))
+                offset = payload_offset + length
+            if offset < log_size:
+                logger.warning(f"Truncating {log_size - offset} bytes of incomplete replay records")
+                f.truncate(offset)
+        with open(self._index_path, "ab") as f:
+            for key, offset, length in recovered:
+                f.write(_INDEX_ENTRY.pack(key, offset, length))
+                self._index[key] = (offset, length)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} replay records missing from the index")
+
+    def lookup(self, key: bytes) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)"""
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                self.misses += 1
+                return False, None
+            offset, length = location
+            self._log.seek(offset)
+            payload = self._log.read(length)
+            self.hits += 1
+        return True, json.loads(zlib.decompress(payload))
+
+    def put(self, key: bytes, value: Any):
+        payload = zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":"),
+                                           default=str).encode("utf-8"))
+        with self._lock:
+            self._log.seek(0, os.SEEK_END)
+            offset = self._log.tell() + _LOG_HEADER.size
+            self._log.write(_LOG_HEADER.pack(key, len(payload)) + payload)
+            self._log.flush()
+            self._index_file.write(_INDEX_ENTRY.pack(key, offset, len(payload)))
+            self._index_file.flush()
+            self._index[key] = (offset, len(payload))
+            self.records += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+            self._index_file.close()
+
+    def stats(self) -> Dict:
+        return {"path": self.path, "entries": len(self._index), "hits": self.hits,
+                "misses": self.misses, "records": self.records}
+
+
+_store: Optional[ReplayStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ReplayStore:
+    """共享的录制存储，首次使用时打开"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReplayStore()
+    return _store
+
+
+def _replayed(kind: str, name: str, key: bytes) -> Tuple[bool, Any]:
+    """按 REPLAY_MODE 查找录制结果；replay 模式下未命中时抛出 ReplayMissError"""
+    if REPLAY_MODE == "record":
+        return False, None
+    found, value = get_store().lookup(key)
+    if found:
+        metrics.increment(f"replay.{kind}.hits")
+        span = current_span()
+        if span is not None:
+            span.set(replayed=True)
+        return True, value
+    metrics.increment(f"replay.{kind}.misses")
+    if REPLAY_MODE == "replay":
+        raise ReplayMissError(f"no recording for {kind} {name} ({key.hex()[:12]})")
+    return False, None
+
+
+def replayable(name: str):
+    """装饰访问外部服务的同步函数：按函数名和绑定后的参数录制或回放返回值（需可序列化为 JSON）"""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if REPLAY_MODE == "off":
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = content_key("call", name, bound.arguments)
+            found, value = _replayed("call", name, key)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            get_store().put(key, value)
+            return value
+        return wrapper
+    return decorator
+
+
+class ReplayModel(Model):
+    """包装任意 Strands 模型：按模型 ID、消息、工具定义、系统提示词和 tool_choice 录制或回放流式事件"""
+
+    def __init__(self, model: Model):
+        self.model = model
+
+    def update_config(self, **model_config):
+        self.model.update_config(**model_config)
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.model.get_config()
+
+    def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        return self.model.structured_output(output_model, prompt, system_prompt=system_prompt, **kwargs)
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs) -> AsyncIterable[Dict]:
+        model_id = self.get_config().get("model_id")
+        # 只按跨进程稳定的输入取键；kwargs 中的 invocation_state 含对象地址和随机的循环 ID，每次运行都不同
+        key = content_key("model", str(model_id), {
+            "messages": messages, "tool_specs": tool_specs, "system_prompt": system_prompt,
+            "tool_choice": kwargs.get("tool_choice")})
+        found, events = _replayed("model", str(model_id), key)
+        if found:
+            for event in events:
+                yield event
+            return
+        events = []
+        async for event in self.model.stream(messages, tool_specs=tool_specs, system_prompt=system_prompt,
+                                             **kwargs):
+            events.append(event)
+            yield event
+        get_store().put(key, events)
+
+
+def wrap_model(model: Model) -> Model:
+    """REPLAY_MODE 开启时返回录制/回放包装后的模型"""
+    return model if REPLAY_MODE == "off" else ReplayModel(model)
@@ -0,0 +1,161 @@
+"""语义缓存 - 按规范化文本精确匹配或向量相似度匹配复用历史答案，支持 LRU + TTL 淘汰、版本失效和磁盘持久化"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Optional
+from utils import metrics
+from utils.embedding import cosine, embed, normalize_text
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SemanticCache:
+    """语义答案缓存。
+
+    查询先经 normalize_fn 规范化，按规范化文本精确匹配，未命中时与所有条目计算相似度，最高分不低于 threshold 即视为命中。
+    设置 key_terms_fn 时，相似度匹配只考虑关键词集合与查询完全一致的条目，避免“陪产假”命中“产假”的答案。
+    version 变化（如知识库重新同步）时清空全部条目；version 为 None 时沿用磁盘文件中记录的版本，
+    由后续的 set_version 校验。path 不为空时条目持久化到 JSON 文件。
+    命中次数、命中率和节省的延迟通过 utils.metrics 以 "<name>.*" 导出。
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, threshold: float = 0.9,
+                 ttl: float = 86400, max_entries: int = 1000, version: Optional[str] = None,
+                 normalize_fn: Callable[[str], str] = normalize_text,
+                 embed_fn: Callable[[str], Dict] = embed,
+                 key_terms_fn: Optional[Callable[[str], FrozenSet[str]]] = None):
+        self.name = name
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = version
+        self.normalize_fn = normalize_fn
+        self.embed_fn = embed_fn
+        self.key_terms_fn = key_terms_fn
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Semantic cache [{self.name}] failed to load {self.path}: {e}")
+            return
+        if self.version is None:
+            self.version = data.get("version")
+        elif data.get("version") != self.version:
+            logger.info(f"Semantic cache [{self.name}] version changed, discarding persisted entries")
+            return
+        now = time.time()
+        for entry in data.get("entries", []):
+            if entry["expires_at"] > now:
+                entry["embedding"] = {int(k): v for k, v in entry["embedding"].items()}
+                entry["key_terms"] = self._key_terms(entry["query"])
+                self._entries[entry["key"]] = entry
+        logger.info(f"Semantic cache [{self.name}] loaded {len(self._entries)} entries")
+
+    def _save(self):
+        """持锁调用：原子地写入磁盘文件"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        # 关键词集合在加载时由查询重新计算，不写入文件
+        entries = [{k: v for k, v in e.items() if k != "key_terms"} for e in self._entries.values()]
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _key_terms(self, query: str) -> Optional[FrozenSet[str]]:
+        return self.key_terms_fn(query) if self.key_terms_fn is not None else None
+
+    def set_version(self, version: str):
+        """数据源版本变化时使全部条目失效"""
+        with self._lock:
+            if version == self.version:
+                return
+            logger.info(f"Semantic cache [{self.name}] invalidated: version {self.version!r} -> {version!r}")
+            self.version = version
+            self._entries.clear()
+            self._save()
+
+    def lookup(self, query: str) -> Optional[str]:
+        key = self.normalize_fn(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            semantic = False
+            if entry is None or entry["expires_at"] <= now:
+                entry = None
+                vector = self.embed_fn(key)
+                terms = self._key_terms(query)
+                best_score = 0.0
+                for candidate in self._entries.values():
+                    if candidate["expires_at"] <= now or candidate["key_terms"] != terms:
+                        continue
+                    score = cosine(vector, candidate["embedding"])
+                    if score > best_score:
+                        best_score, entry = score, candidate
+                if entry is not None and best_score < self.threshold:
+                    entry = None
+                semantic = entry is not None
+            if entry is None:
+                self.misses += 1
+                metrics.increment(f"{self.name}.misses")
+                return None
+            self._entries.move_to_end(entry["key"])
+            self.hits += 1
+            self.semantic_hits += semantic
+            self.latency_saved += entry["latency"]
+        metrics.increment(f"{self.name}.hits")
+        metrics.increment(f"{self.name}.latency_saved_seconds", entry["latency"])
+        logger.info(f"Semantic cache [{self.name}] hit for {query=} (matched {entry['query']!r})")
+        return entry["answer"]
+
+    def store(self, query: str, answer: str, latency: float = 0.0):
+        """缓存答案；latency 为生成该答案的耗时，用于统计命中时节省的延迟"""
+        key = self.normalize_fn(query)
+        entry = {
+            "key": key,
+            "query": query,
+            "answer": answer,
+            "embedding": self.embed_fn(key),
+            "key_terms": self._key_terms(query),
+            "latency": latency,
+            "expires_at": time.time() + self.ttl,
+        }
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"Semantic cache [{self.name}] failed to persist: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "version": self.version,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+            }
@@ -0,0 +1,97 @@
+"""流式输出模块 - 将子 Agent 和主协调器生成的 token 实时转发给调用方，并记录首 token 延迟"""
+import asyncio
+import contextvars
+import time
+from typing import AsyncIterator, Dict, Optional
+from utils import metrics
+from utils.logger import get_logger
+from utils.tracing import record_usage, span
+
+logger = get_logger(__name__)
+
+# 当前请求的流式输出队列；子 Agent 工具在调用方开启流式输出时把 token 写入该队列
+_stream_queue: contextvars.ContextVar[Optional[asyncio.Queue]] = contextvars.ContextVar(
+    "stream_queue", default=None)
+
+_DONE = object()
+
+
+def streaming_enabled() -> bool:
+    return _stream_queue.get() is not None
+
+
+def disable_streaming():
+    """在当前上下文（如并发执行的子任务）中停止向调用方转发 token"""
+    _stream_queue.set(None)
+
+
+def emit(source: str, text: str):
+    """向当前请求的调用方转发一段文本"""
+    queue = _stream_queue.get()
+    if queue is not None and text:
+        queue.put_nowait({"source": source, "text": text})
+
+
+async def invoke_agent(agent, prompt: str, source: str, stream: bool = True):
+    """调用 Agent；调用方开启了流式输出且 stream 为 True 时逐个转发 token，否则直接等待完整结果"""
+    with span(f"llm.{source}") as item:
+        item.record_text("prompt", prompt)
+        if not (stream and streaming_enabled()):
+            result = await agent.invoke_async(prompt)
+        else:
+            result = None
+            async for event in agent.stream_async(prompt):
+                if "data" in event:
+                    emit(source, event["data"])
+                elif "result" in event:
+                    result = event["result"]
+        record_usage(result, item)
+        return result
+
+
+def stream_agent(agent, prompt: str, source: str = "master") -> AsyncIterator[Dict]:
+    """以异步迭代器形式返回 Agent 及其调用的子 Agent 的 token"""
+    return stream_events(agent.stream_async(prompt), source)
+
+
+async def stream_events(events: AsyncIterator[Dict], source: str = "master") -> AsyncIterator[Dict]:
+    """消费 Agent 事件流，同时汇合子 Agent 转发的 token，以 {"source": ..., "text": ...} 的形式产出
+
+    结束时记录本次请求的首 token 延迟（metrics 中的 stream.ttft_ms）和总耗时。
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    start = time.perf_counter()
+
+    async def produce():
+        try:
+            async for event in events:
+                if "data" in event:
+                    emit(source, event["data"])
+        finally:
+            queue.put_nowait(_DONE)
+
+    # create_task 会复制当前上下文，子 Agent 工具因此能拿到同一个队列
+    token = _stream_queue.set(queue)
+    try:
+        producer = asyncio.create_task(produce())
+    finally:
+        _stream_queue.reset(token)
+
+    ttft_ms = None
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _DONE:
+                break
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+                metrics.observe("stream.ttft_ms", ttft_ms)
+                logger.info(f"time to first token: {ttft_ms:.0f} ms (from {chunk['source']})")
+            yield chunk
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+        total_ms = (time.perf_counter() - start) * 1000
+        metrics.observe("stream.total_ms", total_ms)
+        logger.info(f"streamed response finished in {total_ms:.0f} ms")
@@ -0,0 +1,39 @@
+"""Token 估算工具 - 在不依赖分词器的情况下粗略估算文本的 token 数"""
+import re
+
+# 中日韩字符大约每个字符一个 token，其余文本大约每 4 个字符一个 token
+_CJK_PATTERN = re.compile(r"[　-〿぀-ヿ㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def reduction_report(original: str, reduced: str) -> str:
+    """生成压缩前后字节数和 token 数的对比描述"""
+    original_bytes = len(original.encode("utf-8"))
+    reduced_bytes = len(reduced.encode("utf-8"))
+    original_tokens = estimate_tokens(original)
+    reduced_tokens = estimate_tokens(reduced)
+    saved = 100 * (1 - reduced_bytes / original_bytes) if original_bytes else 0.0
+    return (f"{reduced_bytes} bytes (~{reduced_tokens} tokens) vs {original_bytes} bytes "
+            f"(~{original_tokens} tokens), saved {saved:.1f}%")
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """将文本截断到约 max_tokens 个 token 以内"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 二分查找满足 token 预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + suffix
@@ -0,0 +1,247 @@
+"""请求追踪 - 用 span 记录每个请求在主协调器、工具、上游服务和记忆 Hook 中的耗时、token 数和数据量
+
+span 通过上下文变量传递父子关系，run_blocking 会复制上下文，因此线程池中的调用也挂在同一请求下。
+导出器可插拔：TRACE_EXPORTER=jsonl 追加写入 TRACE_JSONL_PATH，otel 转发到 OpenTelemetry SDK，none 只记录指标。
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+from utils import metrics
+from utils.logger import get_logger
+from utils.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").strip().lower()
+TRACE_JSONL_PATH = os.environ.get("TRACE_JSONL_PATH", ".cache/traces.jsonl")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """一段被追踪的操作；attributes 中的数值可通过 add 累加（如 token 数、字节数）"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes or {})
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key: str, value: float):
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def record_text(self, prefix: str, text):
+        """记录文本载荷的字节数和估算 token 数"""
+        if isinstance(text, str):
+            self.add(f"{prefix}_bytes", len(text.encode("utf-8")))
+            self.add(f"{prefix}_tokens", estimate_tokens(text))
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "end": self.end,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class JsonlExporter:
+    """每个结束的 span 追加一行 JSON"""
+
+    def __init__(self, path: str = TRACE_JSONL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class OtelExporter:
+    """转发到 OpenTelemetry SDK（需安装 opentelemetry-sdk 并由调用方配置 TracerProvider）。
+
+    子 span 先于父 span 结束，因此按 trace 缓存，根 span 结束时自上而下重建父子关系后提交。
+    """
+
+    def __init__(self):
+        from opentelemetry import trace
+        self._trace = trace
+        self._tracer = trace.get_tracer("multi-agent")
+        self._pending: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            spans = self._pending.setdefault(span.trace_id, [])
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self._pending[span.trace_id]
+        otel_spans = {}
+        for item in sorted(spans, key=lambda s: s.start):
+            parent = otel_spans.get(item.parent_id)
+            context = self._trace.set_span_in_context(parent) if parent is not None else None
+            otel_span = self._tracer.start_span(
+                item.name, context=context, start_time=int(item.start * 1e9),
+                attributes={k: v for k, v in item.attributes.items()
+                            if isinstance(v, (str, bool, int, float))})
+            otel_spans[item.span_id] = otel_span
+        for item in spans:
+            otel_spans[item.span_id].end(end_time=int(item.end * 1e9))
+
+
+_exporters: List = []
+
+
+def _default_exporters() -> List:
+    if TRACE_EXPORTER == "jsonl":
+        return [JsonlExporter()]
+    if TRACE_EXPORTER == "otel":
+        try:
+            return [OtelExporter()]
+        except ImportError:
+            logger.warning("TRACE_EXPORTER=otel but opentelemetry is not installed, tracing export disabled")
+    return []
+
+
+_exporters.extend(_default_exporters())
+
+
+def add_exporter(exporter):
+    """注册额外的导出器，需实现 export(span)"""
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter):
+    if exporter in _exporters:
+        _exporters.remove(exporter)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _finish(span: Span):
+    span.end = time.time()
+    metrics.observe(f"span.{span.name}.ms", span.duration_ms)
+    for exporter in _exporters:
+        try:
+            exporter.export(span)
+        except Exception as e:
+            logger.warning(f"Trace exporter {type(exporter).__name__} failed: {e}")
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """在当前 span 下开启一个子 span（没有当前 span 时开启新的 trace）"""
+    item = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(item)
+    try:
+        yield item
+    except BaseException as e:
+        item.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(item)
+
+
+def traced(name: str):
+    """装饰同步或异步函数，每次调用记录一个 span，返回字符串时记录其字节数和 token 数"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name) as item:
+                    result = await func(*args, **kwargs)
+                    item.record_text("output", result)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as item:
+                result = func(*args, **kwargs)
+                item.record_text("output", result)
+                return result
+        return wrapper
+    return decorator
+
+
+def record_usage(result, item: Optional[Span] = None):
+    """从 Strands AgentResult 中读取累计的 token 用量并记录到 span"""
+    item = item or _current_span.get()
+    usage = getattr(getattr(result, "metrics", None), "accumulated_usage", None)
+    if item is None or not usage:
+        return
+    item.add("input_tokens", usage.get("inputTokens", 0))
+    item.add("output_tokens", usage.get("outputTokens", 0))
+
+
+def load_spans(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stage_report(spans: Iterable[Dict], root: str = "request") -> Dict:
+    """按阶段（span 名称）统计每个请求中的耗时及其占请求总耗时的比例的 p50/p95/p99。
+
+    只统计根 span 名为 root 的 trace（后台写入等不属于请求的 trace 不计入）；
+    同一请求中同名 span 的耗时累加，并发执行的 span 会重叠，占比之和可能超过 1。
+    """
+    traces: Dict[str, List[Dict]] = {}
+    for item in spans:
+        traces.setdefault(item["trace_id"], []).append(item)
+
+    stage_ms: Dict[str, List[float]] = {}
+    stage_share: Dict[str, List[float]] = {}
+    root_ms = []
+    for items in traces.values():
+        root_span = next((s for s in items if s["parent_id"] is None), None)
+        if root_span is None or root_span["name"] != root:
+            continue
+        root_ms.append(root_span["duration_ms"])
+        totals: Dict[str, float] = {}
+        for item in items:
+            if item is not root_span:
+                totals[item["name"]] = totals.get(item["name"], 0.0) + item["duration_ms"]
+        for name, total in totals.items():
+            stage_ms.setdefault(name, []).append(total)
+            share = total / root_span["duration_ms"] if root_span["duration_ms"] else 0.0
+            stage_share.setdefault(name, []).append(share)
+
+    report = {"requests": len(root_ms), "request_ms": metrics.summarize(root_ms), "stages": {}}
+    for name in sorted(stage_ms, key=lambda n: -sum(stage_ms[n])):
+        share = metrics.summarize(stage_share[name])
+        report["stages"][name] = {
+            "requests": len(stage_ms[name]),
+            "ms": metrics.summarize(stage_ms[name]),
+            "share": {k: share[k] for k in ("p50", "p95", "p99")},
+        }
+    return report